@@ -0,0 +1,181 @@
+import os
+import time
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import optuna
+import pandas as pd
+import xgboost as xgb
+
+from app.executor import spawn_pool
+from app.scheduler import cpu_limit
+from app.tuning import OPTUNA_EARLY_STOPPING_ROUNDS, OPTUNA_MAX_ROUNDS, as_float32, feature_types, suggest_params
+
+# Rolling-origin folds of a backtest
+BACKTEST_FOLDS = int(os.environ.get("BACKTEST_FOLDS", "4"))
+# Weeks each fold forecasts after its training cutoff
+BACKTEST_HORIZON_WEEKS = int(os.environ.get("BACKTEST_HORIZON_WEEKS", "8"))
+# Folds fitted at the same time, each in its own process; 1 fits them in-process
+BACKTEST_WORKERS = int(os.environ.get("BACKTEST_WORKERS", str(os.cpu_count() or 1)))
+
+
+def rolling_origin_folds(dates: np.ndarray, n_folds: int, horizon_weeks: int) -> List[Dict[str, Any]]:
+    """Expanding-window folds over the last ``n_folds * horizon_weeks`` weeks.
+
+    Fold k trains on every row before its cutoff week and is tested on the
+    ``horizon_weeks`` weeks from the cutoff; cutoffs step forward by the
+    horizon, so the test weeks of the folds do not overlap and the last
+    fold ends with the data. Raises ValueError when there are too few weeks.
+    """
+    dates = np.asarray(dates, dtype='datetime64[ns]')
+    weeks = np.unique(dates)
+    if n_folds < 1 or horizon_weeks < 1:
+        raise ValueError("Jumlah fold dan horizon minimal 1")
+    if len(weeks) <= n_folds * horizon_weeks:
+        raise ValueError(f"Data hanya memiliki {len(weeks)} minggu; dibutuhkan lebih dari "
+                         f"{n_folds} fold x {horizon_weeks} minggu")
+
+    folds = []
+    for k in range(n_folds):
+        start = len(weeks) - (n_folds - k) * horizon_weeks
+        test_weeks = weeks[start:start + horizon_weeks]
+        folds.append({
+            'fold': k,
+            'train_rows': np.flatnonzero(dates < test_weeks[0]),
+            'test_rows': np.flatnonzero((dates >= test_weeks[0]) & (dates <= test_weeks[-1])),
+            'train_end': pd.Timestamp(weeks[start - 1]).strftime('%Y-%m-%d'),
+            'test_start': pd.Timestamp(test_weeks[0]).strftime('%Y-%m-%d'),
+            'test_end': pd.Timestamp(test_weeks[-1]).strftime('%Y-%m-%d'),
+        })
+    return folds
+
+
+def fit_fold(X: np.ndarray, y: np.ndarray, train_rows: np.ndarray, test_rows: np.ndarray, params: Dict[str, Any],
+             n_rounds: int, columns: List[str], types: Optional[List[str]],
+             early_stopping_rounds: Optional[int] = None) -> Dict[str, Any]:
+    """Train on one fold's rows and predict its test rows.
+
+    With ``early_stopping_rounds`` the fold's test rows also pick the
+    round count, as the validation rows of an Optuna trial do.
+    """
+    dtrain = xgb.QuantileDMatrix(X[train_rows], y[train_rows], feature_names=columns, feature_types=types,
+                                 enable_categorical=True, nthread=params.get('nthread'))
+    dtest = xgb.QuantileDMatrix(X[test_rows], y[test_rows], ref=dtrain, feature_names=columns,
+                                feature_types=types, enable_categorical=True, nthread=params.get('nthread'))
+    start = time.perf_counter()
+    if early_stopping_rounds:
+        booster = xgb.train(params, dtrain, num_boost_round=n_rounds, evals=[(dtest, 'validation_0')],
+                            early_stopping_rounds=early_stopping_rounds, verbose_eval=False)
+        best_iteration = int(booster.best_iteration)
+    else:
+        booster = xgb.train(params, dtrain, num_boost_round=n_rounds)
+        best_iteration = n_rounds - 1
+    seconds = time.perf_counter() - start
+    return {
+        'predictions': booster.predict(dtest, iteration_range=(0, best_iteration + 1)),
+        'best_iteration': best_iteration,
+        'training_seconds': seconds
+    }
+
+
+def _fold_worker(data_dir: str, train_rows: np.ndarray, test_rows: np.ndarray, params: Dict[str, Any],
+                 n_rounds: int, columns: List[str], types: Optional[List[str]],
+                 early_stopping_rounds: Optional[int]) -> Dict[str, Any]:
+    """fit_fold on the arrays saved in data_dir"""
+    X = np.load(os.path.join(data_dir, "X.npy"), mmap_mode='r')
+    y = np.load(os.path.join(data_dir, "y.npy"), mmap_mode='r')
+    return fit_fold(X, y, train_rows, test_rows, params, n_rounds, columns, types, early_stopping_rounds)
+
+
+class Backtest:
+    """Rolling-origin folds of one feature matrix, fitted in parallel.
+
+    The features are converted to a float32 array once. With several
+    workers the array is saved to a temporary directory on the first run
+    and memory-mapped read-only by every worker process for that run and
+    the following ones, so trials of a study do not ship it again; the
+    worker processes are likewise kept for the following runs. Call
+    close() (or use it as a context manager) to stop them and remove the
+    directory.
+    """
+
+    def __init__(self, X: pd.DataFrame, y, dates, n_folds: Optional[int] = None,
+                 horizon_weeks: Optional[int] = None, workers: Optional[int] = None):
+        self.columns = list(X.columns)
+        self.types = feature_types(X)
+        self.X = as_float32(X)
+        self.y = np.asarray(y, dtype=np.float32)
+        self.folds = rolling_origin_folds(np.asarray(dates), n_folds or BACKTEST_FOLDS,
+                                          horizon_weeks or BACKTEST_HORIZON_WEEKS)
+        self.workers = min(workers or BACKTEST_WORKERS, len(self.folds), cpu_limit())
+        self._data_dir: Optional[str] = None
+        self._pool: Optional[ProcessPoolExecutor] = None
+
+    def __enter__(self) -> 'Backtest':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def _shared_dir(self) -> str:
+        if self._data_dir is None:
+            self._data_dir = tempfile.mkdtemp(prefix="backtest-")
+            np.save(os.path.join(self._data_dir, "X.npy"), self.X)
+            np.save(os.path.join(self._data_dir, "y.npy"), self.y)
+        return self._data_dir
+
+    def run(self, params: Dict[str, Any], n_rounds: int,
+            early_stopping_rounds: Optional[int] = None) -> List[Dict[str, Any]]:
+        """fit_fold's result for every fold, with the fold's rows and dates"""
+        if self.workers <= 1:
+            results = [fit_fold(self.X, self.y, fold['train_rows'], fold['test_rows'], params, n_rounds,
+                                self.columns, self.types, early_stopping_rounds) for fold in self.folds]
+        else:
+            params = dict(params, nthread=max(1, cpu_limit() // self.workers))
+            if self._pool is None:
+                self._pool = spawn_pool(self.workers)
+            pool = self._pool
+            futures = [pool.submit(_fold_worker, self._shared_dir(), fold['train_rows'], fold['test_rows'], params,
+                                   n_rounds, self.columns, self.types, early_stopping_rounds) for fold in self.folds]
+            try:
+                results = [future.result() for future in futures]
+            except BaseException:
+                for future in futures:
+                    future.cancel()
+                raise
+        return [dict(fold, **result) for fold, result in zip(self.folds, results)]
+
+    def close(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=True, cancel_futures=True)
+            self._pool = None
+        if self._data_dir is not None:
+            shutil.rmtree(self._data_dir, ignore_errors=True)
+            self._data_dir = None
+
+
+def fold_rmse(result: Dict[str, Any], y: np.ndarray) -> float:
+    return float(np.sqrt(np.mean((y[result['test_rows']] - result['predictions']) ** 2)))
+
+
+class BacktestObjective:
+    """Optuna objective scoring a configuration by its mean RMSE over the folds of a backtest.
+
+    Each fold stops early on its own test weeks; the trial's
+    ``best_iteration`` is the mean of the folds' and ``fold_rmse`` lists
+    their scores.
+    """
+
+    def __init__(self, backtest: Backtest):
+        self.backtest = backtest
+
+    def __call__(self, trial: optuna.Trial) -> float:
+        params = xgb.XGBRegressor(**suggest_params(trial), eval_metric='rmse').get_xgb_params()
+        results = self.backtest.run(params, OPTUNA_MAX_ROUNDS, early_stopping_rounds=OPTUNA_EARLY_STOPPING_ROUNDS)
+        scores = [fold_rmse(result, self.backtest.y) for result in results]
+        trial.set_user_attr('best_iteration', int(round(np.mean([result['best_iteration'] for result in results]))))
+        trial.set_user_attr('fold_rmse', scores)
+        return float(np.mean(scores))
@@ -0,0 +1,109 @@
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from app.dataset_store import DatasetStore
+
+DATASET_CACHE_MAX_MB = int(os.environ.get("DATASET_CACHE_MAX_MB", "1024"))
+
+
+def _freeze(df: pd.DataFrame) -> pd.DataFrame:
+    """Rebuild a frame on read-only views of its column buffers.
+
+    In-place writes such as ``df.loc[...] = ...`` then raise instead of
+    silently changing the cached data.
+    """
+    columns = {}
+    for col in df.columns:
+        values = df[col].array
+        if isinstance(values, pd.Categorical):
+            # Categorical.codes is already a read-only view
+            columns[col] = pd.Categorical.from_codes(values.codes, dtype=values.dtype)
+        else:
+            array = np.asarray(values).view()
+            array.flags.writeable = False
+            columns[col] = array
+    return pd.DataFrame(columns, copy=False)
+
+
+class DatasetCache:
+    """Process-wide LRU cache of loaded datasets.
+
+    Entries are keyed by dataset id, content fingerprint and the projected
+    columns, and are bounded by a total byte budget. Callers receive shallow
+    copies of read-only frames: assigning a column only affects their copy,
+    and writing into an existing column raises ``ValueError``.
+    """
+
+    def __init__(self, store: DatasetStore, max_mb: Optional[int] = None):
+        self.store = store
+        self.max_bytes = (DATASET_CACHE_MAX_MB if max_mb is None else max_mb) * 1024 * 1024
+        self._entries: 'OrderedDict[Tuple[int, str, Optional[Tuple[str, ...]]], Tuple[pd.DataFrame, int]]' = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def get(self, dataset_id: int, columns: Optional[List[str]] = None) -> pd.DataFrame:
+        """Return a dataset from memory, loading it from the store on a miss"""
+        fingerprint = self.store.fingerprint(dataset_id)
+        key = (dataset_id, fingerprint, tuple(columns) if columns else None)
+        full_key = (dataset_id, fingerprint, None)
+
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self._hits += 1
+                return self._entries[key][0].copy(deep=False)
+            if columns and full_key in self._entries:
+                # Project from the full frame without copying column buffers
+                self._entries.move_to_end(full_key)
+                self._hits += 1
+                frame = self._entries[full_key][0]
+                return pd.DataFrame({col: frame[col] for col in columns}, copy=False)
+            self._misses += 1
+
+        frame = _freeze(self.store.load(dataset_id, columns=columns))
+        size = int(frame.memory_usage(deep=True).sum())
+
+        with self._lock:
+            # Drop entries for older content of the same dataset
+            for stale_key in [k for k in self._entries if k[0] == dataset_id and k[1] != fingerprint]:
+                self._remove(stale_key)
+            if size <= self.max_bytes and key not in self._entries:
+                self._entries[key] = (frame, size)
+                self._bytes += size
+                while self._bytes > self.max_bytes:
+                    self._remove(next(iter(self._entries)))
+                    self._evictions += 1
+
+        return frame.copy(deep=False)
+
+    def _remove(self, key) -> None:
+        _, size = self._entries.pop(key)
+        self._bytes -= size
+
+    def invalidate(self, dataset_id: Optional[int] = None) -> None:
+        """Drop cached frames for one dataset, or for all datasets"""
+        with self._lock:
+            for key in [k for k in self._entries if dataset_id is None or k[0] == dataset_id]:
+                self._remove(key)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            requests = self._hits + self._misses
+            return {
+                'hits': self._hits,
+                'misses': self._misses,
+                'hit_rate': self._hits / requests if requests else 0.0,
+                'evictions': self._evictions,
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'datasets': sorted({key[0] for key in self._entries}),
+            }
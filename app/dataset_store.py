@@ -0,0 +1,361 @@
+import os
+import glob
+import hashlib
+import shutil
+import uuid
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from app.sales_tensor import SalesTensor, TENSOR_COLUMNS
+
+# Columns every Walmart sales dataset must provide
+REQUIRED_COLUMNS = ['Store', 'Dept', 'Date', 'Weekly_Sales', 'IsHoliday']
+CATEGORICAL_COLUMNS = ['Store', 'Dept']
+
+# Peak memory allowed while parsing an upload (raw chunk + typed copy + Arrow table)
+INGEST_MEMORY_BUDGET_MB = int(os.environ.get("INGEST_MEMORY_BUDGET_MB", "256"))
+INGEST_PROBE_ROWS = 10000
+
+SALES_TENSOR_ENABLED = os.environ.get("SALES_TENSOR_ENABLED", "true").lower() == "true"
+
+
+class DatasetStore:
+    """Typed columnar storage for uploaded datasets.
+
+    Each dataset lives in ``data/dataset_{id}/`` as one or more Parquet part
+    files; appended weeks are added as new parts. Store/Dept come back as
+    categoricals, Date is datetime64 and Weekly_Sales float32. Datasets
+    uploaded before the store existed are still kept as
+    ``data/dataset_{id}.csv``; they are converted on first load.
+    """
+
+    def __init__(self, data_dir: str = "data", ingest_memory_mb: Optional[int] = None):
+        self.data_dir = data_dir
+        self.ingest_memory_bytes = (ingest_memory_mb or INGEST_MEMORY_BUDGET_MB) * 1024 * 1024
+        self._fingerprints: Dict[int, Any] = {}
+        os.makedirs(self.data_dir, exist_ok=True)
+
+    def dataset_dir(self, dataset_id: int) -> str:
+        return os.path.join(self.data_dir, f"dataset_{dataset_id}")
+
+    def legacy_csv_path(self, dataset_id: int) -> str:
+        return os.path.join(self.data_dir, f"dataset_{dataset_id}.csv")
+
+    def part_paths(self, dataset_id: int) -> List[str]:
+        return sorted(glob.glob(os.path.join(self.dataset_dir(dataset_id), "part-*.parquet")))
+
+    def tensor_dir(self, dataset_id: int) -> str:
+        return os.path.join(self.dataset_dir(dataset_id), "tensor")
+
+    def exists(self, dataset_id: int) -> bool:
+        return bool(self.part_paths(dataset_id)) or os.path.exists(self.legacy_csv_path(dataset_id))
+
+    def signature(self, dataset_id: int) -> List[List[Any]]:
+        """Name, size and mtime of every part, used to detect changed content"""
+        signature = []
+        for path in self.part_paths(dataset_id):
+            stat = os.stat(path)
+            signature.append([os.path.basename(path), stat.st_size, stat.st_mtime_ns])
+        return signature
+
+    def _write_checksum(self, part_path: str) -> str:
+        digest = hashlib.sha256()
+        with open(part_path, 'rb') as f:
+            for block in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(block)
+        checksum = digest.hexdigest()
+        with open(part_path + ".sha256", 'w') as f:
+            f.write(checksum)
+        return checksum
+
+    def part_checksums(self, dataset_id: int) -> List[List[str]]:
+        """Name and SHA-256 of every part, in part order"""
+        checksums = []
+        for path in self.part_paths(dataset_id):
+            checksum_path = path + ".sha256"
+            if os.path.exists(checksum_path) and os.path.getmtime(checksum_path) >= os.path.getmtime(path):
+                with open(checksum_path) as f:
+                    checksum = f.read().strip()
+            else:
+                checksum = self._write_checksum(path)
+            checksums.append([os.path.basename(path), checksum])
+        return checksums
+
+    def fingerprint(self, dataset_id: int) -> str:
+        """Content hash of a dataset, derived from the checksum of each part"""
+        if not self.part_paths(dataset_id):
+            self.load(dataset_id, columns=['Store'])
+
+        signature = self.signature(dataset_id)
+        cached = self._fingerprints.get(dataset_id)
+        if cached is not None and cached[0] == signature:
+            return cached[1]
+
+        digest = hashlib.sha256()
+        for _, checksum in self.part_checksums(dataset_id):
+            digest.update(checksum.encode())
+        fingerprint = digest.hexdigest()
+        self._fingerprints[dataset_id] = (signature, fingerprint)
+        return fingerprint
+
+    def _coerce(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Validate a raw sales frame and cast it to the on-disk dtypes"""
+        missing_columns = [col for col in REQUIRED_COLUMNS if col not in df.columns]
+        if missing_columns:
+            raise ValueError(f"Kolom yang hilang: {', '.join(missing_columns)}")
+
+        for col in CATEGORICAL_COLUMNS:
+            if df[col].isna().any():
+                raise ValueError(f"Kolom {col} tidak boleh kosong")
+
+        df = df.copy()
+        if isinstance(df['Store'].dtype, pd.CategoricalDtype):
+            df['Store'] = df['Store'].astype(df['Store'].cat.categories.dtype)
+        if isinstance(df['Dept'].dtype, pd.CategoricalDtype):
+            df['Dept'] = df['Dept'].astype(df['Dept'].cat.categories.dtype)
+        df['Date'] = pd.to_datetime(df['Date'])
+        df['Weekly_Sales'] = pd.to_numeric(df['Weekly_Sales']).astype('float32')
+        if df['IsHoliday'].dtype != bool:
+            holiday = df['IsHoliday'].astype(str).str.lower().map({'true': True, 'false': False, '1': True, '0': False})
+            if holiday.isna().any():
+                raise ValueError("Kolom IsHoliday harus bernilai True/False")
+            df['IsHoliday'] = holiday.astype(bool)
+        return df
+
+    def _to_frame(self, table: pa.Table) -> pd.DataFrame:
+        df = table.to_pandas()
+        for col in CATEGORICAL_COLUMNS:
+            if col in df.columns and not isinstance(df[col].dtype, pd.CategoricalDtype):
+                df[col] = df[col].astype('category')
+        return df
+
+    def normalize(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Cast a raw sales frame to the dtypes returned by load"""
+        df = self._coerce(df)
+        for col in CATEGORICAL_COLUMNS:
+            df[col] = df[col].astype('category')
+        return df
+
+    def _publish(self, staging_dir: str, dataset_id: int) -> None:
+        shutil.rmtree(self.dataset_dir(dataset_id), ignore_errors=True)
+        os.replace(staging_dir, self.dataset_dir(dataset_id))
+
+    def _new_staging_dir(self) -> str:
+        staging_dir = os.path.join(self.data_dir, f".staging_{uuid.uuid4().hex}")
+        os.makedirs(staging_dir)
+        return staging_dir
+
+    def save(self, dataset_id: int, df: pd.DataFrame) -> None:
+        """Write a dataset as a single Parquet part, replacing any previous content"""
+        table = pa.Table.from_pandas(self._coerce(df), preserve_index=False)
+
+        staging_dir = self._new_staging_dir()
+        part_path = os.path.join(staging_dir, "part-00000.parquet")
+        pq.write_table(table, part_path)
+        self._write_checksum(part_path)
+        self._publish(staging_dir, dataset_id)
+
+    def ingest_csv(self, source: BinaryIO) -> Dict[str, Any]:
+        """Parse a CSV upload in chunks and stage it as Parquet with bounded memory.
+
+        Chunk size adapts to the measured in-memory row width so that a raw
+        chunk, its typed copy and the Arrow table together stay within the
+        ingest budget. The staged data becomes visible under a dataset id
+        through ``publish_ingest``.
+        """
+        staging_dir = self._new_staging_dir()
+        writer = None
+        schema = None
+        records_count = 0
+        columns: List[str] = []
+        first_store = None
+        store_summaries = []
+
+        try:
+            reader = pd.read_csv(source, iterator=True)
+            chunk_rows = INGEST_PROBE_ROWS
+            while True:
+                try:
+                    chunk = reader.get_chunk(chunk_rows)
+                except StopIteration:
+                    break
+                if chunk.empty:
+                    break
+
+                raw_row_bytes = chunk.memory_usage(deep=True).sum() / len(chunk)
+                chunk = self._coerce(chunk)
+                table = pa.Table.from_pandas(chunk, preserve_index=False)
+
+                if writer is None:
+                    schema = table.schema
+                    columns = chunk.columns.tolist()
+                    first_store = chunk['Store'].iloc[0]
+                    writer = pq.ParquetWriter(os.path.join(staging_dir, "part-00000.parquet"), schema)
+                elif not table.schema.equals(schema, check_metadata=False):
+                    try:
+                        table = table.cast(schema)
+                    except (pa.ArrowInvalid, pa.ArrowNotImplementedError) as e:
+                        raise ValueError(f"Tipe data tidak konsisten pada baris {records_count + 1}: {e}")
+                writer.write_table(table)
+
+                records_count += len(chunk)
+                store_summaries.append(chunk.assign(Sales=chunk['Weekly_Sales'].astype('float64')).groupby('Store').agg(
+                    records=('Sales', 'size'),
+                    total_sales=('Sales', 'sum'),
+                    first_date=('Date', 'min'),
+                    last_date=('Date', 'max'),
+                ))
+
+                # Size the next chunk from the observed row width
+                row_bytes = raw_row_bytes + table.nbytes / len(chunk) + chunk.memory_usage(deep=True).sum() / len(chunk)
+                chunk_rows = max(1000, int(self.ingest_memory_bytes / row_bytes))
+                del chunk, table
+
+            if writer is None:
+                raise ValueError("File CSV tidak berisi data")
+            writer.close()
+            self._write_checksum(os.path.join(staging_dir, "part-00000.parquet"))
+        except Exception:
+            if writer is not None:
+                writer.close()
+            shutil.rmtree(staging_dir, ignore_errors=True)
+            raise
+
+        summary = pd.concat(store_summaries).groupby(level=0).agg(
+            {'records': 'sum', 'total_sales': 'sum', 'first_date': 'min', 'last_date': 'max'}
+        )
+        return {
+            'staging_dir': staging_dir,
+            'records_count': records_count,
+            'columns': columns,
+            'first_store': first_store,
+            'store_summary': [
+                {
+                    'store': str(store),
+                    'records': int(row['records']),
+                    'total_sales': float(row['total_sales']),
+                    'first_date': row['first_date'].strftime('%Y-%m-%d'),
+                    'last_date': row['last_date'].strftime('%Y-%m-%d'),
+                }
+                for store, row in summary.iterrows()
+            ],
+        }
+
+    def publish_ingest(self, ingest: Dict[str, Any], dataset_id: int) -> None:
+        """Make a staged upload the content of a dataset"""
+        self._publish(ingest['staging_dir'], dataset_id)
+
+    def discard_ingest(self, ingest: Dict[str, Any]) -> None:
+        shutil.rmtree(ingest['staging_dir'], ignore_errors=True)
+
+    def delete(self, dataset_id: int) -> None:
+        """Remove the stored content of a dataset"""
+        shutil.rmtree(self.dataset_dir(dataset_id), ignore_errors=True)
+
+    def append_ingest(self, ingest: Dict[str, Any], dataset_id: int) -> str:
+        """Add a staged upload to an existing dataset as a new part.
+
+        The existing parts are left untouched, so content hashes and derived
+        state of the earlier rows stay valid. Returns the new part name.
+        """
+        try:
+            if not self.part_paths(dataset_id):
+                self.load(dataset_id, columns=['Store'])
+            paths = self.part_paths(dataset_id)
+
+            schema = pq.read_schema(paths[0])
+            staged_path = os.path.join(ingest['staging_dir'], "part-00000.parquet")
+            staged_schema = pq.read_schema(staged_path)
+            if staged_schema.names != schema.names:
+                raise ValueError(f"Kolom tidak sesuai dengan dataset: {', '.join(staged_schema.names)}")
+            if not staged_schema.equals(schema, check_metadata=False):
+                try:
+                    table = pq.read_table(staged_path).cast(schema)
+                except (pa.ArrowInvalid, pa.ArrowNotImplementedError) as e:
+                    raise ValueError(f"Tipe data tidak sesuai dengan dataset: {e}")
+                pq.write_table(table, staged_path)
+                self._write_checksum(staged_path)
+
+            last_index = int(os.path.basename(paths[-1])[len("part-"):-len(".parquet")])
+            part_path = os.path.join(self.dataset_dir(dataset_id), f"part-{last_index + 1:05d}.parquet")
+            # A sidecar never exists without its part; a part briefly without one gets it recomputed
+            os.replace(staged_path, part_path)
+            os.replace(staged_path + ".sha256", part_path + ".sha256")
+        finally:
+            self.discard_ingest(ingest)
+
+        # The original CSV of a legacy upload no longer holds the full content
+        if os.path.exists(self.legacy_csv_path(dataset_id)):
+            os.remove(self.legacy_csv_path(dataset_id))
+        return os.path.basename(part_path)
+
+    def remove_part(self, dataset_id: int, part: str) -> None:
+        """Undo append_ingest by removing the part it added"""
+        part_path = os.path.join(self.dataset_dir(dataset_id), part)
+        for path in (part_path, part_path + ".sha256"):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def load(self, dataset_id: int, columns: Optional[List[str]] = None,
+             parts: Optional[List[str]] = None, filters: Optional[List[Any]] = None) -> pd.DataFrame:
+        """Load a dataset, reading only the requested columns and, optionally, parts.
+
+        ``filters`` are Parquet row filters such as ``[('Store', 'in', [1, 2])]``.
+        """
+        paths = self.part_paths(dataset_id)
+        if not paths:
+            csv_path = self.legacy_csv_path(dataset_id)
+            if not os.path.exists(csv_path):
+                raise FileNotFoundError(f"Dataset {dataset_id} not found")
+            self.save(dataset_id, pd.read_csv(csv_path))
+            paths = self.part_paths(dataset_id)
+        if parts is not None:
+            paths = [os.path.join(self.dataset_dir(dataset_id), name) for name in parts]
+
+        return self._to_frame(pq.read_table(paths, columns=columns, filters=filters))
+
+    def load_tensor(self, dataset_id: int) -> Optional[SalesTensor]:
+        """Open the dense sales tensor of a dataset, building it on first use.
+
+        Returns None when tensors are disabled or the dataset cannot be
+        represented densely (duplicate rows or too many cells).
+        """
+        if not SALES_TENSOR_ENABLED:
+            return None
+
+        if not self.part_paths(dataset_id):
+            self.load(dataset_id, columns=['Store'])
+        source = self.signature(dataset_id)
+        path = self.tensor_dir(dataset_id)
+
+        index = SalesTensor.read_index(path)
+        if index is None or index['source'] != source:
+            tensor = SalesTensor.build(self.load(dataset_id, columns=TENSOR_COLUMNS))
+            if tensor is None:
+                SalesTensor.save_unsupported(path, source)
+            else:
+                tensor.save(path, source)
+            index = SalesTensor.read_index(path)
+
+        if not index['dense']:
+            return None
+        return SalesTensor.load(path, index)
+
+    def head(self, dataset_id: int, n: int = 5) -> pd.DataFrame:
+        """Read the first rows of a dataset without loading the rest"""
+        if not self.part_paths(dataset_id):
+            self.load(dataset_id, columns=['Store'])
+
+        batch = next(pq.ParquetFile(self.part_paths(dataset_id)[0]).iter_batches(batch_size=n))
+        return batch.to_pandas()
+
+    def iter_csv(self, dataset_id: int, batch_size: int = 65536) -> Iterator[str]:
+        """Stream a dataset back out as CSV text"""
+        header = True
+        for path in self.part_paths(dataset_id):
+            for batch in pq.ParquetFile(path).iter_batches(batch_size=batch_size):
+                yield batch.to_pandas().to_csv(index=False, header=header, date_format='%Y-%m-%d')
+                header = False
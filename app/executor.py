@@ -0,0 +1,199 @@
+import os
+import json
+import shutil
+import weakref
+import tempfile
+import asyncio
+import logging
+import functools
+import threading
+import multiprocessing
+import multiprocessing.util
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+import anyio
+
+logger = logging.getLogger(__name__)
+
+# Threads for blocking DB and file work, shared with FastAPI's sync endpoints
+EXECUTOR_IO_THREADS = int(os.environ.get("EXECUTOR_IO_THREADS", "16"))
+# Worker processes for training, prediction and chart building
+EXECUTOR_CPU_WORKERS = int(os.environ.get("EXECUTOR_CPU_WORKERS", str(os.cpu_count() or 2)))
+
+
+def worker_environ() -> Dict[str, str]:
+    """Settings the server resolved at import that its worker processes must share.
+
+    main.py loads .env only after app.database has built the engine, so a
+    worker reading the inherited environment could otherwise resolve a
+    different database, or Optuna storage, than the server.
+    """
+    from app.database import SQLALCHEMY_DATABASE_URL
+    from app.tuning import OPTUNA_STORAGE_URL
+    return {"DATABASE_URL": SQLALCHEMY_DATABASE_URL, "OPTUNA_STORAGE_URL": OPTUNA_STORAGE_URL}
+
+
+# Set in CPU worker processes by _init_worker
+_worker_count = 1
+_stats_dir: Optional[str] = None
+_after_task: List[Callable[[], None]] = []
+
+
+def _init_worker(environ: Dict[str, str], workers: int, stats_dir: str) -> None:
+    global _worker_count, _stats_dir
+    # Runs before the worker imports any task module, so their settings see these values
+    os.environ.update(environ)
+    _worker_count = workers
+    _stats_dir = stats_dir
+
+
+def worker_count() -> int:
+    """Processes of the CPU pool this process is a worker of; 1 outside one"""
+    return _worker_count
+
+
+def after_task(hook: Callable[[], None]) -> None:
+    """Register a function a CPU worker runs after each of its tasks"""
+    _after_task.append(hook)
+
+
+def publish_worker_stats(stats: Dict[str, Any]) -> None:
+    """Record this CPU worker's stats, replacing what it published before, for Executor.worker_stats"""
+    if _stats_dir is None:
+        return
+    path = os.path.join(_stats_dir, f"{os.getpid()}.json")
+    with open(path + ".tmp", 'w') as f:
+        json.dump(dict(stats, pid=os.getpid()), f)
+    os.replace(path + ".tmp", path)
+
+
+def _run_task(fn: Callable[[], Any]) -> Any:
+    try:
+        return fn()
+    finally:
+        for hook in _after_task:
+            try:
+                hook()
+            except Exception as e:
+                logger.warning(f"After-task hook {hook.__name__} failed: {e}")
+
+
+# Nested pools still open in this process
+_run_pools: 'weakref.WeakSet[ProcessPoolExecutor]' = weakref.WeakSet()
+
+
+def spawn_pool(workers: int) -> ProcessPoolExecutor:
+    """Spawn-based pool for the fan-out of one run (segments, folds, trials, feature shards).
+
+    Spawned processes never inherit the threads of the process starting
+    them. The caller shuts the pool down when its run ends, so idle
+    processes do not outlive the run's CPU allocation.
+    """
+    pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+    _run_pools.add(pool)
+    return pool
+
+
+@contextmanager
+def run_pool(workers: int) -> Iterator[ProcessPoolExecutor]:
+    """spawn_pool for the duration of a block"""
+    pool = spawn_pool(workers)
+    try:
+        yield pool
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+def _shutdown_run_pools() -> None:
+    for pool in list(_run_pools):
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+# Unlike atexit hooks this also runs when a pool lives inside a worker
+# process. It must run before the queue finalizers (priority 10) stop the
+# feeder threads that deliver the workers' shutdown sentinels.
+multiprocessing.util.Finalize(None, _shutdown_run_pools, exitpriority=100)
+
+
+class Executor:
+    """Runs blocking work away from the event loop.
+
+    ``run_io`` uses the bounded AnyIO thread pool that FastAPI also uses for
+    plain ``def`` endpoints and dependencies. ``run_cpu`` sends picklable
+    top-level functions (see ``app.tasks``) to a pool of spawned processes,
+    so a long training run holds neither the event loop nor the GIL of the
+    process serving requests. Workers start with worker_environ(), so they
+    use the server's database, and know the pool's size (worker_count) so
+    per-process caches can split their budgets between them.
+    """
+
+    def __init__(self, io_threads: Optional[int] = None, cpu_workers: Optional[int] = None):
+        self.io_threads = io_threads or EXECUTOR_IO_THREADS
+        self.cpu_workers = cpu_workers or EXECUTOR_CPU_WORKERS
+        self._process_pool: Optional[ProcessPoolExecutor] = None
+        self._stats_dir: Optional[str] = None
+        self._lock = threading.Lock()
+
+    def start(self) -> None:
+        """Size the thread pool; must run inside the event loop"""
+        anyio.to_thread.current_default_thread_limiter().total_tokens = self.io_threads
+
+    def _pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._process_pool is None:
+                # A fresh directory per pool, so workers of a broken pool are not reported
+                self._remove_stats_dir()
+                self._stats_dir = tempfile.mkdtemp(prefix="executor-stats-")
+                self._process_pool = ProcessPoolExecutor(
+                    max_workers=self.cpu_workers, mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_worker, initargs=(worker_environ(), self.cpu_workers, self._stats_dir)
+                )
+            return self._process_pool
+
+    def _remove_stats_dir(self) -> None:
+        if self._stats_dir is not None:
+            shutil.rmtree(self._stats_dir, ignore_errors=True)
+            self._stats_dir = None
+
+    def worker_stats(self) -> List[Dict[str, Any]]:
+        """What each CPU worker last published (see publish_worker_stats), in pid order"""
+        stats_dir = self._stats_dir
+        if stats_dir is None or not os.path.isdir(stats_dir):
+            return []
+        snapshots = []
+        for name in sorted(os.listdir(stats_dir)):
+            if not name.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(stats_dir, name)) as f:
+                    snapshots.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+        return sorted(snapshots, key=lambda snapshot: snapshot['pid'])
+
+    async def run_io(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        return await anyio.to_thread.run_sync(functools.partial(fn, *args, **kwargs))
+
+    async def run_cpu(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        loop = asyncio.get_running_loop()
+        pool = self._pool()
+        try:
+            return await loop.run_in_executor(pool, _run_task, functools.partial(fn, *args, **kwargs))
+        except BrokenProcessPool:
+            # A worker died (e.g. out of memory); start a fresh pool for later calls
+            logger.error("CPU worker pool broke; restarting it")
+            with self._lock:
+                if self._process_pool is pool:
+                    self._process_pool = None
+            pool.shutdown(wait=False)
+            raise
+
+    def shutdown(self) -> None:
+        with self._lock:
+            if self._process_pool is not None:
+                self._process_pool.shutdown(wait=False, cancel_futures=True)
+                self._process_pool = None
+            self._remove_stats_dir()
@@ -0,0 +1,238 @@
+import os
+import shutil
+import tempfile
+from collections import defaultdict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import xgboost as xgb
+from sklearn.preprocessing import LabelEncoder
+
+from app.dataset_store import DatasetStore, REQUIRED_COLUMNS
+from app.feature_spec import FeaturePlan
+
+# Peak memory for feature batches in external-memory training
+EXTERNAL_MEMORY_BUDGET_MB = int(os.environ.get("EXTERNAL_MEMORY_BUDGET_MB", "256"))
+# XGBoost page cache and held-out rows, removed after each run
+EXTERNAL_MEMORY_DIR = os.environ.get("EXTERNAL_MEMORY_DIR", os.path.join("data", "xgb_cache"))
+
+# Peak bytes per raw row while its features are built: the loaded row, plus
+# per feature column its value in the sorted frame, the intermediate arrays
+# and the float32 training matrix
+ROW_BYTES = 64
+FEATURE_COLUMN_BYTES = 16
+# Rows whose key hash is divisible by this are held out for evaluation (20%)
+HOLDOUT_MODULO = 5
+
+# Parquet filters selecting the rows of one batch, and its row count
+BatchFilter = Tuple[List[Tuple[str, str, Any]], int]
+
+
+def batch_rows(plan: FeaturePlan, memory_mb: Optional[int] = None) -> int:
+    """Raw rows per feature batch for a memory budget"""
+    budget = (memory_mb or EXTERNAL_MEMORY_BUDGET_MB) * 1024 * 1024
+    return max(1000, budget // (ROW_BYTES + FEATURE_COLUMN_BYTES * len(plan.columns)))
+
+
+def _plain(value: Any) -> Any:
+    """NumPy scalars as Python values, usable in Parquet filters"""
+    return value.item() if isinstance(value, np.generic) else value
+
+
+def scan_dataset(store: DatasetStore, dataset_id: int, max_rows: int) -> Dict[str, Any]:
+    """Rows per (Store, Dept) series and holiday weeks, read ``max_rows`` rows of a few columns at a time"""
+    if not store.part_paths(dataset_id):
+        # Converts a legacy CSV upload into parts
+        store.load(dataset_id, columns=['Store'])
+
+    counts: Dict[Tuple[Any, Any], int] = defaultdict(int)
+    holidays = set()
+    for path in store.part_paths(dataset_id):
+        batches = pq.ParquetFile(path).iter_batches(batch_size=max_rows,
+                                                     columns=['Store', 'Dept', 'Date', 'IsHoliday'])
+        for batch in batches:
+            frame = batch.to_pandas()
+            for (store_value, dept_value), size in frame.groupby(['Store', 'Dept'], observed=True).size().items():
+                counts[(_plain(store_value), _plain(dept_value))] += int(size)
+            holidays.update(frame.loc[frame['IsHoliday'].astype(bool), 'Date'].unique())
+    return {
+        'series_rows': dict(counts),
+        'holidays': np.array(sorted(holidays), dtype='datetime64[ns]')
+    }
+
+
+def fit_encoders(series_rows: Dict[Tuple[Any, Any], int]) -> Tuple[LabelEncoder, LabelEncoder]:
+    """The encoders prepare_data would fit on the full dataset"""
+    le_store = LabelEncoder().fit(sorted({str(store) for store, _ in series_rows}))
+    le_dept = LabelEncoder().fit(sorted({str(dept) for _, dept in series_rows}))
+    return le_store, le_dept
+
+
+def plan_batches(series_rows: Dict[Tuple[Any, Any], int], max_rows: int) -> List[BatchFilter]:
+    """Group series into reads of about ``max_rows`` rows.
+
+    Whole stores are combined while they fit; a store larger than the
+    budget is read a few departments at a time. Series are never split, as
+    their window features need every earlier week.
+    """
+    by_store: Dict[Any, Dict[Any, int]] = defaultdict(dict)
+    for (store, dept), rows in series_rows.items():
+        by_store[store][dept] = rows
+
+    batches: List[BatchFilter] = []
+    stores, rows = [], 0
+    for store in sorted(by_store):
+        store_rows = sum(by_store[store].values())
+        if store_rows > max_rows:
+            depts, dept_rows = [], 0
+            for dept in sorted(by_store[store]):
+                if depts and dept_rows + by_store[store][dept] > max_rows:
+                    batches.append(([('Store', '=', store), ('Dept', 'in', depts)], dept_rows))
+                    depts, dept_rows = [], 0
+                depts.append(dept)
+                dept_rows += by_store[store][dept]
+            batches.append(([('Store', '=', store), ('Dept', 'in', depts)], dept_rows))
+            continue
+        if stores and rows + store_rows > max_rows:
+            batches.append(([('Store', 'in', stores)], rows))
+            stores, rows = [], 0
+        stores.append(store)
+        rows += store_rows
+    if stores:
+        batches.append(([('Store', 'in', stores)], rows))
+    return batches
+
+
+def holdout_mask(frame: pd.DataFrame) -> np.ndarray:
+    """Deterministic 20% evaluation split on (Store, Dept, Date)"""
+    keys = pd.DataFrame({
+        'Store': frame['Store'].astype(str).to_numpy(),
+        'Dept': frame['Dept'].astype(str).to_numpy(),
+        'Date': frame['Date'].to_numpy()
+    })
+    return pd.util.hash_pandas_object(keys, index=False).to_numpy() % HOLDOUT_MODULO == 0
+
+
+class FeatureBatches(xgb.DataIter):
+    """Feeds XGBoost the training rows of a stored dataset one batch of series at a time.
+
+    Each batch is read from the dataset's Parquet parts with a filter,
+    featurized with the plan and handed to XGBoost, which keeps it in its
+    page cache under ``cache_dir``. Held-out rows are appended to a Parquet
+    file there during the first pass, for evaluation after training.
+    """
+
+    def __init__(self, store: DatasetStore, dataset_id: int, plan: FeaturePlan, le_store: LabelEncoder,
+                 le_dept: LabelEncoder, holidays: np.ndarray, batches: List[BatchFilter], cache_dir: str,
+                 progress: Optional[Callable[[int], None]] = None):
+        self.store = store
+        self.dataset_id = dataset_id
+        self.plan = plan
+        self.le_store = le_store
+        self.le_dept = le_dept
+        self.holidays = holidays
+        self.batches = batches
+        self.holdout_path = os.path.join(cache_dir, "holdout.parquet")
+        self.progress = progress
+        self.train_rows = 0
+        self.holdout_rows = 0
+        self._position = 0
+        self._first_pass = True
+        self._writer: Optional[pq.ParquetWriter] = None
+        super().__init__(cache_prefix=os.path.join(cache_dir, "train"))
+
+    def features(self, filters) -> Tuple[pd.DataFrame, pd.Series, np.ndarray]:
+        df = self.store.load(self.dataset_id, columns=REQUIRED_COLUMNS, filters=filters)
+        df = self.plan.apply(df, self.le_store, self.le_dept, holidays=self.holidays).dropna()
+        # XGBoost 2.0's external-memory pages lose categorical splits: compact
+        # plans train on the category codes as numbers, which a model predicts
+        # the same from categorical columns
+        X = pd.DataFrame({column: df[column].cat.codes if isinstance(df[column].dtype, pd.CategoricalDtype)
+                          else df[column] for column in self.plan.columns}).astype('float32')
+        return X, df['Weekly_Sales'], holdout_mask(df)
+
+    def next(self, input_data: Callable) -> int:
+        if self._position == len(self.batches):
+            if self._first_pass:
+                self._first_pass = False
+                self.close()
+            return 0
+
+        X, y, holdout = self.features(self.batches[self._position][0])
+        if self._first_pass:
+            self.train_rows += int((~holdout).sum())
+            self.holdout_rows += int(holdout.sum())
+            table = pa.Table.from_pandas(X[holdout].assign(Weekly_Sales=y[holdout]), preserve_index=False)
+            if self._writer is None:
+                self._writer = pq.ParquetWriter(self.holdout_path, table.schema)
+            self._writer.write_table(table)
+        input_data(data=X[~holdout], label=y[~holdout])
+
+        self._position += 1
+        if self.progress is not None:
+            self.progress(self._position)
+        return 1
+
+    def reset(self) -> None:
+        self._position = 0
+
+    def close(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+    def holdout(self, batch_size: int):
+        """Held-out feature rows and targets, batch by batch"""
+        if not os.path.exists(self.holdout_path):
+            return
+        for batch in pq.ParquetFile(self.holdout_path).iter_batches(batch_size=batch_size):
+            frame = batch.to_pandas()
+            yield frame[self.plan.columns], frame['Weekly_Sales'].to_numpy(dtype='float64')
+
+
+class StreamingMetrics:
+    """rmse, mae, r2_score and accuracy accumulated over batches"""
+
+    def __init__(self):
+        self.n = 0
+        self.sum_sq_error = 0.0
+        self.sum_abs_error = 0.0
+        self.sum_abs_pct_error = 0.0
+        self.sum_y = 0.0
+        self.sum_y_sq = 0.0
+
+    def update(self, y_true: np.ndarray, y_pred: np.ndarray) -> None:
+        error = y_true - y_pred
+        self.n += len(y_true)
+        self.sum_sq_error += float(np.sum(error ** 2))
+        self.sum_abs_error += float(np.sum(np.abs(error)))
+        self.sum_abs_pct_error += float(np.sum(np.abs(error / y_true)))
+        self.sum_y += float(np.sum(y_true))
+        self.sum_y_sq += float(np.sum(y_true ** 2))
+
+    def result(self) -> Dict[str, float]:
+        n = max(self.n, 1)
+        total = self.sum_y_sq - self.sum_y ** 2 / n
+        return {
+            'rmse': float(np.sqrt(self.sum_sq_error / n)),
+            'mae': self.sum_abs_error / n,
+            'r2_score': 1 - self.sum_sq_error / total if total > 0 else 0.0,
+            'accuracy': 100 * (1 - self.sum_abs_pct_error / n)
+        }
+
+
+def new_cache_dir(model_id: Optional[int] = None) -> str:
+    os.makedirs(EXTERNAL_MEMORY_DIR, exist_ok=True)
+    return tempfile.mkdtemp(prefix=f"model_{model_id}_" if model_id else "run_", dir=EXTERNAL_MEMORY_DIR)
+
+
+def cache_size_mb(cache_dir: str) -> float:
+    total = sum(os.path.getsize(os.path.join(cache_dir, name)) for name in os.listdir(cache_dir))
+    return round(total / (1024 * 1024), 1)
+
+
+def remove_cache_dir(cache_dir: str) -> None:
+    shutil.rmtree(cache_dir, ignore_errors=True)
@@ -0,0 +1,95 @@
+import numpy as np
+from typing import Dict, List, Tuple
+
+
+class GroupedWindowEngine:
+    """Lag and rolling-window features over series stored back to back.
+
+    ``values`` must already be sorted by series and then by time, and
+    ``group_ids`` must label each row with its series. Instead of calling
+    Python once per series, every feature is computed in one vectorized pass
+    over the whole array using each row's position inside its series, so a
+    window never reaches across a series boundary.
+    """
+
+    def __init__(self, values: np.ndarray, group_ids: np.ndarray):
+        self.values = np.asarray(values)
+        n = len(self.values)
+
+        starts = np.flatnonzero(np.r_[True, group_ids[1:] != group_ids[:-1]]) if n else np.array([], dtype=np.int64)
+        lengths = np.diff(np.r_[starts, n])
+        self.segment_starts = starts
+        # Offset of each row from the first row of its series
+        self.position = np.arange(n) - np.repeat(starts, lengths)
+
+    def lag(self, k: int) -> np.ndarray:
+        """Value k rows earlier in the same series, NaN where there is none"""
+        out = np.full(len(self.values), np.nan, dtype=np.result_type(self.values.dtype, np.float32))
+        if k < len(self.values):
+            valid = self.position[k:] >= k
+            out[k:][valid] = self.values[:-k or None][valid]
+        return out
+
+    def _shifted(self, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """float64 values k rows back plus a mask of rows where they exist"""
+        shifted = np.zeros(len(self.values), dtype=np.float64)
+        if k == 0:
+            shifted[:] = self.values
+            valid = ~np.isnan(shifted)
+        else:
+            valid = np.zeros(len(self.values), dtype=bool)
+            if k < len(self.values):
+                shifted[k:] = self.values[:-k]
+                valid[k:] = self.position[k:] >= k
+            valid &= ~np.isnan(shifted)
+        shifted[~valid] = 0.0
+        return shifted, valid
+
+    def rolling_mean_std(self, window: int, min_periods: int = 1) -> Tuple[np.ndarray, np.ndarray]:
+        """Trailing rolling mean and sample std (ddof=1), like pandas ``rolling``.
+
+        Windows with fewer than ``min_periods`` observations yield NaN, and
+        the std is NaN for windows holding a single observation.
+        """
+        return self.rolling_windows([window], min_periods)[window]
+
+    def rolling_windows(self, windows: List[int], min_periods: int = 1) -> Dict[int, Tuple[np.ndarray, np.ndarray]]:
+        """Rolling mean and std for several window sizes in one pass.
+
+        Shifted copies are generated once per offset and the running sum for
+        a window continues into the next larger one, so adding window sizes
+        costs one extra accumulation each rather than a separate pass.
+        """
+        windows = sorted(set(windows))
+        n = len(self.values)
+        total = np.zeros(n, dtype=np.float64)
+        count = np.zeros(n, dtype=np.int64)
+        means: Dict[int, np.ndarray] = {}
+        counts: Dict[int, np.ndarray] = {}
+        for k in range(windows[-1]):
+            shifted, valid = self._shifted(k)
+            total += shifted
+            count += valid
+            if k + 1 in windows:
+                with np.errstate(invalid='ignore', divide='ignore'):
+                    means[k + 1] = total / count
+                counts[k + 1] = count.copy()
+
+        # Second pass around each window mean keeps the variance stable
+        sq_devs = {w: np.zeros(n, dtype=np.float64) for w in windows}
+        for k in range(windows[-1]):
+            shifted, valid = self._shifted(k)
+            for w in windows:
+                if k < w:
+                    sq_devs[w] += np.where(valid, (shifted - means[w]) ** 2, 0.0)
+
+        results = {}
+        for w in windows:
+            mean, count = means[w], counts[w]
+            with np.errstate(invalid='ignore', divide='ignore'):
+                std = np.sqrt(sq_devs[w] / (count - 1))
+            std[count < 2] = np.nan
+            mean[count < max(min_periods, 1)] = np.nan
+            std[count < max(min_periods, 1)] = np.nan
+            results[w] = (mean, std)
+        return results
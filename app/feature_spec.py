@@ -0,0 +1,205 @@
+import copy
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from app.feature_engine import GroupedWindowEngine
+from app.parallel_features import FEATURE_PARALLEL_MIN_ROWS, parallel_window_features
+
+# Bump when the way a spec is turned into features changes, so cached
+# feature matrices built by older code are not reused
+FEATURE_PIPELINE_VERSION = 2
+
+# The features MLService has always trained on
+DEFAULT_FEATURE_SPEC = {
+    'date_parts': ['Year', 'Month', 'Week', 'DayOfYear'],
+    'lags': [1, 2, 4],
+    'rolling': {'windows': [4], 'stats': ['mean', 'std']},
+    'holiday_distance': False,
+    # Store/Dept as categoricals for XGBoost's native support and float32 features
+    'compact': False,
+}
+
+DATE_PARTS = {
+    'Year': lambda dates: dates.dt.year,
+    'Month': lambda dates: dates.dt.month,
+    'Quarter': lambda dates: dates.dt.quarter,
+    'Week': lambda dates: dates.dt.isocalendar().week,
+    'DayOfYear': lambda dates: dates.dt.dayofyear,
+}
+ROLLING_STATS = ['mean', 'std']
+MAX_LAG = 104
+
+# Weeks reported when there is no holiday before/after a row in the data
+HOLIDAY_DISTANCE_CAP = 52
+
+SERIES_COLUMNS = ['Store', 'Dept']
+# Feature columns compact plans hand to XGBoost as categoricals
+CATEGORICAL_FEATURES = ['Store_encoded', 'Dept_encoded']
+
+
+def normalize_feature_spec(spec: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Fill in defaults and validate a feature spec.
+
+    Raises ValueError for unknown date parts or statistics and for lags or
+    windows outside 1..MAX_LAG.
+    """
+    normalized = copy.deepcopy(DEFAULT_FEATURE_SPEC)
+    for key, value in (spec or {}).items():
+        if key not in normalized:
+            raise ValueError(f"Spesifikasi fitur tidak dikenal: {key}")
+        if key == 'rolling':
+            unknown = set(value) - set(normalized['rolling'])
+            if unknown:
+                raise ValueError(f"Spesifikasi rolling tidak dikenal: {', '.join(sorted(unknown))}")
+            normalized['rolling'].update(value)
+        else:
+            normalized[key] = value
+
+    unknown_parts = [part for part in normalized['date_parts'] if part not in DATE_PARTS]
+    if unknown_parts:
+        raise ValueError(f"Bagian tanggal tidak dikenal: {', '.join(unknown_parts)}")
+    unknown_stats = [stat for stat in normalized['rolling']['stats'] if stat not in ROLLING_STATS]
+    if unknown_stats:
+        raise ValueError(f"Statistik rolling tidak dikenal: {', '.join(unknown_stats)}")
+    for name, values in (('lags', normalized['lags']), ('rolling.windows', normalized['rolling']['windows'])):
+        if any(not isinstance(v, int) or isinstance(v, bool) or not 1 <= v <= MAX_LAG for v in values):
+            raise ValueError(f"Nilai {name} harus bilangan bulat 1-{MAX_LAG}")
+
+    # Keep the order the user gave, dropping duplicates
+    normalized['date_parts'] = list(dict.fromkeys(normalized['date_parts']))
+    normalized['lags'] = list(dict.fromkeys(normalized['lags']))
+    normalized['rolling']['windows'] = list(dict.fromkeys(normalized['rolling']['windows']))
+    normalized['rolling']['stats'] = list(dict.fromkeys(normalized['rolling']['stats']))
+    normalized['holiday_distance'] = bool(normalized['holiday_distance'])
+    normalized['compact'] = bool(normalized['compact'])
+    return normalized
+
+
+class FeaturePlan:
+    """A feature spec compiled into the passes that compute it.
+
+    Row-wise features (date parts, encoders) are computed column by column.
+    All lags and rolling windows share a single sort by series and date and
+    one GroupedWindowEngine, whose multi-window pass reuses shifted copies
+    and running sums across window sizes. Holiday distances are computed
+    once per distinct date and broadcast to the rows. Window features can
+    also be computed by series shards in worker processes. Compact plans
+    keep the encoded Store/Dept as categoricals and the other features as
+    float32.
+    """
+
+    def __init__(self, spec: Optional[Dict[str, Any]] = None):
+        self.spec = normalize_feature_spec(spec)
+        rolling = self.spec['rolling']
+        self.lag_columns = {k: f"Sales_lag{k}" for k in self.spec['lags']}
+        self.rolling_columns = {
+            (w, stat): f"Sales_rolling_{stat}_{w}"
+            for w in rolling['windows'] if rolling['stats']
+            for stat in rolling['stats']
+        }
+        self.holiday_columns = ['Weeks_since_holiday', 'Weeks_to_holiday'] if self.spec['holiday_distance'] else []
+        self.columns: List[str] = (
+            ['Store_encoded', 'Dept_encoded'] + self.spec['date_parts'] + ['IsHoliday']
+            + list(self.lag_columns.values()) + list(self.rolling_columns.values()) + self.holiday_columns
+        )
+        # Raw rows per series needed to compute the window features of the next row;
+        # at least one so a saved tail still covers every series
+        self.context_rows = max([1] + self.spec['lags'] + [w - 1 for w in rolling['windows']])
+
+    @property
+    def cache_key(self) -> Dict[str, Any]:
+        """What identifies the features this plan produces"""
+        return {'version': FEATURE_PIPELINE_VERSION, 'spec': self.spec}
+
+    @property
+    def incremental(self) -> bool:
+        """Whether features of appended rows can be computed from the series tails alone.
+
+        Holiday distances look at the whole calendar, including weeks after a
+        row, so they need a full recompute.
+        """
+        return not self.spec['holiday_distance']
+
+    def apply(self, df: pd.DataFrame, le_store, le_dept, workers: int = 1,
+              holidays: Optional[np.ndarray] = None) -> pd.DataFrame:
+        """Add every planned feature to df, returning it sorted by series and date.
+
+        With ``workers`` > 1 and a large enough frame, window features are
+        computed by series shards in worker processes. ``holidays`` gives the
+        holiday weeks of the whole dataset when df holds only some series.
+        """
+        # Row-wise features
+        for part in self.spec['date_parts']:
+            df[part] = DATE_PARTS[part](df['Date'])
+        df['Store_encoded'] = self.encode(df['Store'], le_store)
+        df['Dept_encoded'] = self.encode(df['Dept'], le_dept)
+
+        # One sort shared by every window feature
+        df = df.sort_values(SERIES_COLUMNS + ['Date']).reset_index(drop=True)
+        if self.lag_columns or self.rolling_columns:
+            values = df['Weekly_Sales'].to_numpy()
+            group_ids = df.groupby(SERIES_COLUMNS, observed=True, sort=False).ngroup().to_numpy()
+            if workers > 1 and len(df) >= FEATURE_PARALLEL_MIN_ROWS:
+                features = parallel_window_features(self, values, group_ids, workers)
+            else:
+                features = self.window_features(values, group_ids)
+            for column, array in features.items():
+                df[column] = array
+
+        if self.holiday_columns:
+            df['Weeks_since_holiday'], df['Weeks_to_holiday'] = self._holiday_distances(df, holidays)
+
+        # Holiday effect
+        df['IsHoliday'] = df['IsHoliday'].astype(int)
+
+        if self.spec['compact']:
+            numeric = [column for column in self.columns if column not in CATEGORICAL_FEATURES]
+            df[numeric] = df[numeric].astype('float32')
+        return df
+
+    def encode(self, values: pd.Series, encoder):
+        """Encoder codes of Store or Dept values, as a categorical over the encoder's classes in compact plans"""
+        codes = encoder.transform(values.astype(str))
+        if self.spec['compact']:
+            return pd.Categorical.from_codes(codes, categories=encoder.classes_)
+        return codes
+
+    def window_features(self, values: np.ndarray, group_ids: np.ndarray) -> Dict[str, np.ndarray]:
+        """Lag and rolling columns for values sorted by series and date"""
+        engine = GroupedWindowEngine(values, group_ids)
+        features = {column: engine.lag(k) for k, column in self.lag_columns.items()}
+        if self.rolling_columns:
+            rolling = engine.rolling_windows(self.spec['rolling']['windows'], min_periods=1)
+            for (w, stat), column in self.rolling_columns.items():
+                mean, std = rolling[w]
+                # A one-row window has no spread
+                features[column] = mean if stat == 'mean' else np.nan_to_num(std, nan=0.0)
+        return features
+
+    def window_dtypes(self, values_dtype: np.dtype) -> Dict[str, np.dtype]:
+        """dtypes window_features returns for values of ``values_dtype``"""
+        dtypes = {column: np.result_type(values_dtype, np.float32) for column in self.lag_columns.values()}
+        dtypes.update({column: np.dtype(np.float64) for column in self.rolling_columns.values()})
+        return dtypes
+
+    def _holiday_distances(self, df: pd.DataFrame, holidays: Optional[np.ndarray] = None):
+        codes, dates = pd.factorize(df['Date'], sort=True)
+        dates = dates.values.astype('datetime64[D]')
+        if holidays is None:
+            holidays = df.loc[df['IsHoliday'].astype(bool), 'Date'].values
+        holidays = np.unique(np.asarray(holidays).astype('datetime64[D]'))
+
+        since = np.full(len(dates), HOLIDAY_DISTANCE_CAP, dtype=np.int64)
+        until = np.full(len(dates), HOLIDAY_DISTANCE_CAP, dtype=np.int64)
+        if len(holidays):
+            prev = np.searchsorted(holidays, dates, side='right') - 1
+            has_prev = prev >= 0
+            since[has_prev] = (dates[has_prev] - holidays[prev[has_prev]]).astype(np.int64) // 7
+            nxt = np.searchsorted(holidays, dates, side='left')
+            has_next = nxt < len(holidays)
+            until[has_next] = (holidays[nxt[has_next]] - dates[has_next]).astype(np.int64) // 7
+        since = np.minimum(since, HOLIDAY_DISTANCE_CAP)
+        until = np.minimum(until, HOLIDAY_DISTANCE_CAP)
+        return since[codes], until[codes]
@@ -0,0 +1,261 @@
+import os
+import json
+import time
+import uuid
+import shutil
+import hashlib
+import logging
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import joblib
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from app.dataset_store import DatasetStore, CATEGORICAL_COLUMNS
+
+logger = logging.getLogger(__name__)
+
+FEATURE_STORE_DIR = os.environ.get("FEATURE_STORE_DIR", os.path.join("data", "features"))
+FEATURE_STORE_MAX_MB = int(os.environ.get("FEATURE_STORE_MAX_MB", "2048"))
+
+# Row order of the processed frame
+ORDER_COLUMNS = ['Store', 'Dept', 'Date']
+
+# X, y, processed frame, store encoder, dept encoder
+PreparedFeatures = Tuple[pd.DataFrame, pd.Series, pd.DataFrame, Any, Any]
+# (store encoder, dept encoder, tail state, new rows) -> (new feature rows, new tail state) or None
+ExtendFn = Callable[[Any, Any, pd.DataFrame, pd.DataFrame], Optional[Tuple[pd.DataFrame, pd.DataFrame]]]
+
+
+def spec_hash(spec: Dict[str, Any]) -> str:
+    """Stable hash of a feature definition"""
+    return hashlib.sha256(json.dumps(spec, sort_keys=True, default=str).encode()).hexdigest()
+
+
+class FeatureStore:
+    """On-disk cache of prepare_data output.
+
+    Each entry holds the processed frame as Parquet plus the fitted encoders,
+    and is keyed by the dataset content fingerprint and the hash of the
+    feature spec, so it is shared by every request and worker process that
+    prepares the same data the same way. Entries also keep the last raw rows
+    of every series, so that after an append only the new rows are computed.
+    Entries are evicted least recently used first once their total size
+    passes ``max_mb``.
+    """
+
+    def __init__(self, store: DatasetStore, root: str = FEATURE_STORE_DIR, max_mb: Optional[int] = None):
+        self.store = store
+        self.root = root
+        self.max_bytes = (FEATURE_STORE_MAX_MB if max_mb is None else max_mb) * 1024 * 1024
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        os.makedirs(self.root, exist_ok=True)
+
+    def entry_dir(self, fingerprint: str, spec_key: str) -> str:
+        return os.path.join(self.root, f"{fingerprint[:32]}_{spec_key[:16]}")
+
+    def get_or_build(self, dataset_id: int, spec: Dict[str, Any],
+                     build: Callable[[], Tuple[PreparedFeatures, pd.DataFrame]],
+                     extend: Optional[ExtendFn] = None) -> PreparedFeatures:
+        """Return cached features for a dataset, computing and saving them on a miss.
+
+        ``build`` computes the features and series tail state from scratch.
+        When the dataset only gained parts since an entry was saved,
+        ``extend`` computes features for the new rows from that entry and its
+        tail state instead; it may return None to force a full build.
+        """
+        fingerprint = self.store.fingerprint(dataset_id)
+        spec_key = spec_hash(spec)
+        path = self.entry_dir(fingerprint, spec_key)
+
+        features = self._read(path)
+        if features is not None:
+            with self._lock:
+                self._hits += 1
+            return features
+
+        with self._lock:
+            self._misses += 1
+        parts = self.store.part_checksums(dataset_id)
+        meta = {'dataset_id': dataset_id, 'fingerprint': fingerprint, 'spec_hash': spec_key, 'parts': parts}
+
+        base = self._find_base(dataset_id, spec_key, parts) if extend is not None else None
+        if base is not None:
+            base_path, base_meta = base
+            new_parts = [name for name, _ in parts[len(base_meta['parts']):]]
+            try:
+                encoders = joblib.load(os.path.join(base_path, "encoders.joblib"))
+                tail = self._read_tail(base_path)
+            except (OSError, ValueError):
+                extended = None
+            else:
+                extended = extend(encoders['le_store'], encoders['le_dept'], tail,
+                                  self.store.load(dataset_id, parts=new_parts))
+            if extended is not None:
+                new_frame, tail = extended
+                try:
+                    self._write(path, new_frame, tail, encoders['le_store'], encoders['le_dept'],
+                                dict(meta, feature_columns=base_meta['feature_columns']), base_path=base_path)
+                    self._evict()
+                    features = self._read(path)
+                    if features is not None:
+                        logger.info(f"Extended features of dataset {dataset_id} with {len(new_frame)} new rows")
+                        return features
+                except OSError as e:
+                    logger.warning(f"Could not save features for dataset {dataset_id}: {e}")
+                    # Fall back to a full build below
+
+        features, tail = build()
+        try:
+            self._write(path, features[2], tail, features[3], features[4],
+                        dict(meta, feature_columns=features[0].columns.tolist()))
+            self._evict()
+        except OSError as e:
+            # The cache is an optimisation; a full disk must not fail the request
+            logger.warning(f"Could not save features for dataset {dataset_id}: {e}")
+        return features
+
+    def _find_base(self, dataset_id: int, spec_key: str, parts: List[List[str]]):
+        """Newest entry of the dataset whose parts are a prefix of ``parts``"""
+        best = None
+        for path, meta, _ in self._entries():
+            base_parts = meta.get('parts', [])
+            if (meta.get('dataset_id') == dataset_id and meta.get('spec_hash') == spec_key
+                    and 0 < len(base_parts) < len(parts) and parts[:len(base_parts)] == base_parts
+                    and (best is None or len(base_parts) > len(best[1]['parts']))):
+                best = (path, meta)
+        return best
+
+    def _read(self, path: str) -> Optional[PreparedFeatures]:
+        meta_path = os.path.join(path, "meta.json")
+        try:
+            with open(meta_path) as f:
+                meta = json.load(f)
+            frame_paths = [os.path.join(path, name) for name in meta['frame_parts']]
+            df = pq.read_table(frame_paths).to_pandas()
+            encoders = joblib.load(os.path.join(path, "encoders.joblib"))
+            # Record the access for LRU eviction across processes
+            os.utime(meta_path)
+        except (OSError, ValueError, KeyError):
+            return None
+
+        for col in CATEGORICAL_COLUMNS:
+            df[col] = df[col].astype('category')
+        if len(frame_paths) > 1:
+            # Appended rows go back into series order, as a full build returns them
+            df = df.sort_values(ORDER_COLUMNS).reset_index(drop=True)
+        X = df[meta['feature_columns']]
+        y = df['Weekly_Sales']
+        return X, y, df, encoders['le_store'], encoders['le_dept']
+
+    def _read_tail(self, path: str) -> pd.DataFrame:
+        tail = pq.read_table(os.path.join(path, "tail.parquet")).to_pandas()
+        for col in CATEGORICAL_COLUMNS:
+            tail[col] = tail[col].astype('category')
+        return tail
+
+    def _write(self, path: str, frame: pd.DataFrame, tail: pd.DataFrame, le_store: Any, le_dept: Any,
+               meta: Dict[str, Any], base_path: Optional[str] = None) -> None:
+        """Save an entry; with ``base_path`` the frame holds only rows added to that entry"""
+        tmp_dir = os.path.join(self.root, f".tmp_{uuid.uuid4().hex}")
+        os.makedirs(tmp_dir)
+        try:
+            frame_parts = []
+            if base_path is not None:
+                with open(os.path.join(base_path, "meta.json")) as f:
+                    base_parts = json.load(f)['frame_parts']
+                for name in base_parts:
+                    _link_or_copy(os.path.join(base_path, name), os.path.join(tmp_dir, name))
+                frame_parts.extend(base_parts)
+            frame_parts.append(f"frame-{len(frame_parts):05d}.parquet")
+
+            pq.write_table(_to_table(frame), os.path.join(tmp_dir, frame_parts[-1]))
+            pq.write_table(_to_table(tail), os.path.join(tmp_dir, "tail.parquet"))
+            joblib.dump({'le_store': le_store, 'le_dept': le_dept}, os.path.join(tmp_dir, "encoders.joblib"))
+            meta['frame_parts'] = frame_parts
+            meta['bytes'] = sum(
+                os.path.getsize(os.path.join(tmp_dir, name)) for name in os.listdir(tmp_dir)
+            )
+            meta['created_at'] = time.time()
+            with open(os.path.join(tmp_dir, "meta.json"), "w") as f:
+                json.dump(meta, f)
+            os.replace(tmp_dir, path)
+        except OSError:
+            # Either another worker saved the same entry first or the write failed
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            if not os.path.exists(os.path.join(path, "meta.json")):
+                raise
+
+    def _entries(self):
+        """(path, meta, last access time) for every saved entry"""
+        entries = []
+        for name in os.listdir(self.root):
+            meta_path = os.path.join(self.root, name, "meta.json")
+            if name.startswith(".") or not os.path.exists(meta_path):
+                continue
+            try:
+                with open(meta_path) as f:
+                    meta = json.load(f)
+                entries.append((os.path.join(self.root, name), meta, os.path.getmtime(meta_path)))
+            except (OSError, ValueError):
+                continue
+        return entries
+
+    def _evict(self) -> None:
+        entries = sorted(self._entries(), key=lambda entry: entry[2])
+        total = sum(meta.get('bytes', 0) for _, meta, _ in entries)
+        # Always keep the most recent entry, even if it alone exceeds the budget
+        for path, meta, _ in entries[:-1]:
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(path, ignore_errors=True)
+            total -= meta.get('bytes', 0)
+            with self._lock:
+                self._evictions += 1
+
+    def invalidate(self, dataset_id: Optional[int] = None) -> int:
+        """Delete saved features for one dataset, or all of them; returns the number removed"""
+        removed = 0
+        for path, meta, _ in self._entries():
+            if dataset_id is None or meta.get('dataset_id') == dataset_id:
+                shutil.rmtree(path, ignore_errors=True)
+                removed += 1
+        return removed
+
+    def stats(self) -> Dict[str, Any]:
+        entries = self._entries()
+        with self._lock:
+            requests = self._hits + self._misses
+            return {
+                'hits': self._hits,
+                'misses': self._misses,
+                'hit_rate': self._hits / requests if requests else 0.0,
+                'evictions': self._evictions,
+                'entries': len(entries),
+                'bytes': sum(meta.get('bytes', 0) for _, meta, _ in entries),
+                'max_bytes': self.max_bytes,
+                'datasets': sorted({meta.get('dataset_id') for _, meta, _ in entries}),
+            }
+
+
+def _to_table(df: pd.DataFrame) -> pa.Table:
+    """Arrow table with categoricals stored as plain values, restored on read"""
+    df = df.copy(deep=False)
+    for col in CATEGORICAL_COLUMNS:
+        if isinstance(df[col].dtype, pd.CategoricalDtype):
+            df[col] = df[col].astype(df[col].cat.categories.dtype)
+    # Frame parts are concatenated on read, so the index is not kept
+    return pa.Table.from_pandas(df, preserve_index=False)
+
+
+def _link_or_copy(src: str, dst: str) -> None:
+    """Hard-link an unchanged file into a new entry, copying where links are unsupported"""
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
@@ -0,0 +1,275 @@
+import os
+import json
+import asyncio
+import logging
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from app.database import SessionLocal
+from app.models import Dataset, Model, TrainingJob
+from app.executor import Executor
+from app.external_memory import EXTERNAL_MEMORY_BUDGET_MB
+from app.scheduler import Scheduler, estimate_memory_mb
+from app import tasks
+
+logger = logging.getLogger(__name__)
+
+# Jobs taken off the queue at the same time; the scheduler decides which of them run
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", str(max(2, os.cpu_count() or 1))))
+
+ACTIVE_STATUSES = ("queued", "running")
+RETRYABLE_STATUSES = ("failed", "cancelled")
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+class JobManager:
+    """Runs training and optimization jobs recorded in the training_jobs table.
+
+    Endpoints create a Model row in status "training" with a queued
+    TrainingJob and return at once. Job workers in the event loop take
+    queued jobs one by one, wait for the Scheduler to admit them, then
+    claim them and run them on the Executor's process pool held to their
+    CPU allocation;
+    the task records its progress on the job row and stops at its next
+    progress report once cancellation is requested. The table is the
+    source of truth, so jobs that were queued or running when the server
+    stopped are queued again on startup.
+    """
+
+    def __init__(self, executor: Executor, scheduler: Optional[Scheduler] = None, workers: Optional[int] = None):
+        self.executor = executor
+        self.scheduler = scheduler or Scheduler()
+        self.workers = workers or JOB_WORKERS
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker_tasks: List[asyncio.Task] = []
+
+    async def start(self) -> None:
+        """Start the job workers and queue the jobs left over from the last run"""
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue()
+        for job_id in await self.executor.run_io(self._recover):
+            self._queue.put_nowait(job_id)
+        self._worker_tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self) -> None:
+        for task in self._worker_tasks:
+            task.cancel()
+        await asyncio.gather(*self._worker_tasks, return_exceptions=True)
+        self._worker_tasks = []
+
+    def submit(self, db, kind: str, model: Model, payload: Dict[str, Any], user_id: int) -> TrainingJob:
+        """Record a queued job for a freshly created Model row and schedule it"""
+        job = TrainingJob(
+            model_id=model.id,
+            dataset_id=model.dataset_id,
+            kind=kind,
+            payload=json.dumps(payload),
+            status="queued",
+            progress=0.0,
+            message="Menunggu antrean",
+            submitted_by=user_id
+        )
+        db.add(job)
+        db.commit()
+        db.refresh(job)
+        self.enqueue(job.id)
+        return job
+
+    def enqueue(self, job_id: int) -> None:
+        """Schedule a queued job; safe to call from worker threads"""
+        if self._loop is None:
+            # Not started yet; start() picks it up from the table
+            return
+        self._loop.call_soon_threadsafe(self._queue.put_nowait, job_id)
+
+    def cancel(self, db, job: TrainingJob) -> TrainingJob:
+        """Cancel a queued job at once, or ask a running one to stop"""
+        if job.status == "queued":
+            self._mark_finished(job, "cancelled", message="Dibatalkan")
+            job.model.status = "cancelled"
+        elif job.status == "running":
+            job.cancel_requested = True
+            job.message = "Pembatalan diminta"
+        else:
+            raise ValueError(f"Job dengan status {job.status} tidak dapat dibatalkan")
+        db.commit()
+        db.refresh(job)
+        return job
+
+    def retry(self, db, job: TrainingJob) -> TrainingJob:
+        """Queue a failed or cancelled job again for the same Model row"""
+        if job.status not in RETRYABLE_STATUSES:
+            raise ValueError(f"Job dengan status {job.status} tidak dapat diulang")
+        job.status = "queued"
+        job.progress = 0.0
+        job.message = "Menunggu antrean"
+        job.error = None
+        job.cancel_requested = False
+        job.started_at = None
+        job.finished_at = None
+        job.duration_seconds = None
+        job.model.status = "training"
+        db.commit()
+        db.refresh(job)
+        self.enqueue(job.id)
+        return job
+
+    def _recover(self) -> List[int]:
+        db = SessionLocal()
+        try:
+            jobs = db.query(TrainingJob).filter(TrainingJob.status.in_(ACTIVE_STATUSES)).order_by(TrainingJob.id).all()
+            for job in jobs:
+                if job.status == "running":
+                    logger.warning(f"Training job {job.id} was interrupted by a restart; queueing it again")
+                    job.status = "queued"
+                    job.message = "Dilanjutkan setelah restart"
+            db.commit()
+            return [job.id for job in jobs]
+        finally:
+            db.close()
+
+    async def _worker(self) -> None:
+        while True:
+            job_id = await self._queue.get()
+            try:
+                await self._run(job_id)
+            except Exception as e:
+                logger.error(f"Training job {job_id} could not be run: {e}")
+
+    def _claim(self, job_id: int) -> Optional[Dict[str, Any]]:
+        """Move a queued job to running; None if it was cancelled or taken meanwhile"""
+        db = SessionLocal()
+        try:
+            claimed = db.query(TrainingJob).filter(
+                TrainingJob.id == job_id, TrainingJob.status == "queued"
+            ).update({
+                TrainingJob.status: "running",
+                TrainingJob.started_at: _now(),
+                TrainingJob.attempts: TrainingJob.attempts + 1,
+                TrainingJob.message: "Memulai",
+            }, synchronize_session=False)
+            db.commit()
+            if not claimed:
+                return None
+            job = db.query(TrainingJob).filter(TrainingJob.id == job_id).first()
+            return {'kind': job.kind, 'dataset_id': job.dataset_id, 'model_id': job.model_id,
+                    'payload': json.loads(job.payload)}
+        finally:
+            db.close()
+
+    def _demand(self, job_id: int) -> Optional[Dict[str, Any]]:
+        """Scheduler kind and memory estimate of a queued job; None if it is no longer queued"""
+        db = SessionLocal()
+        try:
+            job = db.query(TrainingJob).filter(TrainingJob.id == job_id, TrainingJob.status == "queued").first()
+            if job is None:
+                return None
+            dataset = db.query(Dataset).filter(Dataset.id == job.dataset_id).first()
+            rows = dataset.records_count if dataset else None
+            payload = json.loads(job.payload)
+            if job.kind == "train" and payload.get('external_memory'):
+                memory_mb = (estimate_memory_mb('external', rows)
+                             + (payload.get('memory_budget_mb') or EXTERNAL_MEMORY_BUDGET_MB))
+            else:
+                memory_mb = estimate_memory_mb(job.kind, rows)
+            return {'kind': job.kind, 'memory_mb': memory_mb}
+        finally:
+            db.close()
+
+    async def _run(self, job_id: int) -> None:
+        demand = await self.executor.run_io(self._demand, job_id)
+        if demand is None:
+            return
+        async with self.scheduler.slot(demand['kind'], f"job {job_id}", demand['memory_mb']) as allocation:
+            await self._run_admitted(job_id, allocation.cpus)
+
+    async def _run_admitted(self, job_id: int, cpus: int) -> None:
+        claim = await self.executor.run_io(self._claim, job_id)
+        if claim is None:
+            return
+        logger.info(f"Running training job {job_id} ({claim['kind']}) for model {claim['model_id']} on {cpus} CPU")
+        payload = claim['payload']
+        try:
+            if claim['kind'] == "optimize":
+                result = await self.executor.run_cpu(
+                    tasks.run_allocated, cpus, tasks.optimize_model, claim['dataset_id'], payload['n_trials'],
+                    payload['feature_spec'], claim['model_id'], job_id, payload.get('search')
+                )
+            elif claim['kind'] == "warm_start":
+                result = await self.executor.run_cpu(
+                    tasks.run_allocated, cpus, tasks.warm_start_model, claim['dataset_id'], payload['parent_model_id'],
+                    payload['parameters'], claim['model_id'], payload.get('compare_full_retrain', False), job_id
+                )
+            elif payload.get('segment_by'):
+                result = await self.executor.run_cpu(
+                    tasks.run_allocated, cpus, tasks.train_segmented, claim['dataset_id'], payload['parameters'],
+                    payload['segment_by'], payload['feature_spec'], claim['model_id'], job_id
+                )
+            elif payload.get('external_memory'):
+                result = await self.executor.run_cpu(
+                    tasks.run_allocated, cpus, tasks.train_model_external, claim['dataset_id'], payload['parameters'],
+                    payload['feature_spec'], claim['model_id'], payload.get('memory_budget_mb'), job_id
+                )
+            else:
+                result = await self.executor.run_cpu(
+                    tasks.run_allocated, cpus, tasks.train_model, claim['dataset_id'], payload['parameters'],
+                    payload['feature_spec'], claim['model_id'], job_id
+                )
+        except tasks.JobCancelled:
+            logger.info(f"Training job {job_id} cancelled")
+            await self.executor.run_io(self._finish, job_id, "cancelled", message="Dibatalkan")
+        except Exception as e:
+            logger.error(f"Training job {job_id} failed: {e}")
+            await self.executor.run_io(self._finish, job_id, "failed", message="Gagal", error=str(e))
+        else:
+            await self.executor.run_io(self._finish, job_id, "completed", message="Selesai", result=result)
+
+    def _finish(self, job_id: int, status: str, message: str, error: Optional[str] = None,
+                result: Optional[Dict[str, Any]] = None) -> None:
+        db = SessionLocal()
+        try:
+            job = db.query(TrainingJob).filter(TrainingJob.id == job_id).first()
+            self._mark_finished(job, status, message=message, error=error)
+            model = job.model
+            model.status = status
+            if result is not None:
+                model.metrics = json.dumps(result['metrics'])
+                if 'best_params' in result:
+                    model.parameters = json.dumps(result['best_params'])
+                job.progress = 1.0
+            db.commit()
+        finally:
+            db.close()
+
+    @staticmethod
+    def _mark_finished(job: TrainingJob, status: str, message: str, error: Optional[str] = None) -> None:
+        job.status = status
+        job.message = message
+        job.error = error
+        job.finished_at = _now()
+        if job.started_at is not None:
+            started = job.started_at if job.started_at.tzinfo else job.started_at.replace(tzinfo=timezone.utc)
+            job.duration_seconds = round((job.finished_at - started).total_seconds(), 3)
+
+
+def job_to_dict(job: TrainingJob) -> Dict[str, Any]:
+    return {
+        "id": job.id,
+        "model_id": job.model_id,
+        "dataset_id": job.dataset_id,
+        "kind": job.kind,
+        "status": job.status,
+        "progress": job.progress,
+        "message": job.message,
+        "error": job.error,
+        "attempts": job.attempts,
+        "cancel_requested": bool(job.cancel_requested),
+        "created_at": job.created_at.isoformat() if job.created_at else None,
+        "started_at": job.started_at.isoformat() if job.started_at else None,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+        "duration_seconds": job.duration_seconds,
+    }
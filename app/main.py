@@ -6,23 +6,32 @@ logger = logging.getLogger(__name__)
 print("DEBUG: app/main.py loaded") # Debug print
 
 # Import Base and engine first to ensure they are available
-from app.database import Base, engine, get_db
+from app.database import Base, engine, get_db, migrate_schema
 from fastapi import FastAPI, Depends, HTTPException, status, UploadFile, File
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from sqlalchemy import func
 from sqlalchemy.orm import Session
-import pandas as pd
 import json
 from typing import List, Optional
 import os
 from dotenv import load_dotenv
 from fastapi import FastAPI
 from app.init_db import init_database
-from app.models import User, Dataset, Model, Prediction, Feedback
+from app.models import User, Dataset, Model, Prediction, PredictionRun, Feedback, TrainingJob
 from app.schemas import *
 from app.auth import authenticate_user, create_access_token, get_current_user, get_password_hash, verify_password
-from app.ml_service import MLService
-from app.visualization import VisualizationService
+from app.dataset_store import DatasetStore
+from app.feature_store import FeatureStore
+from app.feature_spec import FeaturePlan
+from app.executor import Executor
+from app.jobs import JobManager, job_to_dict
+from app.scheduler import Scheduler, estimate_memory_mb
+from app.prediction_writer import write_predictions
+from app.prediction_runs import backfill_runs, fail_run, iter_run_csv, merge_summaries, run_to_dict, start_run
+from app.tuning import normalize_search_spec, study_name, trial_history
+from app.segments import SEGMENT_BY
+from app import tasks
 
 print("DEBUG MAIN: Base object imported:", Base) # Add this line to check Base object
 load_dotenv()
@@ -30,11 +39,31 @@ load_dotenv()
 
 # Create tables
 Base.metadata.create_all(bind=engine)
+migrate_schema()
+# Predictions saved before prediction runs existed get one run per model
+backfill_runs()
 
 app = FastAPI(title="Walmart Sales Analysis API", version="1.0.0")
 
+# Blocking work runs in bounded thread/process pools instead of on the event loop
+executor = Executor()
+# CPU and memory budgets for ML runs; predictions are admitted before batch work
+scheduler = Scheduler()
+# Training and optimization run as background jobs on the executor
+job_manager = JobManager(executor, scheduler)
+
+@app.on_event("startup")
+async def start_executor():
+    executor.start()
+    await job_manager.start()
+
+@app.on_event("shutdown")
+async def stop_executor():
+    await job_manager.stop()
+    executor.shutdown()
+
 @app.post("/init-db")
-async def initialize_database():
+def initialize_database():
     init_database()
     return {"message": "Database initialized"}
 
@@ -49,12 +78,12 @@ app.add_middleware(
 )
 
 security = HTTPBearer()
-ml_service = MLService()
-viz_service = VisualizationService()
+dataset_store = DatasetStore()
+feature_store = FeatureStore(dataset_store)
 
 
 @app.post("/auth/login", response_model=TokenResponse)
-async def login(user_credentials: UserLogin, db: Session = Depends(get_db)):
+def login(user_credentials: UserLogin, db: Session = Depends(get_db)):
     user = authenticate_user(db, user_credentials.username, user_credentials.password)
     if not user:
         raise HTTPException(
@@ -75,7 +104,7 @@ async def login(user_credentials: UserLogin, db: Session = Depends(get_db)):
     }
 
 @app.get("/auth/me", response_model=UserResponse)
-async def get_current_user_info(current_user: User = Depends(get_current_user)):
+def get_current_user_info(current_user: User = Depends(get_current_user)):
     logger.info(f"Accessing /auth/me. User: {current_user.username}, Role: {current_user.role}")
     return current_user
 
@@ -97,49 +126,49 @@ async def upload_dataset(
     if not file.filename.endswith('.csv'):
         raise HTTPException(status_code=400, detail="File harus berformat CSV")
     
-    # Read and validate CSV
+    # Stream, validate and stage the CSV in bounded-size chunks
     try:
-        df = pd.read_csv(file.file)
+        ingest = await executor.run_io(dataset_store.ingest_csv, file.file)
         
-        # Validate required columns for Walmart dataset
-        required_columns = ['Store', 'Dept', 'Date', 'Weekly_Sales', 'IsHoliday']
-        missing_columns = [col for col in required_columns if col not in df.columns]
-        
-        if missing_columns:
-            raise HTTPException(
-                status_code=400, 
-                detail=f"Kolom yang hilang: {', '.join(missing_columns)}"
+        def save_dataset() -> Dataset:
+            # Save dataset to database; the row is committed only once its data is published
+            dataset = Dataset(
+                name=file.filename,
+                store_id=store_id or f"Store_{ingest['first_store']}",
+                records_count=ingest['records_count'],
+                file_size=file.size,
+                uploaded_by=current_user.id,
+                columns=json.dumps(ingest['columns']),
+                status="completed"
             )
+            
+            dataset_id = None
+            try:
+                db.add(dataset)
+                db.flush()
+                # Persist data in the columnar dataset store
+                dataset_store.publish_ingest(ingest, dataset.id)
+                dataset_id = dataset.id
+                db.commit()
+            except Exception:
+                db.rollback()
+                if dataset_id is None:
+                    dataset_store.discard_ingest(ingest)
+                else:
+                    dataset_store.delete(dataset_id)
+                raise
+            db.refresh(dataset)
+            return dataset
         
-        # Convert Date column
-        df['Date'] = pd.to_datetime(df['Date'])
-        
-        # Save dataset to database
-        dataset = Dataset(
-            name=file.filename,
-            store_id=store_id or f"Store_{df['Store'].iloc[0]}",
-            records_count=len(df),
-            file_size=file.size,
-            uploaded_by=current_user.id,
-            columns=json.dumps(df.columns.tolist()),
-            status="completed"
-        )
-        
-        db.add(dataset)
-        db.commit()
-        db.refresh(dataset)
-        
-        # Save data to CSV file
-        os.makedirs("data", exist_ok=True)
-        file_path = f"data/dataset_{dataset.id}.csv"
-        df.to_csv(file_path, index=False)
+        dataset = await executor.run_io(save_dataset)
         
         print("DEBUG MAIN: Dataset uploaded and processed successfully.") # New debug print
         return {
             "message": "Dataset berhasil diunggah",
             "dataset_id": dataset.id,
-            "records": len(df),
-            "columns": df.columns.tolist()
+            "records": ingest['records_count'],
+            "columns": ingest['columns'],
+            "store_summary": ingest['store_summary']
         }
         
     except Exception as e:
@@ -147,8 +176,65 @@ async def upload_dataset(
         print(f"DEBUG MAIN: Error during upload: {str(e)}") # New debug print
         raise HTTPException(status_code=400, detail=f"Error memproses file: {str(e)}")
 
+@app.post("/datasets/{dataset_id}/append")
+async def append_dataset(
+    dataset_id: int,
+    file: UploadFile = File(...),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    logger.info(f"Attempting to append to dataset {dataset_id}. User: {current_user.username}, Role: {current_user.role}")
+    if current_user.role not in ["admin", "main_admin"]:
+        logger.warning(f"User {current_user.username} (Role: {current_user.role}) denied access to append dataset.")
+        raise HTTPException(status_code=403, detail="Akses ditolak")
+    
+    if not file.filename.endswith('.csv'):
+        raise HTTPException(status_code=400, detail="File harus berformat CSV")
+    
+    dataset = await executor.run_io(db.query(Dataset).filter(Dataset.id == dataset_id).first)
+    if not dataset:
+        raise HTTPException(status_code=404, detail="Dataset tidak ditemukan")
+    
+    if not await executor.run_io(dataset_store.exists, dataset.id):
+        raise HTTPException(status_code=404, detail="File dataset tidak ditemukan")
+    
+    # New weeks become a new part; features are extended from cached state on next use
+    try:
+        ingest = await executor.run_io(dataset_store.ingest_csv, file.file)
+        part = await executor.run_io(dataset_store.append_ingest, ingest, dataset.id)
+    except Exception as e:
+        logger.error(f"Error appending to dataset {dataset_id} for user {current_user.username}: {e}")
+        raise HTTPException(status_code=400, detail=f"Error memproses file: {str(e)}")
+    
+    def update_dataset() -> None:
+        try:
+            dataset.records_count = (dataset.records_count or 0) + ingest['records_count']
+            dataset.file_size = (dataset.file_size or 0) + (file.size or 0)
+            db.commit()
+        except Exception:
+            # Keep the store in step with the row
+            db.rollback()
+            dataset_store.remove_part(dataset_id, part)
+            raise
+        db.refresh(dataset)
+    
+    try:
+        await executor.run_io(update_dataset)
+    except Exception as e:
+        logger.error(f"Error updating dataset {dataset_id} after append for user {current_user.username}: {e}")
+        raise HTTPException(status_code=500, detail=f"Error menyimpan dataset: {str(e)}")
+    
+    return {
+        "message": "Data berhasil ditambahkan ke dataset",
+        "dataset_id": dataset.id,
+        "part": part,
+        "records_added": ingest['records_count'],
+        "records": dataset.records_count,
+        "store_summary": ingest['store_summary']
+    }
+
 @app.get("/datasets", response_model=List[DatasetResponse])
-async def get_datasets(
+def get_datasets(
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
@@ -157,7 +243,7 @@ async def get_datasets(
     return datasets
 
 @app.post("/models/train")
-async def train_model(
+def train_model(
     request: TrainModelRequest,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
@@ -168,48 +254,94 @@ async def train_model(
         raise HTTPException(status_code=403, detail="Akses ditolak")
     
     try:
-        # Get dataset
-        dataset = db.query(Dataset).filter(Dataset.id == request.dataset_id).first()
-        if not dataset:
-            raise HTTPException(status_code=404, detail="Dataset tidak ditemukan")
-        
-        # Load data
-        file_path = f"data/dataset_{dataset.id}.csv"
-        if not os.path.exists(file_path):
-            raise HTTPException(status_code=404, detail="File dataset tidak ditemukan")
-        
-        df = pd.read_csv(file_path)
-        
-        # Train model
-        model_result = ml_service.train_model(df, request.parameters)
-        
-        # Save model to database
+        feature_spec = FeaturePlan(request.feature_spec).spec
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Spesifikasi fitur tidak valid: {str(e)}")
+    
+    # A warm start continues a finished model with that model's feature spec
+    parent = None
+    if request.parent_model_id is not None:
+        parent = db.query(Model).filter(Model.id == request.parent_model_id).first()
+        if not parent:
+            raise HTTPException(status_code=404, detail="Model induk tidak ditemukan")
+        if parent.status != "completed":
+            raise HTTPException(status_code=409, detail="Model induk belum selesai dilatih")
+        parent_spec = FeaturePlan(json.loads(parent.feature_spec) if parent.feature_spec else None).spec
+        if request.feature_spec is not None and feature_spec != parent_spec:
+            raise HTTPException(status_code=400, detail="Spesifikasi fitur harus sama dengan model induk")
+        feature_spec = parent_spec
+        if request.external_memory:
+            raise HTTPException(status_code=400, detail="Warm start tidak mendukung mode memori eksternal")
+        if request.segment_by is not None:
+            raise HTTPException(status_code=400, detail="Warm start tidak mendukung model tersegmentasi")
+        if parent.algorithm == "XGBoost_Segmented":
+            raise HTTPException(status_code=400, detail="Model induk tersegmentasi tidak dapat dilanjutkan")
+    if request.memory_budget_mb is not None and request.memory_budget_mb < 16:
+        raise HTTPException(status_code=400, detail="Batas memori minimal 16 MB")
+    if request.segment_by is not None:
+        if request.segment_by not in SEGMENT_BY:
+            raise HTTPException(status_code=400, detail=f"Segmentasi tidak dikenal: {request.segment_by}")
+        if request.external_memory:
+            raise HTTPException(status_code=400, detail="Model tersegmentasi tidak mendukung mode memori eksternal")
+    
+    # Get dataset
+    dataset = db.query(Dataset).filter(Dataset.id == request.dataset_id).first()
+    if not dataset:
+        raise HTTPException(status_code=404, detail="Dataset tidak ditemukan")
+    if not dataset_store.exists(dataset.id):
+        raise HTTPException(status_code=404, detail="File dataset tidak ditemukan")
+    
+    try:
+        # Register the model first so its artifact is saved under the row id
+        if parent:
+            algorithm = "XGBoost_WarmStart"
+        elif request.segment_by:
+            algorithm = "XGBoost_Segmented"
+        else:
+            algorithm = "XGBoost"
         model = Model(
-            name=f"XGBoost_Model_{dataset.id}",
+            name=f"XGBoost_WarmStart_{dataset.id}" if parent else f"{algorithm}_Model_{dataset.id}",
             dataset_id=dataset.id,
-            algorithm="XGBoost",
+            algorithm=algorithm,
             parameters=json.dumps(request.parameters),
-            metrics=json.dumps(model_result['metrics']),
+            feature_spec=json.dumps(feature_spec),
+            parent_model_id=parent.id if parent else None,
             trained_by=current_user.id,
-            status="completed"
+            status="training"
         )
-        
         db.add(model)
         db.commit()
         db.refresh(model)
         
+        # Training runs as a background job
+        if parent:
+            job = job_manager.submit(db, "warm_start", model, {
+                "parameters": request.parameters or {},
+                "parent_model_id": parent.id,
+                "compare_full_retrain": request.compare_full_retrain
+            }, current_user.id)
+        else:
+            job = job_manager.submit(db, "train", model, {
+                "parameters": request.parameters or {},
+                "feature_spec": feature_spec,
+                "external_memory": request.external_memory,
+                "memory_budget_mb": request.memory_budget_mb,
+                "segment_by": request.segment_by
+            }, current_user.id)
+        
         return {
-            "message": "Model berhasil dilatih",
+            "message": "Pelatihan model dijadwalkan",
             "model_id": model.id,
-            "metrics": model_result['metrics']
+            "job_id": job.id,
+            "status": job.status
         }
         
     except Exception as e:
-        logger.error(f"Error training model for user {current_user.username}: {e}")
+        logger.error(f"Error scheduling training for user {current_user.username}: {e}")
         raise HTTPException(status_code=500, detail=f"Error melatih model: {str(e)}")
 
 @app.post("/models/optimize")
-async def optimize_model(
+def optimize_model(
     request: OptimizeModelRequest,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
@@ -220,47 +352,158 @@ async def optimize_model(
         raise HTTPException(status_code=403, detail="Akses ditolak")
     
     try:
-        # Get dataset
-        dataset = db.query(Dataset).filter(Dataset.id == request.dataset_id).first()
-        if not dataset:
-            raise HTTPException(status_code=404, detail="Dataset tidak ditemukan")
-        
-        # Load data
-        file_path = f"data/dataset_{dataset.id}.csv"
-        df = pd.read_csv(file_path)
-        
-        # Optimize model with Optuna
-        optimization_result = ml_service.optimize_model(df, request.n_trials)
-        
-        # Save optimized model
+        feature_spec = FeaturePlan(request.feature_spec).spec
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Spesifikasi fitur tidak valid: {str(e)}")
+    try:
+        search = normalize_search_spec(request.search)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Spesifikasi pencarian tidak valid: {str(e)}")
+    
+    # Get dataset
+    dataset = db.query(Dataset).filter(Dataset.id == request.dataset_id).first()
+    if not dataset:
+        raise HTTPException(status_code=404, detail="Dataset tidak ditemukan")
+    if not dataset_store.exists(dataset.id):
+        raise HTTPException(status_code=404, detail="File dataset tidak ditemukan")
+    
+    try:
+        # Register the model first so its artifact is saved under the row id
         model = Model(
             name=f"Optimized_XGBoost_{dataset.id}",
             dataset_id=dataset.id,
             algorithm="XGBoost_Optimized",
-            parameters=json.dumps(optimization_result['best_params']),
-            metrics=json.dumps(optimization_result['metrics']),
+            feature_spec=json.dumps(feature_spec),
             trained_by=current_user.id,
-            status="completed"
+            status="training"
         )
-        
         db.add(model)
         db.commit()
         db.refresh(model)
         
+        # Optuna search runs as a background job
+        job = job_manager.submit(db, "optimize", model, {
+            "n_trials": request.n_trials,
+            "feature_spec": feature_spec,
+            "search": search
+        }, current_user.id)
+        
         return {
-            "message": "Optimasi model selesai",
+            "message": "Optimasi model dijadwalkan",
             "model_id": model.id,
-            "best_params": optimization_result['best_params'],
-            "metrics": optimization_result['metrics'],
-            "trials_completed": request.n_trials
+            "job_id": job.id,
+            "status": job.status,
+            "trials_requested": request.n_trials
         }
         
     except Exception as e:
-        logger.error(f"Error optimizing model for user {current_user.username}: {e}")
+        logger.error(f"Error scheduling optimization for user {current_user.username}: {e}")
         raise HTTPException(status_code=500, detail=f"Error optimasi model: {str(e)}")
 
+@app.post("/models/backtest")
+async def backtest_models(
+    request: BacktestRequest,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    logger.info(f"Attempting to backtest models. User: {current_user.username}, Role: {current_user.role}")
+    if current_user.role not in ["admin", "main_admin"]:
+        logger.warning(f"User {current_user.username} (Role: {current_user.role}) denied access to /models/backtest.")
+        raise HTTPException(status_code=403, detail="Akses ditolak")
+    if not request.model_ids:
+        raise HTTPException(status_code=400, detail="Pilih minimal satu model")
+    
+    dataset = await executor.run_io(db.query(Dataset).filter(Dataset.id == request.dataset_id).first)
+    if not dataset:
+        raise HTTPException(status_code=404, detail="Dataset tidak ditemukan")
+    if not await executor.run_io(dataset_store.exists, dataset.id):
+        raise HTTPException(status_code=404, detail="File dataset tidak ditemukan")
+    models = await executor.run_io(db.query(Model).filter(Model.id.in_(request.model_ids)).all)
+    missing = sorted(set(request.model_ids) - {model.id for model in models})
+    if missing:
+        raise HTTPException(status_code=404, detail=f"Model tidak ditemukan: {missing}")
+    unfinished = sorted(model.id for model in models if model.status != "completed")
+    if unfinished:
+        raise HTTPException(status_code=409, detail=f"Model belum selesai dilatih: {unfinished}")
+    
+    try:
+        # Each model's configuration is refitted on expanding windows and scored on the weeks after each cutoff
+        async with scheduler.slot("backtest", f"models {request.model_ids}",
+                                  estimate_memory_mb("backtest", dataset.records_count)) as allocation:
+            return await executor.run_cpu(
+                tasks.run_allocated, allocation.cpus, tasks.backtest_models, dataset.id, request.model_ids,
+                request.n_folds, request.horizon_weeks
+            )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error backtesting models for user {current_user.username}: {e}")
+        raise HTTPException(status_code=500, detail=f"Error backtest model: {str(e)}")
+
+def get_job_or_404(db: Session, job_id: int) -> TrainingJob:
+    job = db.query(TrainingJob).filter(TrainingJob.id == job_id).first()
+    if not job:
+        raise HTTPException(status_code=404, detail="Job pelatihan tidak ditemukan")
+    return job
+
+@app.get("/models/jobs")
+def get_training_jobs(
+    job_status: Optional[str] = None,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    logger.info(f"Accessing /models/jobs. User: {current_user.username}, Role: {current_user.role}")
+    query = db.query(TrainingJob)
+    if job_status:
+        query = query.filter(TrainingJob.status == job_status)
+    return [job_to_dict(job) for job in query.order_by(TrainingJob.id.desc()).all()]
+
+@app.get("/models/jobs/{job_id}")
+def get_training_job(job_id: int, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+    return job_to_dict(get_job_or_404(db, job_id))
+
+@app.post("/models/jobs/{job_id}/cancel")
+def cancel_training_job(job_id: int, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+    logger.info(f"Attempting to cancel training job {job_id}. User: {current_user.username}, Role: {current_user.role}")
+    if current_user.role not in ["admin", "main_admin"]:
+        logger.warning(f"User {current_user.username} (Role: {current_user.role}) denied access to cancel training job.")
+        raise HTTPException(status_code=403, detail="Akses ditolak")
+    try:
+        job = job_manager.cancel(db, get_job_or_404(db, job_id))
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return job_to_dict(job)
+
+@app.post("/models/jobs/{job_id}/retry")
+def retry_training_job(job_id: int, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+    logger.info(f"Attempting to retry training job {job_id}. User: {current_user.username}, Role: {current_user.role}")
+    if current_user.role not in ["admin", "main_admin"]:
+        logger.warning(f"User {current_user.username} (Role: {current_user.role}) denied access to retry training job.")
+        raise HTTPException(status_code=403, detail="Akses ditolak")
+    try:
+        job = job_manager.retry(db, get_job_or_404(db, job_id))
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return job_to_dict(job)
+
+@app.get("/models/{model_id}/trials")
+def get_model_trials(model_id: int, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+    logger.info(f"Accessing trials of model {model_id}. User: {current_user.username}, Role: {current_user.role}")
+    model = db.query(Model).filter(Model.id == model_id).first()
+    if not model:
+        raise HTTPException(status_code=404, detail="Model tidak ditemukan")
+    trials = trial_history(study_name(model.id))
+    if trials is None:
+        raise HTTPException(status_code=404, detail="Riwayat optimasi tidak ditemukan")
+    completed = [trial for trial in trials if trial["state"] == "COMPLETE"]
+    # With successive halving only the last rung trained on all rows
+    top_rung = max((trial["rung"] for trial in completed), default=0)
+    finalists = [trial for trial in completed if trial["rung"] == top_rung]
+    best = min(finalists, key=lambda trial: trial["value"]) if finalists else None
+    return {"model_id": model.id, "trials": trials, "best_trial": best}
+
 @app.get("/models", response_model=List[ModelResponse])
-async def get_models(
+def get_models(
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
@@ -281,7 +524,9 @@ async def get_models(
                 "metrics": metrics,
                 "dataset_id": model.dataset_id,
                 "trained_by": model.trained_by,
-                "parameters": model.parameters
+                "parameters": model.parameters,
+                "feature_spec": model.feature_spec,
+                "parent_model_id": model.parent_model_id
             }
             formatted_models.append(formatted_model)
         except Exception as e:
@@ -296,7 +541,9 @@ async def get_models(
                 "metrics": {},
                 "dataset_id": model.dataset_id,
                 "trained_by": model.trained_by,
-                "parameters": model.parameters
+                "parameters": model.parameters,
+                "feature_spec": model.feature_spec,
+                "parent_model_id": model.parent_model_id
             })
     
     return formatted_models
@@ -310,38 +557,34 @@ async def generate_predictions(
     logger.info(f"Attempting to generate predictions. User: {current_user.username}, Role: {current_user.role}")
     try:
         # Get model and dataset
-        model = db.query(Model).filter(Model.id == request.model_id).first()
+        model = await executor.run_io(db.query(Model).filter(Model.id == request.model_id).first)
         if not model:
             raise HTTPException(status_code=404, detail="Model tidak ditemukan")
         
-        dataset = db.query(Dataset).filter(Dataset.id == model.dataset_id).first()
-        file_path = f"data/dataset_{dataset.id}.csv"
-        df = pd.read_csv(file_path)
-        
-        # Generate categorized predictions
-        prediction_result = ml_service.generate_predictions_by_category(df, model.id)
+        dataset = await executor.run_io(db.query(Dataset).filter(Dataset.id == model.dataset_id).first)
         
-        # Save predictions to database with enhanced data
-        for pred in prediction_result['all_results']:
-            classification_data = pred.get('classification_data', {})
-            
-            prediction = Prediction(
-                model_id=model.id,
-                store_id=pred['store'],
-                dept_id=pred['dept'],
-                predicted_sales=pred['predicted_sales'],
-                actual_sales=pred.get('actual_sales'),
-                abc_class=classification_data.get('abc_class'),
-                xyz_class=classification_data.get('xyz_class'),
-                created_by=current_user.id
-            )
-            db.add(prediction)
+        # Every generation is a run; its rows and summary are written together at the end
+        run_id = await executor.run_io(start_run, model.id, dataset.id, current_user.id)
+        try:
+            # Generate categorized predictions with the features the model was trained on
+            async with scheduler.slot("predict", f"model {model.id}",
+                                      estimate_memory_mb("predict", dataset.records_count)) as allocation:
+                prediction_result = await executor.run_cpu(
+                    tasks.run_allocated, allocation.cpus, tasks.generate_predictions, dataset.id, model.id,
+                    json.loads(model.feature_spec) if model.feature_spec else None
+                )
+        except Exception as e:
+            await executor.run_io(fail_run, run_id, str(e))
+            raise
         
-        db.commit()
+        # Save predictions to database in committed batches
+        summary = await executor.run_io(write_predictions, run_id, prediction_result)
         
         return {
             "message": "Prediksi berhasil dibuat dengan kategorisasi",
+            "run_id": run_id,
             "predictions_count": prediction_result['total_predictions'],
+            "summary": summary,
             "category_breakdown": prediction_result['category_metrics'],
             "abc_xyz_classification": prediction_result['abc_xyz_classification']
         }
@@ -352,7 +595,7 @@ async def generate_predictions(
 
 # New endpoint for categorized predictions
 @app.get("/predictions/categorized")
-async def get_categorized_predictions(
+def get_categorized_predictions(
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
@@ -410,8 +653,9 @@ async def get_categorized_predictions(
     }
 
 @app.get("/predictions", response_model=List[PredictionResponse])
-async def get_predictions(
+def get_predictions(
     model_id: Optional[int] = None,
+    run_id: Optional[int] = None,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
@@ -419,6 +663,8 @@ async def get_predictions(
     query = db.query(Prediction)
     if model_id:
         query = query.filter(Prediction.model_id == model_id)
+    if run_id:
+        query = query.filter(Prediction.run_id == run_id)
     
     predictions = query.all()
     return predictions
@@ -431,15 +677,11 @@ async def get_sales_trend(
 ):
     logger.info(f"Accessing /visualizations/sales-trend. User: {current_user.username}, Role: {current_user.role}")
     try:
-        dataset = db.query(Dataset).filter(Dataset.id == dataset_id).first()
+        dataset = await executor.run_io(db.query(Dataset).filter(Dataset.id == dataset_id).first)
         if not dataset:
             raise HTTPException(status_code=404, detail="Dataset tidak ditemukan")
         
-        file_path = f"data/dataset_{dataset.id}.csv"
-        df = pd.read_csv(file_path)
-        
-        chart_data = viz_service.create_sales_trend_chart(df)
-        return chart_data
+        return await executor.run_cpu(tasks.sales_trend_chart, dataset.id)
         
     except Exception as e:
         logger.error(f"Error creating sales trend visualization for user {current_user.username}: {e}")
@@ -453,22 +695,18 @@ async def get_abc_xyz_heatmap(
 ):
     logger.info(f"Accessing /visualizations/abc-xyz-heatmap. User: {current_user.username}, Role: {current_user.role}")
     try:
-        dataset = db.query(Dataset).filter(Dataset.id == dataset_id).first()
+        dataset = await executor.run_io(db.query(Dataset).filter(Dataset.id == dataset_id).first)
         if not dataset:
             raise HTTPException(status_code=404, detail="Dataset tidak ditemukan")
         
-        file_path = f"data/dataset_{dataset.id}.csv"
-        df = pd.read_csv(file_path)
-        
-        chart_data = viz_service.create_abc_xyz_heatmap(df)
-        return chart_data
+        return await executor.run_cpu(tasks.abc_xyz_heatmap, dataset.id)
         
     except Exception as e:
         logger.error(f"Error creating ABC-XYZ heatmap for user {current_user.username}: {e}")
         raise HTTPException(status_code=500, detail=f"Error membuat heatmap: {str(e)}")
 
 @app.post("/feedback")
-async def submit_feedback(
+def submit_feedback(
     feedback_data: FeedbackCreate,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
@@ -489,7 +727,7 @@ async def submit_feedback(
     return {"message": "Umpan balik berhasil dikirim", "feedback_id": feedback.id}
 
 @app.get("/feedback", response_model=List[FeedbackResponse])
-async def get_feedback(
+def get_feedback(
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
@@ -502,7 +740,7 @@ async def get_feedback(
     return feedback
 
 @app.get("/dashboard/stats")
-async def get_dashboard_stats(
+def get_dashboard_stats(
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
@@ -510,7 +748,8 @@ async def get_dashboard_stats(
     stats = {
         "total_datasets": db.query(Dataset).count(),
         "total_models": db.query(Model).count(),
-        "total_predictions": db.query(Prediction).count(),
+        "total_predictions": db.query(func.coalesce(func.sum(PredictionRun.rows_count), 0))
+                                .filter(PredictionRun.status == "completed").scalar(),
         "total_feedback": db.query(Feedback).count()
     }
     
@@ -521,15 +760,18 @@ async def get_dashboard_stats(
 
 # Enhanced dashboard stats for managers
 @app.get("/dashboard/manager-stats")
-async def get_manager_dashboard_stats(
+def get_manager_dashboard_stats(
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     logger.info(f"Accessing /dashboard/manager-stats. User: {current_user.username}, Role: {current_user.role}")
     
-    predictions = db.query(Prediction).all()
+    # Aggregates of every completed run, from the summaries computed when they were written
+    summaries = [json.loads(summary) for (summary,) in db.query(PredictionRun.summary).filter(
+        PredictionRun.status == "completed", PredictionRun.summary.isnot(None)
+    )]
     
-    if not predictions:
+    if not summaries:
         return {
             "category_summary": {},
             "revenue_impact": {},
@@ -537,30 +779,9 @@ async def get_manager_dashboard_stats(
             "stock_recommendations": {}
         }
     
-    # Group by categories
-    categories = {}
-    total_revenue = 0
-    
-    for pred in predictions:
-        category = f"{pred.abc_class or 'C'}-{pred.xyz_class or 'Z'}"
-        
-        if category not in categories:
-            categories[category] = {
-                'count': 0,
-                'total_predicted': 0,
-                'total_actual': 0,
-                'accuracies': []
-            }
-        
-        categories[category]['count'] += 1
-        categories[category]['total_predicted'] += pred.predicted_sales
-        categories[category]['total_actual'] += pred.actual_sales or 0
-        
-        if pred.actual_sales and pred.actual_sales != 0:
-            accuracy = 100 * (1 - abs(pred.actual_sales - pred.predicted_sales) / pred.actual_sales)
-            categories[category]['accuracies'].append(accuracy)
-        
-        total_revenue += pred.actual_sales or pred.predicted_sales
+    merged = merge_summaries(summaries)
+    categories = merged['categories']
+    total_revenue = merged['overall']['revenue']
     
     # Calculate summary metrics
     category_summary = {}
@@ -569,7 +790,7 @@ async def get_manager_dashboard_stats(
     stock_recommendations = {}
     
     for category, data in categories.items():
-        avg_accuracy = sum(data['accuracies']) / len(data['accuracies']) if data['accuracies'] else 0
+        avg_accuracy = data['avg_accuracy'] or 0
         
         category_summary[category] = {
             'product_count': data['count'],
@@ -577,9 +798,9 @@ async def get_manager_dashboard_stats(
             'confidence_level': 'Tinggi' if avg_accuracy > 90 else 'Sedang' if avg_accuracy > 80 else 'Rendah'
         }
         
-        revenue_percentage = (data['total_actual'] / total_revenue * 100) if total_revenue > 0 else 0
+        revenue_percentage = (data['total_actual_sales'] / total_revenue * 100) if total_revenue > 0 else 0
         revenue_impact[category] = {
-            'total_revenue': data['total_actual'],
+            'total_revenue': data['total_actual_sales'],
             'percentage': round(revenue_percentage, 2),
             'priority': 'Tinggi' if category.startswith('A') else 'Sedang' if category.startswith('B') else 'Rendah'
         }
@@ -605,7 +826,7 @@ async def get_manager_dashboard_stats(
         }
         
         # Stock recommendations
-        avg_sales = data['total_actual'] / data['count'] if data['count'] > 0 else 0
+        avg_sales = data['total_actual_sales'] / data['count'] if data['count'] > 0 else 0
         if abc == 'A':
             stock_weeks = 4 if xyz == 'X' else 3 if xyz == 'Y' else 2
         elif abc == 'B':
@@ -628,7 +849,7 @@ async def get_manager_dashboard_stats(
 
 # Continue with existing endpoints...
 @app.get("/api/users", response_model=List[UserResponse])
-async def get_all_users(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+def get_all_users(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
     logger.info(f"Accessing /api/users. User: {current_user.username}, Role: {current_user.role}")
     if current_user.role != "main_admin":
         logger.warning(f"User {current_user.username} (Role: {current_user.role}) denied access to /api/users.")
@@ -637,7 +858,7 @@ async def get_all_users(current_user: User = Depends(get_current_user), db: Sess
     return users
 
 @app.post("/api/users", response_model=UserResponse)
-async def create_user(user_create: UserCreate, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+def create_user(user_create: UserCreate, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
     logger.info(f"Attempting to create user. User: {current_user.username}, Role: {current_user.role}")
     if current_user.role != "main_admin":
         logger.warning(f"User {current_user.username} (Role: {current_user.role}) denied access to create user.")
@@ -663,7 +884,7 @@ async def create_user(user_create: UserCreate, current_user: User = Depends(get_
     return new_user
 
 @app.put("/api/users/{user_id}", response_model=UserResponse)
-async def update_user(user_id: int, user_update: UserUpdate, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+def update_user(user_id: int, user_update: UserUpdate, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
     logger.info(f"Attempting to update user {user_id}. User: {current_user.username}, Role: {current_user.role}")
     if current_user.role != "main_admin":
         logger.warning(f"User {current_user.username} (Role: {current_user.role}) denied access to update user.")
@@ -682,7 +903,7 @@ async def update_user(user_id: int, user_update: UserUpdate, current_user: User
     return db_user
 
 @app.delete("/api/users/{user_id}")
-async def delete_user(user_id: int, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+def delete_user(user_id: int, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
     logger.info(f"Attempting to delete user {user_id}. User: {current_user.username}, Role: {current_user.role}")
     if current_user.role != "main_admin":
         logger.warning(f"User {current_user.username} (Role: {current_user.role}) denied access to delete user.")
@@ -698,7 +919,7 @@ async def delete_user(user_id: int, current_user: User = Depends(get_current_use
     return {"message": "Pengguna berhasil dihapus"}
 
 @app.post("/api/users/{user_id}/reset-password")
-async def reset_user_password(user_id: int, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+def reset_user_password(user_id: int, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
     logger.info(f"Attempting to reset password for user {user_id}. User: {current_user.username}, Role: {current_user.role}")
     if current_user.role != "main_admin":
         logger.warning(f"User {current_user.username} (Role: {current_user.role}) denied access to reset password.")
@@ -716,7 +937,7 @@ async def reset_user_password(user_id: int, current_user: User = Depends(get_cur
     return {"message": "Password berhasil direset. Password baru: " + new_password}
 
 @app.put("/api/users/{user_id}/status")
-async def update_user_status(user_id: int, status_update: UserStatusUpdate, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+def update_user_status(user_id: int, status_update: UserStatusUpdate, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
     logger.info(f"Attempting to update status for user {user_id}. User: {current_user.username}, Role: {current_user.role}")
     if current_user.role != "main_admin":
         logger.warning(f"User {current_user.username} (Role: {current_user.role}) denied access to update user status.")
@@ -732,8 +953,16 @@ async def update_user_status(user_id: int, status_update: UserStatusUpdate, curr
     logger.info(f"User '{db_user.username}' status changed to {status_update.status} by {current_user.username}.")
     return {"message": "Status pengguna berhasil diperbarui"}
 
+def format_training_duration(model: Model) -> str:
+    """Run time of the model's last finished training job"""
+    durations = [job.duration_seconds for job in model.jobs if job.duration_seconds is not None]
+    if not durations:
+        return "N/A"
+    minutes, seconds = divmod(int(round(durations[-1])), 60)
+    return f"{minutes}m {seconds}s" if minutes else f"{seconds}s"
+
 @app.get("/api/models/current")
-async def get_current_model_metrics(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+def get_current_model_metrics(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
     logger.info(f"Accessing /api/models/current. User: {current_user.username}, Role: {current_user.role}")
     latest_model = db.query(Model).order_by(Model.created_at.desc()).first()
     if latest_model:
@@ -744,7 +973,7 @@ async def get_current_model_metrics(current_user: User = Depends(get_current_use
                 "rmse": metrics.get("rmse", 0),
                 "mae": metrics.get("mae", 0),
                 "r2Score": metrics.get("r2_score", 0),
-                "trainingTime": "N/A",
+                "trainingTime": format_training_duration(latest_model),
                 "lastTrained": latest_model.created_at.isoformat(),
                 "status": latest_model.status
             }
@@ -755,14 +984,14 @@ async def get_current_model_metrics(current_user: User = Depends(get_current_use
                 "rmse": 0,
                 "mae": 0,
                 "r2Score": 0,
-                "trainingTime": "N/A",
+                "trainingTime": format_training_duration(latest_model),
                 "lastTrained": latest_model.created_at.isoformat(),
                 "status": latest_model.status
             }
     return None
 
 @app.get("/api/models/history")
-async def get_model_training_history(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+def get_model_training_history(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
     logger.info(f"Accessing /api/models/history. User: {current_user.username}, Role: {current_user.role}")
     history = db.query(Model).order_by(Model.created_at.desc()).all()
     
@@ -770,16 +999,21 @@ async def get_model_training_history(current_user: User = Depends(get_current_us
     for model in history:
         try:
             metrics = json.loads(model.metrics) if model.metrics else {}
-            params = json.loads(model.parameters) if model.parameters else {}
+            params = (json.loads(model.parameters) if model.parameters else None) or {}
             result.append({
                 "id": str(model.id),
                 "date": model.created_at.isoformat(),
                 "accuracy": metrics.get("accuracy"),
                 "rmse": metrics.get("rmse"),
                 "parameters": ", ".join([f"{k}:{v}" for k,v in params.items()]),
-                "duration": "N/A",
+                "duration": format_training_duration(model),
                 "status": model.status,
-                "modelId": model.id
+                "modelId": model.id,
+                "parentModelId": model.parent_model_id,
+                # Warm starts trained with a comparison report the full retrain next to their own metrics
+                "fullRetrain": metrics.get("full_retrain"),
+                # Segmented models report metrics and timings per segment
+                "segments": metrics.get("segments")
             })
         except Exception as e:
             logger.error(f"Error formatting model history for model {model.id}: {e}")
@@ -789,14 +1023,14 @@ async def get_model_training_history(current_user: User = Depends(get_current_us
                 "accuracy": None,
                 "rmse": None,
                 "parameters": "N/A",
-                "duration": "N/A",
+                "duration": format_training_duration(model),
                 "status": model.status,
                 "modelId": model.id
             })
     return result
 
 @app.post("/api/models/export")
-async def export_model(current_user: User = Depends(get_current_user)):
+def export_model(current_user: User = Depends(get_current_user)):
     logger.info(f"Attempting to export model. User: {current_user.username}, Role: {current_user.role}")
     if current_user.role != "main_admin":
         logger.warning(f"User {current_user.username} (Role: {current_user.role}) denied access to export model.")
@@ -808,8 +1042,60 @@ async def export_model(current_user: User = Depends(get_current_user)):
     
     return StreamingResponse(io.BytesIO(dummy_model_content), media_type="application/octet-stream", headers={"Content-Disposition": "attachment; filename=dummy_model.joblib"})
 
+@app.get("/api/admin/dataset-cache")
+async def get_dataset_cache_stats(current_user: User = Depends(get_current_user)):
+    logger.info(f"Accessing /api/admin/dataset-cache. User: {current_user.username}, Role: {current_user.role}")
+    if current_user.role != "main_admin":
+        logger.warning(f"User {current_user.username} (Role: {current_user.role}) denied access to dataset cache stats.")
+        raise HTTPException(status_code=403, detail="Akses ditolak")
+    
+    # Each worker process caches its own datasets; totals are over what they last reported
+    return tasks.combined_stats(await executor.run_io(executor.worker_stats), 'dataset_cache')
+
+@app.get("/api/admin/model-registry")
+async def get_model_registry_stats(current_user: User = Depends(get_current_user)):
+    logger.info(f"Accessing /api/admin/model-registry. User: {current_user.username}, Role: {current_user.role}")
+    if current_user.role != "main_admin":
+        logger.warning(f"User {current_user.username} (Role: {current_user.role}) denied access to model registry stats.")
+        raise HTTPException(status_code=403, detail="Akses ditolak")
+    
+    # Each worker process loads its own models; totals are over what they last reported
+    return tasks.combined_stats(await executor.run_io(executor.worker_stats), 'model_registry')
+
+@app.get("/api/admin/scheduler")
+async def get_scheduler_stats(current_user: User = Depends(get_current_user)):
+    logger.info(f"Accessing /api/admin/scheduler. User: {current_user.username}, Role: {current_user.role}")
+    if current_user.role != "main_admin":
+        logger.warning(f"User {current_user.username} (Role: {current_user.role}) denied access to scheduler stats.")
+        raise HTTPException(status_code=403, detail="Akses ditolak")
+    
+    # The scheduler lives on the event loop, so it is read there
+    return scheduler.stats()
+
+@app.get("/api/admin/feature-store")
+async def get_feature_store_stats(current_user: User = Depends(get_current_user)):
+    logger.info(f"Accessing /api/admin/feature-store. User: {current_user.username}, Role: {current_user.role}")
+    if current_user.role != "main_admin":
+        logger.warning(f"User {current_user.username} (Role: {current_user.role}) denied access to feature store stats.")
+        raise HTTPException(status_code=403, detail="Akses ditolak")
+    
+    # Hits and misses are counted in the worker processes; the entries on disk are the same for all of them
+    disk = await executor.run_io(feature_store.stats)
+    return tasks.combined_stats(await executor.run_io(executor.worker_stats), 'feature_store',
+                                shared={key: disk[key] for key in ('entries', 'bytes', 'max_bytes', 'datasets')})
+
+@app.delete("/api/admin/feature-store")
+def invalidate_feature_store(dataset_id: Optional[int] = None, current_user: User = Depends(get_current_user)):
+    logger.info(f"Invalidating feature store (dataset: {dataset_id}). User: {current_user.username}, Role: {current_user.role}")
+    if current_user.role != "main_admin":
+        logger.warning(f"User {current_user.username} (Role: {current_user.role}) denied access to invalidate feature store.")
+        raise HTTPException(status_code=403, detail="Akses ditolak")
+    
+    removed = feature_store.invalidate(dataset_id)
+    return {"message": "Cache fitur berhasil dihapus", "removed_entries": removed}
+
 @app.get("/api/datasets/{dataset_id}/preview")
-async def preview_dataset(dataset_id: int, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+def preview_dataset(dataset_id: int, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
     logger.info(f"Accessing /api/datasets/{dataset_id}/preview. User: {current_user.username}, Role: {current_user.role}")
     if current_user.role not in ["admin", "main_admin"]:
         logger.warning(f"User {current_user.username} (Role: {current_user.role}) denied access to dataset preview.")
@@ -819,15 +1105,16 @@ async def preview_dataset(dataset_id: int, current_user: User = Depends(get_curr
     if not dataset:
         raise HTTPException(status_code=404, detail="Dataset tidak ditemukan")
     
-    file_path = f"data/dataset_{dataset.id}.csv"
-    if not os.path.exists(file_path):
+    if not dataset_store.exists(dataset.id):
         raise HTTPException(status_code=404, detail="File dataset tidak ditemukan")
     
-    df = pd.read_csv(file_path)
-    return {"name": dataset.name, "preview": df.head().to_dict(orient="records")}
+    df = dataset_store.head(dataset.id)
+    df['Date'] = df['Date'].dt.strftime('%Y-%m-%d')
+    df['Weekly_Sales'] = df['Weekly_Sales'].astype(float).round(2)
+    return {"name": dataset.name, "preview": df.to_dict(orient="records")}
 
 @app.get("/api/datasets/{dataset_id}/download")
-async def download_dataset(dataset_id: int, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+def download_dataset(dataset_id: int, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
     logger.info(f"Attempting to download dataset {dataset_id}. User: {current_user.username}, Role: {current_user.role}")
     if current_user.role not in ["admin", "main_admin"]:
         logger.warning(f"User {current_user.username} (Role: {current_user.role}) denied access to dataset download.")
@@ -837,44 +1124,40 @@ async def download_dataset(dataset_id: int, current_user: User = Depends(get_cur
     if not dataset:
         raise HTTPException(status_code=404, detail="Dataset tidak ditemukan")
     
-    file_path = f"data/dataset_{dataset.id}.csv"
-    if not os.path.exists(file_path):
+    if not dataset_store.exists(dataset.id):
         raise HTTPException(status_code=404, detail="File dataset tidak ditemukan")
     
-    from fastapi.responses import FileResponse
-    return FileResponse(path=file_path, filename=dataset.name, media_type="text/csv")
+    # Legacy uploads still have their original CSV on disk
+    file_path = dataset_store.legacy_csv_path(dataset.id)
+    if os.path.exists(file_path):
+        from fastapi.responses import FileResponse
+        return FileResponse(path=file_path, filename=dataset.name, media_type="text/csv")
+    
+    from fastapi.responses import StreamingResponse
+    return StreamingResponse(dataset_store.iter_csv(dataset.id), media_type="text/csv", headers={"Content-Disposition": f"attachment; filename={dataset.name}"})
 
-@app.get("/api/predictions/{prediction_id}/details")
-async def get_prediction_details(prediction_id: int, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    logger.info(f"Accessing /api/predictions/{prediction_id}/details. User: {current_user.username}, Role: {current_user.role}")
-    prediction = db.query(Prediction).filter(Prediction.id == prediction_id).first()
-    if not prediction:
+@app.get("/api/predictions/{run_id}/details")
+def get_prediction_details(run_id: int, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+    logger.info(f"Accessing /api/predictions/{run_id}/details. User: {current_user.username}, Role: {current_user.role}")
+    # Entries of /api/predictions are prediction runs; their rows are at /predictions?run_id=
+    run = db.query(PredictionRun).filter(PredictionRun.id == run_id).first()
+    if not run:
         raise HTTPException(status_code=404, detail="Prediksi tidak ditemukan")
     
-    return {
-        "id": prediction.id,
-        "model_id": prediction.model_id,
-        "store_id": prediction.store_id,
-        "dept_id": prediction.dept_id,
-        "predicted_sales": prediction.predicted_sales,
-        "actual_sales": prediction.actual_sales,
-        "abc_class": prediction.abc_class,
-        "xyz_class": prediction.xyz_class,
-        "created_at": prediction.created_at.isoformat(),
-        "message": "Detail prediksi untuk ID ini"
-    }
+    return run_to_dict(run)
 
-@app.post("/api/predictions/{prediction_id}/export")
-async def export_prediction(prediction_id: int, current_user: User = Depends(get_current_user)):
-    logger.info(f"Attempting to export prediction {prediction_id}. User: {current_user.username}, Role: {current_user.role}")
-    dummy_prediction_content = b"id,store,dept,predicted_sales,actual_sales\n1,1,1,1000,950\n2,1,2,2000,2100"
-    from fastapi.responses import StreamingResponse
-    import io
+@app.post("/api/predictions/{run_id}/export")
+def export_prediction(run_id: int, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+    logger.info(f"Attempting to export prediction run {run_id}. User: {current_user.username}, Role: {current_user.role}")
+    run = db.query(PredictionRun).filter(PredictionRun.id == run_id).first()
+    if not run:
+        raise HTTPException(status_code=404, detail="Prediksi tidak ditemukan")
     
-    return StreamingResponse(io.BytesIO(dummy_prediction_content), media_type="text/csv", headers={"Content-Disposition": f"attachment; filename=prediction_{prediction_id}.csv"})
+    from fastapi.responses import StreamingResponse
+    return StreamingResponse(iter_run_csv(run.id), media_type="text/csv", headers={"Content-Disposition": f"attachment; filename=prediction_{run.id}.csv"})
 
 @app.get("/api/activities/recent")
-async def get_recent_activities(current_user: User = Depends(get_current_user)):
+def get_recent_activities(current_user: User = Depends(get_current_user)):
     logger.info(f"Accessing /api/activities/recent. User: {current_user.username}, Role: {current_user.role}")
     mock_activities = [
         {"id": "act1", "user": "mainadmin", "action": "Menambahkan admin baru 'john.doe'", "type": "feedback", "time": "5 menit lalu"},
@@ -886,7 +1169,7 @@ async def get_recent_activities(current_user: User = Depends(get_current_user)):
     return mock_activities
 
 @app.get("/api/datasets")
-async def get_all_datasets_for_frontend(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+def get_all_datasets_for_frontend(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
     logger.info(f"Accessing /api/datasets (for frontend). User: {current_user.username}, Role: {current_user.role}")
     datasets = db.query(Dataset).all()
     # Attach uploader info if available
@@ -899,52 +1182,34 @@ async def get_all_datasets_for_frontend(current_user: User = Depends(get_current
     return datasets_with_uploader
 
 @app.get("/api/predictions")
-async def get_all_predictions_for_frontend(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+def get_all_predictions_for_frontend(
+    model_id: Optional[int] = None,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
     logger.info(f"Accessing /api/predictions (for frontend). User: {current_user.username}, Role: {current_user.role}")
-    predictions = db.query(Prediction).all()
+    # One entry per completed prediction run, read from its summary
+    query = db.query(PredictionRun).filter(PredictionRun.status == "completed")
+    if model_id:
+        query = query.filter(PredictionRun.model_id == model_id)
     
-    # Aggregate predictions by model and add creator info
-    aggregated_predictions = {}
-    for pred in predictions:
-        model_name = db.query(Model).filter(Model.id == pred.model_id).first()
-        creator = db.query(User).filter(User.id == pred.created_by).first()
-        
-        key = pred.model_id # Group by model
-        if key not in aggregated_predictions:
-            aggregated_predictions[key] = {
-                "id": pred.id, # Use first prediction ID for the group
-                "created_at": pred.created_at.isoformat(),
-                "model": {"name": model_name.name if model_name else "Unknown"},
-                "count": 0,
-                "total_actual_sales": 0,
-                "total_predicted_sales": 0,
-                "creator": {"name": creator.name if creator else "System"},
-                "accuracy_sum": 0,
-                "prediction_count_for_accuracy": 0
-            }
-        
-        aggregated_predictions[key]["count"] += 1
-        aggregated_predictions[key]["total_actual_sales"] += pred.actual_sales if pred.actual_sales else 0
-        aggregated_predictions[key]["total_predicted_sales"] += pred.predicted_sales
-        
-        # Calculate accuracy for each prediction and sum it up
-        if pred.actual_sales and pred.actual_sales != 0:
-            accuracy = 100 * (1 - abs(pred.actual_sales - pred.predicted_sales) / pred.actual_sales)
-            aggregated_predictions[key]["accuracy_sum"] += accuracy
-            aggregated_predictions[key]["prediction_count_for_accuracy"] += 1
-            
     final_predictions = []
-    for key, agg_data in aggregated_predictions.items():
-        if agg_data["prediction_count_for_accuracy"] > 0:
-            agg_data["accuracy"] = agg_data["accuracy_sum"] / agg_data["prediction_count_for_accuracy"]
-        else:
-            agg_data["accuracy"] = None
-        final_predictions.append(agg_data)
-        
+    for run in query.order_by(PredictionRun.id.desc()).all():
+        run_data = run_to_dict(run)
+        overall = (run_data["summary"] or {}).get("overall", {})
+        run_data.update({
+            "run_id": run.id,
+            "count": run.rows_count,
+            "total_actual_sales": overall.get("total_actual_sales", 0),
+            "total_predicted_sales": overall.get("total_predicted_sales", 0),
+            "accuracy": overall.get("avg_accuracy")
+        })
+        final_predictions.append(run_data)
+    
     return final_predictions
 
 @app.put("/api/profile")
-async def update_profile(profile_data: UserUpdate, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+def update_profile(profile_data: UserUpdate, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
     logger.info(f"Attempting to update profile. User: {current_user.username}, Role: {current_user.role}")
     db_user = db.query(User).filter(User.id == current_user.id).first()
     if not db_user:
@@ -959,7 +1224,7 @@ async def update_profile(profile_data: UserUpdate, current_user: User = Depends(
     return {"message": "Profil berhasil diperbarui"}
 
 @app.put("/api/profile/change-password")
-async def change_password(password_data: ChangePasswordRequest, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+def change_password(password_data: ChangePasswordRequest, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
     logger.info(f"Attempting to change password. User: {current_user.username}, Role: {current_user.role}")
     db_user = db.query(User).filter(User.id == current_user.id).first()
     if not db_user:
@@ -974,14 +1239,14 @@ async def change_password(password_data: ChangePasswordRequest, current_user: Us
     return {"message": "Password berhasil diubah"}
 
 @app.put("/api/profile/notifications")
-async def update_notification_settings(settings: NotificationSettings, current_user: User = Depends(get_current_user)):
+def update_notification_settings(settings: NotificationSettings, current_user: User = Depends(get_current_user)):
     logger.info(f"Attempting to update notification settings. User: {current_user.username}, Role: {current_user.role}")
     # In a real application, you would save these settings to the database for the user.
     # For now, it's just a mock success.
     return {"message": "Pengaturan notifikasi berhasil disimpan", "settings": settings.model_dump()}
 
 @app.post("/api/reports/generate")
-async def generate_report(current_user: User = Depends(get_current_user)):
+def generate_report(current_user: User = Depends(get_current_user)):
     logger.info(f"Attempting to generate report. User: {current_user.username}, Role: {current_user.role}")
     if current_user.role != "main_admin":
         logger.warning(f"User {current_user.username} (Role: {current_user.role}) denied access to generate report.")
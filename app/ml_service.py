@@ -4,81 +4,267 @@ from sklearn.model_selection import train_test_split
 from sklearn.preprocessing import LabelEncoder
 from sklearn.metrics import mean_squared_error, mean_absolute_error, r2_score
 import xgboost as xgb
-import optuna
-import joblib
 import os
-from typing import Dict, List, Any, Tuple
+import time
+import weakref
+from typing import Callable, Dict, List, Any, Optional, Tuple
+from app.sales_tensor import SalesTensor
+from app.feature_spec import FeaturePlan
+from app.feature_store import FeatureStore
+from app.dataset_store import DatasetStore
+from app.external_memory import (EXTERNAL_MEMORY_BUDGET_MB, FeatureBatches, StreamingMetrics, batch_rows,
+                                 cache_size_mb, fit_encoders, new_cache_dir, plan_batches, remove_cache_dir,
+                                 scan_dataset)
+from app.parallel_features import FEATURE_WORKERS
+from app.segments import GLOBAL_SEGMENT, SEGMENT_WORKERS, fit_segments, route_rows, series_keys, series_segments
+from app.tuning import (OPTUNA_PARALLEL_TRIALS, as_float32, feature_types, final_trial, normalize_search_spec,
+                         rung_sizes, run_study, run_successive_halving, study_name, tuned_params)
+from app.backtest import BACKTEST_HORIZON_WEEKS, BACKTEST_WORKERS, Backtest, BacktestObjective
+from app.model_registry import ModelRegistry
+from app.tree_engine import PREDICT_ENGINE, TreeEnsemble
+from app.scheduler import cpu_limit
 import warnings
 warnings.filterwarnings('ignore')
 
+# Called with the fraction done (0..1) and the current stage; may raise to stop the run
+ProgressFn = Callable[[float, str], None]
+
+
+# Boosting rounds a warm start adds to its parent's booster unless parameters set n_estimators
+WARM_START_ROUNDS = int(os.environ.get("WARM_START_ROUNDS", "50"))
+
+
+# ABC-XYZ categories in report order
+CATEGORIES = ['A-X', 'A-Y', 'A-Z', 'B-X', 'B-Y', 'B-Z', 'C-X', 'C-Y', 'C-Z']
+
+
+def _no_progress(fraction: float, message: str) -> None:
+    pass
+
+
+def regression_metrics(y_true, y_pred) -> Dict[str, float]:
+    return {
+        'rmse': float(np.sqrt(mean_squared_error(y_true, y_pred))),
+        'mae': float(mean_absolute_error(y_true, y_pred)),
+        'r2_score': float(r2_score(y_true, y_pred)),
+        'accuracy': float(100 * (1 - np.mean(np.abs((y_true - y_pred) / y_true))))
+    }
+
+
+def compact_options(feature_spec: Dict[str, Any]) -> Dict[str, Any]:
+    """XGBRegressor settings for the features of a compact spec"""
+    return {'tree_method': 'hist', 'enable_categorical': True} if feature_spec['compact'] else {}
+
+
+def fit_quantized(model: xgb.XGBRegressor, X_train, y_train, X_test) -> xgb.DMatrix:
+    """Fit ``model`` on a QuantileDMatrix of the training rows.
+    
+    Returns the test rows as a QuantileDMatrix sharing the training bin
+    cuts, for evaluating the fitted booster without another conversion
+    of the frame.
+    """
+    dtrain = xgb.QuantileDMatrix(X_train, y_train, enable_categorical=True)
+    dtest = xgb.QuantileDMatrix(X_test, ref=dtrain, enable_categorical=True)
+    booster = xgb.train(model.get_xgb_params(), dtrain, num_boost_round=model.n_estimators,
+                        callbacks=model.callbacks)
+    model.load_model(booster.save_raw('ubj'))
+    return dtest
+
+
+def prediction_records(result: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """One dict per row of a generate_predictions_by_category result"""
+    rows, series = result['rows'], result['series']
+    classification = result['abc_xyz_classification']
+    return [
+        {
+            'store': series['store'][index],
+            'dept': series['dept'][index],
+            'predicted_sales': predicted,
+            'actual_sales': actual,
+            'accuracy': accuracy,
+            'date': date,
+            'category': series['category'][index],
+            'classification_data': classification.get(series['key'][index], {})
+        }
+        for index, predicted, actual, accuracy, date in zip(
+            rows['series'].tolist(), rows['predicted_sales'].tolist(), rows['actual_sales'].tolist(),
+            rows['accuracy'].tolist(), np.datetime_as_string(rows['date'], unit='D').tolist()
+        )
+    ]
+
+
+def row_hashes(frame: pd.DataFrame) -> np.ndarray:
+    """Hashes of the (Store, Dept, Date, Weekly_Sales) rows of a frame.
+    
+    Saved with each model so a warm start can tell which training rows are
+    new or changed since then, whatever dataset they come from.
+    """
+    keys = pd.DataFrame({
+        'Store': frame['Store'].astype(str).to_numpy(),
+        'Dept': frame['Dept'].astype(str).to_numpy(),
+        'Date': pd.to_datetime(frame['Date']).to_numpy(),
+        'Weekly_Sales': frame['Weekly_Sales'].to_numpy(dtype='float64')
+    })
+    return pd.util.hash_pandas_object(keys, index=False).to_numpy()
+
+
+class BoostingProgress(xgb.callback.TrainingCallback):
+    """Reports boosting rounds as progress between ``start`` and ``end``"""
+    
+    def __init__(self, progress: ProgressFn, rounds: int, start: float, end: float, every: int = 10):
+        self.progress = progress
+        self.rounds = max(1, rounds)
+        self.start = start
+        self.end = end
+        self.every = every
+    
+    def after_iteration(self, model, epoch: int, evals_log) -> bool:
+        done = epoch + 1
+        if done % self.every == 0 or done == self.rounds:
+            self.progress(self.start + (self.end - self.start) * done / self.rounds,
+                          f"Melatih model (iterasi {done}/{self.rounds})")
+        return False
+
 class MLService:
-    def __init__(self):
-        self.models = {}
-        os.makedirs("models", exist_ok=True)
+    def __init__(self, feature_store: Optional[FeatureStore] = None, feature_workers: Optional[int] = None,
+                 parallel_trials: Optional[int] = None, segment_workers: Optional[int] = None,
+                 backtest_workers: Optional[int] = None, registry: Optional[ModelRegistry] = None,
+                 predict_engine: Optional[str] = None):
+        self.registry = registry or ModelRegistry()
+        self.predict_engine = predict_engine or PREDICT_ENGINE
+        # Compiled ensembles of loaded models; dropped with the model when the registry evicts it
+        self._compiled: 'weakref.WeakKeyDictionary[xgb.XGBRegressor, TreeEnsemble]' = weakref.WeakKeyDictionary()
+        self.feature_store = feature_store
+        self.feature_workers = feature_workers or FEATURE_WORKERS
+        self.parallel_trials = parallel_trials or OPTUNA_PARALLEL_TRIALS
+        self.segment_workers = segment_workers or SEGMENT_WORKERS
+        self.backtest_workers = backtest_workers or BACKTEST_WORKERS
+    
+    def prepare_features(self, df: pd.DataFrame, dataset_id: Optional[int] = None,
+                         feature_spec: Optional[Dict[str, Any]] = None):
+        """prepare_data through the feature store when the dataset id is known"""
+        if self.feature_store is None or dataset_id is None:
+            return self.prepare_data(df, feature_spec)
+        plan = FeaturePlan(feature_spec)
+        return self.feature_store.get_or_build(
+            dataset_id, plan.cache_key,
+            build=lambda: (self.prepare_data(df, plan.spec), self.series_tail(df, plan)),
+            extend=lambda le_store, le_dept, tail, new_rows: self.extend_features(plan, le_store, le_dept, tail, new_rows)
+        )
     
-    def prepare_data(self, df: pd.DataFrame):
+    def prepare_data(self, df: pd.DataFrame, feature_spec: Optional[Dict[str, Any]] = None):
         """Prepare Walmart sales data for training"""
+        plan = FeaturePlan(feature_spec)
+        
         # Make a copy to avoid modifying original data
         df = df.copy()
         
         # Convert Date to datetime
         df['Date'] = pd.to_datetime(df['Date'])
         
-        # Extract date features
-        df['Year'] = df['Date'].dt.year
-        df['Month'] = df['Date'].dt.month
-        df['Week'] = df['Date'].dt.isocalendar().week
-        df['DayOfYear'] = df['Date'].dt.dayofyear
-        
         # Encode categorical variables
         le_store = LabelEncoder()
         le_dept = LabelEncoder()
+        le_store.fit(df['Store'].astype(str))
+        le_dept.fit(df['Dept'].astype(str))
         
-        df['Store_encoded'] = le_store.fit_transform(df['Store'].astype(str))
-        df['Dept_encoded'] = le_dept.fit_transform(df['Dept'].astype(str))
+        df = plan.apply(df, le_store, le_dept, workers=self.feature_workers)
         
-        # Sort data for proper lag feature creation
-        df = df.sort_values(['Store', 'Dept', 'Date']).reset_index(drop=True)
-        
-        # Create lag features
-        df['Sales_lag1'] = df.groupby(['Store', 'Dept'])['Weekly_Sales'].shift(1)
-        df['Sales_lag2'] = df.groupby(['Store', 'Dept'])['Weekly_Sales'].shift(2)
-        df['Sales_lag4'] = df.groupby(['Store', 'Dept'])['Weekly_Sales'].shift(4)
+        # Drop rows with NaN values (due to lag features)
+        df = df.dropna()
         
-        # Rolling statistics - fix the index alignment issue
-        def calculate_rolling_stats(group):
-            group = group.copy()
-            group['Sales_rolling_mean_4'] = group['Weekly_Sales'].rolling(window=4, min_periods=1).mean()
-            group['Sales_rolling_std_4'] = group['Weekly_Sales'].rolling(window=4, min_periods=1).std()
-            return group
+        # Features for training
+        X = df[plan.columns]
+        y = df['Weekly_Sales']
         
-        df = df.groupby(['Store', 'Dept']).apply(calculate_rolling_stats).reset_index(drop=True)
+        return X, y, df, le_store, le_dept
+    
+    def series_tail(self, df: pd.DataFrame, plan: FeaturePlan) -> pd.DataFrame:
+        """Last raw rows of every (Store, Dept) series, enough to extend its window features"""
+        df = df.sort_values(['Store', 'Dept', 'Date'])
+        return df.groupby(['Store', 'Dept'], observed=True).tail(plan.context_rows).reset_index(drop=True)
+    
+    def extend_features(self, plan: FeaturePlan, le_store: LabelEncoder, le_dept: LabelEncoder,
+                        tail: pd.DataFrame, new_rows: pd.DataFrame):
+        """Features for appended rows only, seeded with the tail of each series.
         
-        # Fill NaN values in rolling std with 0
-        df['Sales_rolling_std_4'] = df['Sales_rolling_std_4'].fillna(0)
+        Returns the new feature rows and the updated tail, or None when the
+        rows need a full recompute: unseen stores or departments would change
+        the encoders, weeks at or before a series' last week would change
+        features of rows already computed, and some features cannot be
+        computed from the tails at all.
+        """
+        if not plan.incremental:
+            return None
+        if not (set(new_rows['Store'].astype(str)) <= set(le_store.classes_)
+                and set(new_rows['Dept'].astype(str)) <= set(le_dept.classes_)):
+            return None
         
-        # Holiday effect
-        df['IsHoliday'] = df['IsHoliday'].astype(int)
+        # The tail holds every series, so its categories are those of the full dataset
+        new_rows = new_rows.copy()
+        tail = tail.copy()
+        for frame in (new_rows, tail):
+            frame['Date'] = pd.to_datetime(frame['Date'])
+            for col in ['Store', 'Dept']:
+                frame[col] = frame[col].astype(tail[col].dtype)
         
-        # Drop rows with NaN values (due to lag features)
-        df = df.dropna()
+        last_dates = tail.groupby(['Store', 'Dept'], observed=True)['Date'].max()
+        first_new_dates = new_rows.groupby(['Store', 'Dept'], observed=True)['Date'].min()
+        overlap = first_new_dates.to_frame('first').join(last_dates.rename('last'), how='inner')
+        if (overlap['first'] <= overlap['last']).any():
+            return None
         
-        # Features for training
-        feature_columns = [
-            'Store_encoded', 'Dept_encoded', 'Year', 'Month', 'Week', 'DayOfYear',
-            'IsHoliday', 'Sales_lag1', 'Sales_lag2', 'Sales_lag4',
-            'Sales_rolling_mean_4', 'Sales_rolling_std_4'
-        ]
+        combined = pd.concat([tail.assign(_context=True), new_rows.assign(_context=False)], ignore_index=True)
+        combined = plan.apply(combined, le_store, le_dept)
+        new_features = combined[~combined['_context']].drop(columns='_context').dropna()
         
-        X = df[feature_columns]
-        y = df['Weekly_Sales']
+        new_tail = self.series_tail(pd.concat([tail, new_rows], ignore_index=True), plan)
+        return new_features, new_tail
+    
+    def save_model(self, model_id: int, model: xgb.XGBRegressor, le_store: LabelEncoder, le_dept: LabelEncoder,
+                   feature_columns: List[str], feature_spec: Dict[str, Any], trained_rows: Optional[np.ndarray],
+                   segments: Optional[Dict[str, Any]] = None) -> None:
+        """Save a model to the registry; ``trained_rows`` are the row_hashes it was trained on, if known.
         
-        return X, y, df, le_store, le_dept
+        A segmented model keeps its global model under 'model' and the
+        segment models with the segment of every series under 'segments'.
+        """
+        self.registry.save(model_id, model, le_store, le_dept, feature_columns, feature_spec, trained_rows,
+                           segments=segments)
+    
+    def load_model(self, model_id: int) -> Dict[str, Any]:
+        """Model artifacts by database Model.id, loaded from the registry on first use"""
+        return self.registry.get(model_id)
+    
+    def predict_rows(self, model_data: Dict[str, Any], X: pd.DataFrame, processed_df: pd.DataFrame) -> np.ndarray:
+        """Predictions of a model artifact; a segmented one predicts each series with its segment's model"""
+        segments = model_data.get('segments')
+        if not segments:
+            return self.predict_model(model_data['model'], X)
+        models = dict(segments['models'], **{GLOBAL_SEGMENT: model_data['model']})
+        predictions = np.empty(len(X), dtype=np.float32)
+        for label, rows in route_rows(segments['series'], models, processed_df).items():
+            predictions[rows] = self.predict_model(models[label], X.iloc[rows])
+        return predictions
     
-    def train_model(self, df: pd.DataFrame, parameters: Dict[str, Any]) -> Dict[str, Any]:
+    def predict_model(self, model: xgb.XGBRegressor, X: pd.DataFrame) -> np.ndarray:
+        """model.predict(X), or the model's compiled TreeEnsemble with the "numpy" engine"""
+        if self.predict_engine != "numpy":
+            return model.predict(X)
+        ensemble = self._compiled.get(model)
+        if ensemble is None:
+            ensemble = self._compiled[model] = TreeEnsemble.from_booster(model.get_booster())
+        return ensemble.predict(X)
+    
+    def train_model(self, df: pd.DataFrame, parameters: Dict[str, Any], dataset_id: Optional[int] = None,
+                    feature_spec: Optional[Dict[str, Any]] = None, model_id: Optional[int] = None,
+                    progress: Optional[ProgressFn] = None) -> Dict[str, Any]:
         """Train XGBoost model"""
+        progress = progress or _no_progress
         try:
-            X, y, processed_df, le_store, le_dept = self.prepare_data(df)
+            feature_spec = FeaturePlan(feature_spec).spec
+            progress(0.0, "Menyiapkan fitur")
+            X, y, processed_df, le_store, le_dept = self.prepare_features(df, dataset_id, feature_spec)
             
             # Split data
             X_train, X_test, y_train, y_test = train_test_split(
@@ -86,138 +272,516 @@ class MLService:
             )
             
             # Train XGBoost model
+            n_estimators = parameters.get('n_estimators', 100)
             model = xgb.XGBRegressor(
-                n_estimators=parameters.get('n_estimators', 100),
+                n_estimators=n_estimators,
                 max_depth=parameters.get('max_depth', 6),
                 learning_rate=parameters.get('learning_rate', 0.1),
                 subsample=parameters.get('subsample', 0.8),
-                random_state=42
+                random_state=42,
+                n_jobs=cpu_limit(),
+                callbacks=[BoostingProgress(progress, n_estimators, 0.1, 0.9)],
+                **compact_options(feature_spec)
             )
             
-            model.fit(X_train, y_train)
+            start = time.perf_counter()
+            if feature_spec['compact']:
+                dtest = fit_quantized(model, X_train, y_train, X_test)
+            else:
+                model.fit(X_train, y_train)
+            training_seconds = time.perf_counter() - start
+            # The callback is not part of the saved model
+            model.set_params(callbacks=None)
             
             # Make predictions
-            y_pred = model.predict(X_test)
+            progress(0.9, "Mengevaluasi model")
+            y_pred = model.get_booster().predict(dtest) if feature_spec['compact'] else model.predict(X_test)
             
             # Calculate metrics
-            metrics = {
-                'rmse': float(np.sqrt(mean_squared_error(y_test, y_pred))),
-                'mae': float(mean_absolute_error(y_test, y_pred)),
-                'r2_score': float(r2_score(y_test, y_pred)),
-                'accuracy': float(100 * (1 - np.mean(np.abs((y_test - y_pred) / y_test))))
-            }
+            metrics = dict(regression_metrics(y_test, y_pred), training_seconds=round(training_seconds, 3))
             
-            # Save model
-            model_id = len(self.models) + 1
-            model_path = f"models/xgboost_model_{model_id}.joblib"
-            joblib.dump({
-                'model': model,
-                'le_store': le_store,
-                'le_dept': le_dept,
-                'feature_columns': X.columns.tolist()
-            }, model_path)
-            
-            self.models[model_id] = {
-                'model': model,
-                'le_store': le_store,
-                'le_dept': le_dept,
-                'feature_columns': X.columns.tolist(),
-                'path': model_path
-            }
+            # Save model under the database Model row's id when one is given
+            model_id = model_id or self.registry.next_id()
+            self.save_model(model_id, model, le_store, le_dept, X.columns.tolist(), feature_spec,
+                            np.unique(row_hashes(processed_df.loc[X_train.index])))
             
             return {
                 'model_id': model_id,
                 'metrics': metrics,
-                'feature_importance': dict(zip(X.columns, model.feature_importances_))
+                'feature_importance': dict(zip(X.columns, model.feature_importances_)),
+                'feature_spec': feature_spec
             }
             
         except Exception as e:
             print(f"Error in train_model: {str(e)}")
             raise e
     
-    def optimize_model(self, df: pd.DataFrame, n_trials: int = 50) -> Dict[str, Any]:
-        """Optimize XGBoost model using Optuna"""
+    def train_segmented(self, df: pd.DataFrame, parameters: Dict[str, Any], segment_by: str,
+                        dataset_id: Optional[int] = None, feature_spec: Optional[Dict[str, Any]] = None,
+                        model_id: Optional[int] = None, tensor: Optional[SalesTensor] = None,
+                        progress: Optional[ProgressFn] = None) -> Dict[str, Any]:
+        """Train one model per ABC-XYZ category or per store, plus a global model.
+        
+        Rows are split into train and test rows as in train_model, then
+        grouped by the segment of their series; segments are fitted in
+        parallel (see app.segments). The global model is fitted on every
+        row and predicts series whose segment has too few rows for a model
+        of its own. Test metrics are those of the routed family, with the
+        global model's alongside for comparison.
+        """
+        progress = progress or _no_progress
         try:
-            X, y, processed_df, le_store, le_dept = self.prepare_data(df)
+            feature_spec = FeaturePlan(feature_spec).spec
+            progress(0.0, "Menyiapkan fitur")
+            X, y, processed_df, le_store, le_dept = self.prepare_features(df, dataset_id, feature_spec)
+            classification = self.classify_abc_xyz(df, tensor) if segment_by == "abc_xyz" else None
+            segments = series_segments(processed_df, segment_by, classification)
+            
             X_train, X_test, y_train, y_test = train_test_split(
                 X, y, test_size=0.2, random_state=42
             )
+            keys = series_keys(processed_df)
+            train_labels = keys.loc[X_train.index].map(segments).to_numpy()
+            test_labels = keys.loc[X_test.index].map(segments).to_numpy()
             
-            def objective(trial):
-                params = {
-                    'n_estimators': trial.suggest_int('n_estimators', 50, 300),
-                    'max_depth': trial.suggest_int('max_depth', 3, 10),
-                    'learning_rate': trial.suggest_float('learning_rate', 0.01, 0.3),
-                    'subsample': trial.suggest_float('subsample', 0.6, 1.0),
-                    'colsample_bytree': trial.suggest_float('colsample_bytree', 0.6, 1.0),
-                    'reg_alpha': trial.suggest_float('reg_alpha', 0, 10),
-                    'reg_lambda': trial.suggest_float('reg_lambda', 0, 10),
-                    'random_state': 42
-                }
-                
-                model = xgb.XGBRegressor(**params)
-                model.fit(X_train, y_train)
-                y_pred = model.predict(X_test)
-                
-                rmse = np.sqrt(mean_squared_error(y_test, y_pred))
-                return rmse
+            model_params = dict(
+                n_estimators=parameters.get('n_estimators', 100),
+                max_depth=parameters.get('max_depth', 6),
+                learning_rate=parameters.get('learning_rate', 0.1),
+                subsample=parameters.get('subsample', 0.8),
+                random_state=42,
+                **compact_options(feature_spec)
+            )
             
-            # Run optimization
-            study = optuna.create_study(direction='minimize')
-            study.optimize(objective, n_trials=n_trials)
+            def report_segment(done, total):
+                progress(0.1 + 0.8 * done / total, f"Melatih model segmen ({done}/{total})")
+            
+            progress(0.1, "Melatih model segmen")
+            start = time.perf_counter()
+            fitted = fit_segments(as_float32(X_train), y_train.to_numpy(dtype=np.float32), as_float32(X_test),
+                                  train_labels, test_labels, model_params, X.columns.tolist(), feature_types(X),
+                                  workers=self.segment_workers, on_segment=report_segment)
+            training_seconds = time.perf_counter() - start
+            
+            progress(0.9, "Mengevaluasi model")
+            models = {}
+            segment_metrics = {}
+            y_test_values = y_test.to_numpy()
+            y_pred = fitted[GLOBAL_SEGMENT]['predictions'].copy()
+            for label, result in fitted.items():
+                model = xgb.XGBRegressor(**model_params, n_jobs=cpu_limit())
+                model.load_model(bytearray(result['booster']))
+                models[label] = model
+                test_rows = result['test_rows']
+                segment_metrics[label] = dict(
+                    regression_metrics(y_test_values[test_rows], result['predictions']) if len(test_rows) else {},
+                    training_rows=len(result['train_rows']),
+                    test_rows=len(test_rows),
+                    training_seconds=round(result['training_seconds'], 3)
+                )
+                if label != GLOBAL_SEGMENT:
+                    y_pred[test_rows] = result['predictions']
+            
+            global_model = models.pop(GLOBAL_SEGMENT)
+            metrics = dict(regression_metrics(y_test_values, y_pred), training_seconds=round(training_seconds, 3))
+            metrics['segments'] = {
+                'segment_by': segment_by,
+                'workers': self.segment_workers,
+                'global': segment_metrics.pop(GLOBAL_SEGMENT),
+                'models': segment_metrics,
+                'series_without_model': sum(1 for label in segments.values() if label not in models)
+            }
             
-            # Train final model with best parameters
-            best_params = study.best_params
-            final_model = xgb.XGBRegressor(**best_params)
-            final_model.fit(X_train, y_train)
+            model_id = model_id or self.registry.next_id()
+            self.save_model(model_id, global_model, le_store, le_dept, X.columns.tolist(), feature_spec,
+                            np.unique(row_hashes(processed_df.loc[X_train.index])),
+                            segments={'segment_by': segment_by, 'series': segments, 'models': models})
             
-            # Calculate metrics
-            y_pred = final_model.predict(X_test)
-            metrics = {
-                'rmse': float(np.sqrt(mean_squared_error(y_test, y_pred))),
-                'mae': float(mean_absolute_error(y_test, y_pred)),
-                'r2_score': float(r2_score(y_test, y_pred)),
-                'accuracy': float(100 * (1 - np.mean(np.abs((y_test - y_pred) / y_test))))
+            return {
+                'model_id': model_id,
+                'metrics': metrics,
+                'feature_importance': dict(zip(X.columns, global_model.feature_importances_)),
+                'feature_spec': feature_spec
             }
+        
+        except Exception as e:
+            print(f"Error in train_segmented: {str(e)}")
+            raise e
+    
+    def train_model_external(self, store: DatasetStore, dataset_id: int, parameters: Dict[str, Any],
+                             feature_spec: Optional[Dict[str, Any]] = None, model_id: Optional[int] = None,
+                             memory_mb: Optional[int] = None, progress: Optional[ProgressFn] = None) -> Dict[str, Any]:
+        """Train XGBoost without holding the dataset in memory.
+        
+        Series are read from the dataset store in batches sized for
+        ``memory_mb`` and featurized one batch at a time into XGBoost's
+        on-disk page cache (see app.external_memory); the hist method builds
+        its quantile sketch page by page. Every fifth row by key hash is held
+        out and scored in batches after training. XGBoost itself still keeps
+        about 50 bytes per training row in memory (labels, gradients,
+        predictions and row partitions).
+        """
+        progress = progress or _no_progress
+        plan = FeaturePlan(feature_spec)
+        cache_dir = new_cache_dir(model_id)
+        try:
+            progress(0.0, "Memindai dataset")
+            max_rows = batch_rows(plan, memory_mb)
+            scan = scan_dataset(store, dataset_id, max_rows)
+            le_store, le_dept = fit_encoders(scan['series_rows'])
+            batches = plan_batches(scan['series_rows'], max_rows)
             
-            # Save optimized model
-            model_id = len(self.models) + 1
-            model_path = f"models/optimized_xgboost_model_{model_id}.joblib"
-            joblib.dump({
-                'model': final_model,
-                'le_store': le_store,
-                'le_dept': le_dept,
-                'feature_columns': X.columns.tolist()
-            }, model_path)
-            
-            self.models[model_id] = {
-                'model': final_model,
-                'le_store': le_store,
-                'le_dept': le_dept,
-                'feature_columns': X.columns.tolist(),
-                'path': model_path
+            def report_batch(done):
+                progress(0.05 + 0.35 * done / len(batches), f"Menyiapkan fitur (batch {done}/{len(batches)})")
+            
+            data = FeatureBatches(store, dataset_id, plan, le_store, le_dept, scan['holidays'], batches,
+                                  cache_dir, progress=report_batch)
+            dtrain = xgb.DMatrix(data)
+            
+            n_estimators = parameters.get('n_estimators', 100)
+            model = xgb.XGBRegressor(
+                n_estimators=n_estimators,
+                max_depth=parameters.get('max_depth', 6),
+                learning_rate=parameters.get('learning_rate', 0.1),
+                subsample=parameters.get('subsample', 0.8),
+                random_state=42,
+                n_jobs=cpu_limit(),
+                **dict(compact_options(plan.spec), tree_method='hist')
+            )
+            start = time.perf_counter()
+            booster = xgb.train(model.get_xgb_params(), dtrain, num_boost_round=n_estimators,
+                                callbacks=[BoostingProgress(progress, n_estimators, 0.4, 0.9)])
+            training_seconds = time.perf_counter() - start
+            model.load_model(booster.save_raw('ubj'))
+            cache_mb = cache_size_mb(cache_dir)
+            del dtrain, booster
+            
+            progress(0.9, "Mengevaluasi model")
+            evaluation = StreamingMetrics()
+            # Scored in smaller slices than the feature batches: prediction copies its input
+            for X_test, y_test in data.holdout(max(1000, max_rows // 4)):
+                evaluation.update(y_test, model.predict(X_test))
+            metrics = dict(evaluation.result(), training_seconds=round(training_seconds, 3))
+            metrics['external_memory'] = {
+                'memory_budget_mb': memory_mb or EXTERNAL_MEMORY_BUDGET_MB,
+                'batches': len(batches),
+                'training_rows': data.train_rows,
+                'evaluation_rows': data.holdout_rows,
+                'page_cache_mb': cache_mb
+            }
+            
+            # Row hashes would take memory in proportion to the dataset; warm
+            # starts from this model continue on every row
+            model_id = model_id or self.registry.next_id()
+            self.save_model(model_id, model, le_store, le_dept, plan.columns, plan.spec, None)
+            
+            return {
+                'model_id': model_id,
+                'metrics': metrics,
+                'feature_importance': dict(zip(plan.columns, model.feature_importances_)),
+                'feature_spec': plan.spec
+            }
+            
+        except Exception as e:
+            print(f"Error in train_model_external: {str(e)}")
+            raise e
+        finally:
+            remove_cache_dir(cache_dir)
+    
+    def warm_start_model(self, df: pd.DataFrame, parent_model_id: int, parameters: Optional[Dict[str, Any]] = None,
+                         dataset_id: Optional[int] = None, model_id: Optional[int] = None,
+                         compare_full_retrain: bool = False, progress: Optional[ProgressFn] = None) -> Dict[str, Any]:
+        """Continue a saved model's booster with extra rounds on the rows it has not seen.
+        
+        Training rows whose (Store, Dept, Date, Weekly_Sales) the parent was
+        not trained on are new or changed; only those are boosted on, with the
+        parent's feature spec, encoders and parameters. Both the warm start and
+        the optional full retrain are scored on the test rows the parent has
+        not seen. Stores or departments unknown to the parent need a full
+        retrain.
+        """
+        progress = progress or _no_progress
+        parameters = dict(parameters or {})
+        try:
+            parent = self.load_model(parent_model_id)
+            if parent.get('segments'):
+                raise ValueError("Warm start tidak mendukung model tersegmentasi; lakukan pelatihan penuh")
+            plan = FeaturePlan(parent.get('feature_spec'))
+            feature_spec = plan.spec
+            progress(0.0, "Menyiapkan fitur")
+            X, y, processed_df, le_store, le_dept = self.prepare_features(df, dataset_id, feature_spec)
+            
+            # The parent's trees split on its own category codes
+            for col, le, le_parent in (('Store', le_store, parent['le_store']), ('Dept', le_dept, parent['le_dept'])):
+                unseen = sorted(set(le.classes_) - set(le_parent.classes_))
+                if unseen:
+                    raise ValueError(f"{col} {', '.join(unseen[:5])} tidak dikenal model induk; lakukan pelatihan penuh")
+                if not np.array_equal(le.classes_, le_parent.classes_):
+                    X = X.copy()
+                    X[f'{col}_encoded'] = plan.encode(processed_df.loc[X.index, col], le_parent)
+            X = X[parent['feature_columns']]
+            
+            X_train, X_test, y_train, y_test = train_test_split(
+                X, y, test_size=0.2, random_state=42
+            )
+            
+            parent_hashes = parent.get('row_hashes')
+            train_hashes = row_hashes(processed_df.loc[X_train.index])
+            test_hashes = row_hashes(processed_df.loc[X_test.index])
+            if parent_hashes is None:
+                # Saved before row hashes were recorded: continue on every training row
+                new_rows = np.ones(len(X_train), dtype=bool)
+                unseen_test = np.ones(len(X_test), dtype=bool)
+            else:
+                new_rows = ~np.isin(train_hashes, parent_hashes)
+                unseen_test = ~np.isin(test_hashes, parent_hashes)
+            if not new_rows.any():
+                raise ValueError("Tidak ada baris baru atau berubah sejak model induk dilatih")
+            if not unseen_test.any():
+                unseen_test[:] = True
+            X_eval, y_eval = X_test[unseen_test], y_test[unseen_test]
+            
+            parent_model = parent['model']
+            rounds = int(parameters.pop('n_estimators', WARM_START_ROUNDS))
+            params = dict(parent_model.get_params(), **parameters)
+            params.update(n_estimators=rounds, n_jobs=cpu_limit(), callbacks=[BoostingProgress(progress, rounds, 0.1, 0.5 if compare_full_retrain else 0.9)])
+            model = xgb.XGBRegressor(**params)
+            
+            start = time.perf_counter()
+            model.fit(X_train[new_rows], y_train[new_rows], xgb_model=parent_model.get_booster())
+            training_seconds = time.perf_counter() - start
+            model.set_params(callbacks=None)
+            
+            metrics = dict(regression_metrics(y_eval, model.predict(X_eval)), training_seconds=round(training_seconds, 3))
+            metrics['warm_start'] = {
+                'parent_model_id': parent_model_id,
+                'new_rows': int(new_rows.sum()),
+                'training_rows': len(X_train),
+                'added_rounds': rounds,
+                'total_rounds': model.get_booster().num_boosted_rounds(),
+                'evaluation_rows': len(X_eval)
+            }
+            
+            if compare_full_retrain:
+                # Same parameters and round count as the parent, from scratch on every training row
+                progress(0.5, "Melatih ulang penuh sebagai pembanding")
+                full_rounds = parent_model.get_params()['n_estimators'] or 100
+                full_model = xgb.XGBRegressor(**dict(params, n_estimators=full_rounds, callbacks=[
+                    BoostingProgress(progress, full_rounds, 0.5, 0.9)
+                ]))
+                start = time.perf_counter()
+                full_model.fit(X_train, y_train)
+                full_seconds = time.perf_counter() - start
+                metrics['full_retrain'] = dict(regression_metrics(y_eval, full_model.predict(X_eval)),
+                                               training_seconds=round(full_seconds, 3))
+            
+            progress(0.9, "Menyimpan model")
+            model_id = model_id or self.registry.next_id()
+            seen = np.unique(train_hashes) if parent_hashes is None else np.union1d(parent_hashes, train_hashes)
+            self.save_model(model_id, model, parent['le_store'], parent['le_dept'], parent['feature_columns'],
+                            feature_spec, seen)
+            
+            return {
+                'model_id': model_id,
+                'metrics': metrics,
+                'feature_importance': dict(zip(X.columns, model.feature_importances_)),
+                'feature_spec': feature_spec
             }
             
+        except Exception as e:
+            print(f"Error in warm_start_model: {str(e)}")
+            raise e
+    
+    def optimize_model(self, df: pd.DataFrame, n_trials: int = 50, dataset_id: Optional[int] = None,
+                       feature_spec: Optional[Dict[str, Any]] = None, model_id: Optional[int] = None,
+                       progress: Optional[ProgressFn] = None, search: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Optimize XGBoost model using Optuna.
+        
+        ``search`` selects standard or successive-halving search (see
+        app.tuning.normalize_search_spec). With backtest folds the test rows
+        are the most recent weeks instead of a random sample.
+        """
+        progress = progress or _no_progress
+        try:
+            feature_spec = FeaturePlan(feature_spec).spec
+            search = normalize_search_spec(search)
+            progress(0.0, "Menyiapkan fitur")
+            X, y, processed_df, le_store, le_dept = self.prepare_features(df, dataset_id, feature_spec)
+            backtest = None
+            if search['backtest_folds']:
+                # The test rows are the last weeks; trials backtest on the weeks before them
+                horizon = search['backtest_horizon_weeks'] or BACKTEST_HORIZON_WEEKS
+                dates = processed_df['Date'].to_numpy()
+                weeks = np.unique(dates)
+                if len(weeks) <= horizon:
+                    raise ValueError(f"Data hanya memiliki {len(weeks)} minggu; dibutuhkan lebih dari {horizon}")
+                before = dates < weeks[-horizon]
+                X_train, X_test, y_train, y_test = X[before], X[~before], y[before], y[~before]
+                backtest = Backtest(X_train, y_train, dates[before], search['backtest_folds'], horizon,
+                                    workers=self.backtest_workers)
+            else:
+                X_train, X_test, y_train, y_test = train_test_split(
+                    X, y, test_size=0.2, random_state=42
+                )
+            
+            # Trials stop early on rows held out of the training split; the test rows stay unseen
+            X_fit, X_valid, y_fit, y_valid = train_test_split(
+                X_train, y_train, test_size=0.2, random_state=42
+            )
+            
+            successive_halving = search['mode'] == 'successive_halving'
+            total = sum(rung_sizes(n_trials, search['fractions'], search['eta'])) if successive_halving else n_trials
+            
+            def report_trial(done):
+                progress(0.05 + 0.85 * min(done, total) / total, f"Trial {done}/{total}")
+            
+            # Run optimization; studies of database models are stored and resumable
+            progress(0.05, f"Trial 0/{total}")
+            name = study_name(model_id) if model_id else None
+            if successive_halving:
+                # Early rungs train on a sample of series and recent weeks
+                keys = processed_df.loc[X_fit.index.append(X_valid.index)]
+                series_ids = keys.groupby(['Store_encoded', 'Dept_encoded'], sort=False).ngroup().to_numpy()
+                study = run_successive_halving(X_fit, y_fit, X_valid, y_valid, series_ids, keys['Date'].to_numpy(),
+                                               n_trials, search['fractions'], search['eta'],
+                                               name=name, on_trial=report_trial)
+            elif backtest is not None:
+                with backtest:
+                    study = run_study(None, None, None, None, n_trials, name=name, on_trial=report_trial,
+                                      objective=BacktestObjective(backtest))
+            else:
+                study = run_study(X_fit, y_fit, X_valid, y_valid, n_trials, name=name,
+                                  parallel_trials=self.parallel_trials, on_trial=report_trial)
+            
+            # Train final model with best parameters and the best trial's round count
+            progress(0.9, "Melatih model akhir")
+            best_params = tuned_params(study)
+            final_model = xgb.XGBRegressor(**best_params, n_jobs=cpu_limit(), **compact_options(feature_spec))
+            if feature_spec['compact']:
+                dtest = fit_quantized(final_model, X_train, y_train, X_test)
+                y_pred = final_model.get_booster().predict(dtest)
+            else:
+                final_model.fit(X_train, y_train)
+                y_pred = final_model.predict(X_test)
+            
+            # Calculate metrics
+            metrics = regression_metrics(y_test, y_pred)
+            if backtest is not None:
+                metrics['backtest'] = {
+                    'folds': [{key: fold[key] for key in ('fold', 'train_end', 'test_start', 'test_end')}
+                              for fold in backtest.folds],
+                    'fold_rmse': final_trial(study).user_attrs.get('fold_rmse'),
+                    'test_start': str(pd.Timestamp(weeks[-horizon]).date())
+                }
+            
+            # Save optimized model under the database Model row's id when one is given
+            model_id = model_id or self.registry.next_id()
+            self.save_model(model_id, final_model, le_store, le_dept, X.columns.tolist(), feature_spec,
+                            np.unique(row_hashes(processed_df.loc[X_train.index])))
+            
             return {
                 'model_id': model_id,
                 'best_params': best_params,
                 'metrics': metrics,
-                'optimization_history': [trial.value for trial in study.trials]
+                'optimization_history': [
+                    {
+                        'trial': trial.number,
+                        'value': trial.value,
+                        'rung': trial.user_attrs.get('rung', 0),
+                        'data_fraction': trial.user_attrs.get('data_fraction', 1.0)
+                    }
+                    for trial in study.trials if trial.value is not None
+                ],
+                'search': search,
+                'feature_spec': feature_spec
             }
             
         except Exception as e:
             print(f"Error in optimize_model: {str(e)}")
             raise e
     
-    def classify_abc_xyz(self, df: pd.DataFrame) -> Dict[str, Dict[str, Any]]:
+    def backtest_models(self, df: pd.DataFrame, model_ids: List[int], dataset_id: Optional[int] = None,
+                        n_folds: Optional[int] = None, horizon_weeks: Optional[int] = None,
+                        tensor: Optional[SalesTensor] = None) -> Dict[str, Any]:
+        """Compare saved models on rolling-origin folds of a dataset.
+        
+        A trained model has seen every week of its data, so each model's
+        parameters and round count are refitted on every fold's training
+        weeks, with its own feature spec, and scored on the weeks after the
+        cutoff (see app.backtest). Metrics are given per fold, per ABC-XYZ
+        category over the test rows of all folds, and overall. Segmented
+        models are backtested with the configuration of their global model.
+        """
+        try:
+            classification = self.classify_abc_xyz(df, tensor)
+            category_of = {key: data['category_name'] for key, data in classification.items()}
+            results = {}
+            for model_id in model_ids:
+                model_data = self.load_model(model_id)
+                model = model_data['model']
+                X, y, processed_df, _, _ = self.prepare_features(df, dataset_id, model_data.get('feature_spec'))
+                categories = series_keys(processed_df).map(category_of).fillna('C-Z').to_numpy()
+                
+                start = time.perf_counter()
+                with Backtest(X, y, processed_df['Date'].to_numpy(), n_folds, horizon_weeks,
+                              workers=self.backtest_workers) as backtest:
+                    fold_results = backtest.run(model.get_xgb_params(), model.get_booster().num_boosted_rounds())
+                seconds = time.perf_counter() - start
+                
+                y_values = y.to_numpy()
+                test_rows = np.concatenate([result['test_rows'] for result in fold_results])
+                predictions = np.concatenate([result['predictions'] for result in fold_results])
+                test_categories = categories[test_rows]
+                category_metrics = {}
+                for category in np.unique(test_categories):
+                    in_category = test_categories == category
+                    category_metrics[category] = dict(
+                        regression_metrics(y_values[test_rows][in_category], predictions[in_category]),
+                        count=int(in_category.sum())
+                    )
+                
+                results[model_id] = {
+                    'metrics': regression_metrics(y_values[test_rows], predictions),
+                    'folds': [
+                        dict(
+                            regression_metrics(y_values[result['test_rows']], result['predictions']),
+                            fold=result['fold'],
+                            train_end=result['train_end'],
+                            test_start=result['test_start'],
+                            test_end=result['test_end'],
+                            training_rows=len(result['train_rows']),
+                            test_rows=len(result['test_rows']),
+                            training_seconds=round(result['training_seconds'], 3)
+                        )
+                        for result in fold_results
+                    ],
+                    'categories': category_metrics,
+                    'segmented': bool(model_data.get('segments')),
+                    'seconds': round(seconds, 3)
+                }
+            
+            return {
+                'n_folds': len(fold_results) if model_ids else 0,
+                'horizon_weeks': horizon_weeks or BACKTEST_HORIZON_WEEKS,
+                'models': results
+            }
+        
+        except Exception as e:
+            print(f"Error in backtest_models: {str(e)}")
+            raise e
+    
+    def classify_abc_xyz(self, df: pd.DataFrame, tensor: Optional[SalesTensor] = None) -> Dict[str, Dict[str, Any]]:
         """Enhanced ABC-XYZ classification with business metrics"""
         try:
             # Group by Store and Dept
-            dept_stats = df.groupby(['Store', 'Dept']).agg({
-                'Weekly_Sales': ['sum', 'mean', 'std', 'count']
-            }).reset_index()
-            
-            dept_stats.columns = ['Store', 'Dept', 'Total_Sales', 'Mean_Sales', 'Std_Sales', 'Count']
+            if tensor is not None:
+                dept_stats = tensor.series_stats()
+            else:
+                dept_stats = df.groupby(['Store', 'Dept'], observed=True).agg({
+                    'Weekly_Sales': ['sum', 'mean', 'std', 'count']
+                }).reset_index()
+                
+                dept_stats.columns = ['Store', 'Dept', 'Total_Sales', 'Mean_Sales', 'Std_Sales', 'Count']
             dept_stats['CV'] = dept_stats['Std_Sales'] / dept_stats['Mean_Sales']
             dept_stats['CV'] = dept_stats['CV'].fillna(0)
             
@@ -309,94 +873,96 @@ class MLService:
             print(f"Error in classify_abc_xyz: {str(e)}")
             raise e
     
-    def generate_predictions_by_category(self, df: pd.DataFrame, model_id: int, batch_size: int = 1000) -> Dict[str, Any]:
-        """Generate predictions with categorization and batching"""
+    def generate_predictions_by_category(self, df: pd.DataFrame, model_id: int, tensor: Optional[SalesTensor] = None,
+                                         dataset_id: Optional[int] = None,
+                                         feature_spec: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Generate predictions with their ABC-XYZ categories, as columns.
+        
+        ``rows`` holds one NumPy array per field with an entry per
+        prediction; its ``series`` column indexes the ``series`` table,
+        whose ``key`` refers to the series' entry in
+        ``abc_xyz_classification``. ``categorized_results`` gives the row
+        positions of every category. prediction_records() expands rows
+        into dicts.
+        """
         try:
-            if model_id not in self.models:
-                # Load model from file
-                model_path = f"models/xgboost_model_{model_id}.joblib"
-                if not os.path.exists(model_path):
-                    model_path = f"models/optimized_xgboost_model_{model_id}.joblib"
-                
-                if os.path.exists(model_path):
-                    self.models[model_id] = joblib.load(model_path)
-                else:
-                    raise ValueError(f"Model {model_id} not found")
-            
-            model_data = self.models[model_id]
-            model = model_data['model']
+            model_data = self.load_model(model_id)
             
-            X, y, processed_df, _, _ = self.prepare_data(df)
+            # Replay the features the model was trained on; models saved before
+            # feature specs existed used the default spec
+            if feature_spec is None:
+                feature_spec = model_data.get('feature_spec')
+            X, y, processed_df, _, _ = self.prepare_features(df, dataset_id, feature_spec)
             
             # Get ABC-XYZ classification
-            abc_xyz_classification = self.classify_abc_xyz(df)
-            
-            # Make predictions
-            predictions = model.predict(X)
-            
-            # Organize results by category
-            categorized_results = {
-                'A-X': [], 'A-Y': [], 'A-Z': [],
-                'B-X': [], 'B-Y': [], 'B-Z': [],
-                'C-X': [], 'C-Y': [], 'C-Z': []
-            }
-            
-            category_metrics = {}
-            all_results = []
-            
-            # Process predictions in batches
-            for i in range(0, len(processed_df), batch_size):
-                batch_end = min(i + batch_size, len(processed_df))
-                batch_df = processed_df.iloc[i:batch_end]
-                batch_predictions = predictions[i:batch_end]
-                
-                for j, (idx, row) in enumerate(batch_df.iterrows()):
-                    store_dept_key = f"{int(row['Store'])}_{int(row['Dept'])}"
-                    classification_data = abc_xyz_classification.get(store_dept_key, {})
-                    category = classification_data.get('category_name', 'C-Z')
-                    
-                    # Calculate individual accuracy
-                    actual_sales = float(row['Weekly_Sales'])
-                    predicted_sales = float(batch_predictions[j])
-                    accuracy = 100 * (1 - abs(actual_sales - predicted_sales) / actual_sales) if actual_sales != 0 else 0
-                    
-                    result = {
-                        'store': str(int(row['Store'])),
-                        'dept': str(int(row['Dept'])),
-                        'predicted_sales': predicted_sales,
-                        'actual_sales': actual_sales,
-                        'accuracy': accuracy,
-                        'date': row['Date'].strftime('%Y-%m-%d'),
-                        'category': category,
-                        'classification_data': classification_data
-                    }
-                    
-                    categorized_results[category].append(result)
-                    all_results.append(result)
+            abc_xyz_classification = self.classify_abc_xyz(df, tensor)
+            
+            # Make predictions; segmented models route each series to its segment's model
+            predictions = self.predict_rows(model_data, X, processed_df)
+            
+            # One entry per (Store, Dept) series, which rows refer to by position
+            keys = pd.DataFrame({
+                'store': processed_df['Store'].astype(int).to_numpy(),
+                'dept': processed_df['Dept'].astype(int).to_numpy()
+            })
+            grouped = keys.groupby(['store', 'dept'], sort=True)
+            row_series = grouped.ngroup().to_numpy(dtype=np.int32)
+            series = grouped.size().index.to_frame(index=False)
+            series_key = series['store'].astype(str) + '_' + series['dept'].astype(str)
+            series_category = series_key.map(
+                {key: data['category_name'] for key, data in abc_xyz_classification.items()}
+            ).fillna('C-Z')
+            
+            actual = processed_df['Weekly_Sales'].to_numpy(dtype=np.float64)
+            predicted = np.asarray(predictions, dtype=np.float64)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                accuracy = np.where(actual != 0, 100 * (1 - np.abs(actual - predicted) / actual), 0.0)
+            row_category = pd.Categorical(series_category, categories=CATEGORIES).codes[row_series]
             
             # Calculate metrics per category
-            for category, results in categorized_results.items():
-                if results:
-                    accuracies = [r['accuracy'] for r in results]
-                    total_predicted = sum(r['predicted_sales'] for r in results)
-                    total_actual = sum(r['actual_sales'] for r in results)
-                    
-                    category_metrics[category] = {
-                        'count': len(results),
-                        'avg_accuracy': np.mean(accuracies),
-                        'min_accuracy': np.min(accuracies),
-                        'max_accuracy': np.max(accuracies),
-                        'total_predicted_sales': total_predicted,
-                        'total_actual_sales': total_actual,
-                        'revenue_impact': total_actual,
-                        'confidence_level': 'high' if np.mean(accuracies) > 90 else 'medium' if np.mean(accuracies) > 80 else 'low'
-                    }
+            category_metrics = {}
+            stats = pd.DataFrame({
+                'category': row_category, 'accuracy': accuracy, 'predicted': predicted, 'actual': actual
+            }).groupby('category').agg(
+                count=('accuracy', 'size'),
+                avg_accuracy=('accuracy', 'mean'),
+                min_accuracy=('accuracy', 'min'),
+                max_accuracy=('accuracy', 'max'),
+                total_predicted_sales=('predicted', 'sum'),
+                total_actual_sales=('actual', 'sum')
+            )
+            for code, row in stats.iterrows():
+                avg_accuracy = float(row['avg_accuracy'])
+                category_metrics[CATEGORIES[code]] = {
+                    'count': int(row['count']),
+                    'avg_accuracy': avg_accuracy,
+                    'min_accuracy': float(row['min_accuracy']),
+                    'max_accuracy': float(row['max_accuracy']),
+                    'total_predicted_sales': float(row['total_predicted_sales']),
+                    'total_actual_sales': float(row['total_actual_sales']),
+                    'revenue_impact': float(row['total_actual_sales']),
+                    'confidence_level': 'high' if avg_accuracy > 90 else 'medium' if avg_accuracy > 80 else 'low'
+                }
             
             return {
-                'categorized_results': categorized_results,
+                'rows': {
+                    'series': row_series,
+                    'date': processed_df['Date'].to_numpy(dtype='datetime64[ns]').astype('datetime64[D]'),
+                    'predicted_sales': predicted,
+                    'actual_sales': actual,
+                    'accuracy': accuracy
+                },
+                'series': {
+                    'store': series['store'].astype(str).tolist(),
+                    'dept': series['dept'].astype(str).tolist(),
+                    'key': series_key.tolist(),
+                    'category': series_category.tolist()
+                },
+                'categorized_results': {
+                    category: np.flatnonzero(row_category == code) for code, category in enumerate(CATEGORIES)
+                },
                 'category_metrics': category_metrics,
-                'all_results': all_results,
-                'total_predictions': len(all_results),
+                'total_predictions': len(processed_df),
                 'abc_xyz_classification': abc_xyz_classification
             }
             
@@ -406,5 +972,4 @@ class MLService:
     
     def generate_predictions(self, df: pd.DataFrame, model_id: int) -> List[Dict[str, Any]]:
         """Legacy method for backward compatibility"""
-        result = self.generate_predictions_by_category(df, model_id)
-        return result['all_results']
+        return prediction_records(self.generate_predictions_by_category(df, model_id))
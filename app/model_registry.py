@@ -0,0 +1,251 @@
+import os
+import json
+import time
+import uuid
+import shutil
+import logging
+import threading
+from collections import OrderedDict, deque
+from typing import Any, Dict, Optional, Tuple
+
+import joblib
+import numpy as np
+import xgboost as xgb
+from sklearn.preprocessing import LabelEncoder
+
+logger = logging.getLogger(__name__)
+
+MODEL_DIR = os.environ.get("MODEL_DIR", "models")
+# Boosters kept loaded per process, by the size of their artifacts
+MODEL_CACHE_MAX_MB = int(os.environ.get("MODEL_CACHE_MAX_MB", "512"))
+
+ARTIFACT_FORMAT = 1
+BOOSTER_FILE = "model.ubj"
+# Load times kept for the latency statistics
+LOAD_HISTORY = 100
+
+
+def _params(model: xgb.XGBRegressor) -> Dict[str, Any]:
+    """Constructor parameters of a model that were set, as JSON values"""
+    params = {}
+    for key, value in model.get_params().items():
+        if value is None or key == 'callbacks' or (key == 'missing' and np.isnan(value)):
+            continue
+        params[key] = value.item() if isinstance(value, np.generic) else value
+    return params
+
+
+def _load_booster(path: str, params: Dict[str, Any]) -> xgb.XGBRegressor:
+    model = xgb.XGBRegressor(**params)
+    model.load_model(path)
+    return model
+
+
+class ModelRegistry:
+    """Trained models by database Model.id, saved in XGBoost's native format.
+
+    Every model is a directory under ``root`` named after its id, holding the
+    booster as UBJSON (``model.ubj``, plus ``segments/`` for segment models),
+    the encoder classes and metadata as JSON and the training row hashes as
+    .npy. Models are loaded on first use and kept in a per-process LRU
+    bounded by ``max_mb`` of artifact size; row hashes are memory-mapped and
+    not counted. Artifacts from before the registry (``xgboost_model_{id}``
+    and ``optimized_xgboost_model_{id}`` joblib files) are converted the
+    first time they are loaded.
+    """
+
+    def __init__(self, root: str = MODEL_DIR, max_mb: Optional[int] = None):
+        self.root = root
+        self.max_bytes = (MODEL_CACHE_MAX_MB if max_mb is None else max_mb) * 1024 * 1024
+        self._entries: 'OrderedDict[int, Tuple[Dict[str, Any], int, int]]' = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._load_seconds: deque = deque(maxlen=LOAD_HISTORY)
+        os.makedirs(self.root, exist_ok=True)
+
+    def model_dir(self, model_id: int) -> str:
+        return os.path.join(self.root, str(int(model_id)))
+
+    def _version(self, model_id: int) -> Optional[int]:
+        """Modification time of a model's metadata; changes when the model is saved again"""
+        try:
+            return os.stat(os.path.join(self.model_dir(model_id), "meta.json")).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def exists(self, model_id: int) -> bool:
+        return self._version(model_id) is not None or self._legacy_path(model_id) is not None
+
+    def next_id(self) -> int:
+        """An id after every saved model, for models trained without a database row"""
+        ids = [int(name) for name in os.listdir(self.root) if name.isdigit()]
+        return max(ids, default=0) + 1
+
+    def save(self, model_id: int, model: xgb.XGBRegressor, le_store: LabelEncoder, le_dept: LabelEncoder,
+             feature_columns, feature_spec: Dict[str, Any], row_hashes: Optional[np.ndarray],
+             segments: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Write a model's artifacts, replacing any saved under the same id, and keep it loaded"""
+        tmp_dir = os.path.join(self.root, f".tmp_{uuid.uuid4().hex}")
+        os.makedirs(tmp_dir)
+        try:
+            model.save_model(os.path.join(tmp_dir, BOOSTER_FILE))
+            meta = {
+                'format': ARTIFACT_FORMAT,
+                'model_id': int(model_id),
+                'params': _params(model),
+                'feature_columns': list(feature_columns),
+                'feature_spec': feature_spec,
+                'row_hashes': row_hashes is not None,
+                'segments': None,
+                'created_at': time.time()
+            }
+            if segments:
+                os.makedirs(os.path.join(tmp_dir, "segments"))
+                files = {}
+                for i, (label, segment_model) in enumerate(segments['models'].items()):
+                    name = os.path.join("segments", f"{i:04d}.ubj")
+                    segment_model.save_model(os.path.join(tmp_dir, name))
+                    files[label] = {'file': name, 'params': _params(segment_model)}
+                meta['segments'] = {'segment_by': segments['segment_by'], 'series': segments['series'],
+                                    'models': files}
+            with open(os.path.join(tmp_dir, "encoders.json"), "w") as f:
+                json.dump({'store': le_store.classes_.tolist(), 'dept': le_dept.classes_.tolist()}, f)
+            if row_hashes is not None:
+                np.save(os.path.join(tmp_dir, "row_hashes.npy"), np.asarray(row_hashes, dtype=np.uint64))
+            with open(os.path.join(tmp_dir, "meta.json"), "w") as f:
+                json.dump(meta, f)
+
+            path = self.model_dir(model_id)
+            with self._lock:
+                if model_id in self._entries:
+                    self._remove(model_id)
+                if os.path.exists(path):
+                    shutil.rmtree(path)
+                os.replace(tmp_dir, path)
+        except BaseException:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+
+        model_data = self._read(model_id)
+        self._keep(model_id, model_data)
+        return model_data
+
+    def get(self, model_id: int) -> Dict[str, Any]:
+        """A model's artifacts, loaded from disk on first use.
+
+        Returns the fitted model, both encoders, feature columns and spec,
+        training row hashes (or None) and the segment models (or None).
+        Raises ValueError when there is no model with that id.
+        """
+        version = self._version(model_id)
+        with self._lock:
+            entry = self._entries.get(model_id)
+            if entry is not None and entry[2] == version:
+                self._entries.move_to_end(model_id)
+                self._hits += 1
+                return entry[0]
+            self._misses += 1
+
+        start = time.perf_counter()
+        if version is None:
+            legacy_path = self._legacy_path(model_id)
+            if legacy_path is None:
+                raise ValueError(f"Model {model_id} not found")
+            model_data = self._convert(model_id, legacy_path)
+        else:
+            model_data = self._read(model_id)
+            self._keep(model_id, model_data)
+        with self._lock:
+            self._load_seconds.append(time.perf_counter() - start)
+        return model_data
+
+    def _read(self, model_id: int) -> Dict[str, Any]:
+        path = self.model_dir(model_id)
+        with open(os.path.join(path, "meta.json")) as f:
+            meta = json.load(f)
+        with open(os.path.join(path, "encoders.json")) as f:
+            encoders = json.load(f)
+        le_store, le_dept = LabelEncoder(), LabelEncoder()
+        le_store.classes_ = np.array(encoders['store'])
+        le_dept.classes_ = np.array(encoders['dept'])
+
+        segments = meta['segments']
+        if segments:
+            segments = dict(segments, models={
+                label: _load_booster(os.path.join(path, entry['file']), entry['params'])
+                for label, entry in segments['models'].items()
+            })
+        return {
+            'model': _load_booster(os.path.join(path, BOOSTER_FILE), meta['params']),
+            'le_store': le_store,
+            'le_dept': le_dept,
+            'feature_columns': meta['feature_columns'],
+            'feature_spec': meta['feature_spec'],
+            'row_hashes': np.load(os.path.join(path, "row_hashes.npy"), mmap_mode='r') if meta['row_hashes'] else None,
+            'segments': segments,
+            'path': path
+        }
+
+    def _keep(self, model_id: int, model_data: Dict[str, Any]) -> None:
+        """Add a loaded model to the LRU, evicting the least recently used over the budget"""
+        path = model_data['path']
+        size = sum(
+            os.path.getsize(os.path.join(directory, name))
+            for directory, _, names in os.walk(path) for name in names if name != "row_hashes.npy"
+        )
+        version = self._version(model_id)
+        with self._lock:
+            if model_id in self._entries:
+                self._remove(model_id)
+            if size > self.max_bytes:
+                return
+            self._entries[model_id] = (model_data, size, version)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self._evictions += 1
+
+    def _remove(self, model_id: int) -> None:
+        _, size, _ = self._entries.pop(model_id)
+        self._bytes -= size
+
+    def _legacy_path(self, model_id: int) -> Optional[str]:
+        for name in (f"xgboost_model_{model_id}.joblib", f"optimized_xgboost_model_{model_id}.joblib"):
+            path = os.path.join(self.root, name)
+            if os.path.exists(path):
+                return path
+        return None
+
+    def _convert(self, model_id: int, legacy_path: str) -> Dict[str, Any]:
+        """Save a joblib artifact in the registry format; the joblib file is left in place"""
+        logger.info(f"Converting model artifact {legacy_path} to {self.model_dir(model_id)}")
+        legacy = joblib.load(legacy_path)
+        return self.save(model_id, legacy['model'], legacy['le_store'], legacy['le_dept'],
+                         legacy['feature_columns'], legacy.get('feature_spec'), legacy.get('row_hashes'),
+                         segments=legacy.get('segments'))
+
+    def invalidate(self, model_id: Optional[int] = None) -> None:
+        """Unload one model, or every model"""
+        with self._lock:
+            for key in [k for k in self._entries if model_id is None or k == model_id]:
+                self._remove(key)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            requests = self._hits + self._misses
+            loads = list(self._load_seconds)
+            return {
+                'hits': self._hits,
+                'misses': self._misses,
+                'hit_rate': self._hits / requests if requests else 0.0,
+                'evictions': self._evictions,
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'mean_load_seconds': round(sum(loads) / len(loads), 4) if loads else None,
+                'max_load_seconds': round(max(loads), 4) if loads else None,
+                'models': list(self._entries),
+            }
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, Text, Boolean, ForeignKey
+from sqlalchemy import Column, Integer, String, Float, Date, DateTime, Text, Boolean, ForeignKey
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.database import Base
@@ -19,6 +19,7 @@ class User(Base):
     datasets = relationship("Dataset", back_populates="uploader")
     models = relationship("Model", back_populates="trainer")
     predictions = relationship("Prediction", back_populates="creator")
+    prediction_runs = relationship("PredictionRun", back_populates="creator")
     feedback = relationship("Feedback", back_populates="user")
 
 class Dataset(Base):
@@ -44,25 +45,75 @@ class Model(Base):
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, index=True)
     dataset_id = Column(Integer, ForeignKey("datasets.id"))
-    algorithm = Column(String)  # XGBoost, XGBoost_Optimized
+    algorithm = Column(String)  # XGBoost, XGBoost_Optimized, XGBoost_WarmStart, XGBoost_Segmented
     parameters = Column(Text)  # JSON string of model parameters
     metrics = Column(Text)  # JSON string of model metrics
+    feature_spec = Column(Text, nullable=True)  # JSON feature spec replayed at prediction time
+    parent_model_id = Column(Integer, ForeignKey("models.id"), nullable=True)  # Model a warm start continued from
     trained_by = Column(Integer, ForeignKey("users.id"))
-    status = Column(String, default="training")  # training, completed, failed
+    status = Column(String, default="training")  # training, completed, failed, cancelled
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     
     # Relationships
     dataset = relationship("Dataset", back_populates="models")
     trainer = relationship("User", back_populates="models")
     predictions = relationship("Prediction", back_populates="model")
+    prediction_runs = relationship("PredictionRun", back_populates="model")
+    jobs = relationship("TrainingJob", back_populates="model", order_by="TrainingJob.id")
+
+class TrainingJob(Base):
+    __tablename__ = "training_jobs"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    model_id = Column(Integer, ForeignKey("models.id"))
+    dataset_id = Column(Integer, ForeignKey("datasets.id"))
+    kind = Column(String)  # train, optimize
+    payload = Column(Text)  # JSON string of the task arguments
+    status = Column(String, default="queued", index=True)  # queued, running, completed, failed, cancelled
+    progress = Column(Float, default=0.0)  # 0..1
+    message = Column(String, nullable=True)  # current stage
+    error = Column(Text, nullable=True)
+    attempts = Column(Integer, default=0)
+    cancel_requested = Column(Boolean, default=False)
+    submitted_by = Column(Integer, ForeignKey("users.id"))
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    started_at = Column(DateTime(timezone=True), nullable=True)
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+    duration_seconds = Column(Float, nullable=True)
+    
+    # Relationships
+    model = relationship("Model", back_populates="jobs")
+
+class PredictionRun(Base):
+    __tablename__ = "prediction_runs"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    model_id = Column(Integer, ForeignKey("models.id"), index=True)
+    dataset_id = Column(Integer, ForeignKey("datasets.id"))
+    created_by = Column(Integer, ForeignKey("users.id"))
+    status = Column(String, default="running", index=True)  # running, completed, failed
+    rows_count = Column(Integer, default=0)
+    summary = Column(Text, nullable=True)  # JSON overall and per-category aggregates, computed at write time
+    error = Column(Text, nullable=True)
+    started_at = Column(DateTime(timezone=True), nullable=True)
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+    duration_seconds = Column(Float, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    
+    # Relationships
+    model = relationship("Model", back_populates="prediction_runs")
+    creator = relationship("User", back_populates="prediction_runs")
+    predictions = relationship("Prediction", back_populates="run")
 
 class Prediction(Base):
     __tablename__ = "predictions"
     
     id = Column(Integer, primary_key=True, index=True)
     model_id = Column(Integer, ForeignKey("models.id"))
+    run_id = Column(Integer, ForeignKey("prediction_runs.id"), nullable=True, index=True)
     store_id = Column(String)
     dept_id = Column(String)
+    date = Column(Date, nullable=True)  # Week the prediction is for
     predicted_sales = Column(Float)
     actual_sales = Column(Float, nullable=True)
     abc_class = Column(String, nullable=True)  # A, B, C
@@ -72,6 +123,7 @@ class Prediction(Base):
     
     # Relationships
     model = relationship("Model", back_populates="predictions")
+    run = relationship("PredictionRun", back_populates="predictions")
     creator = relationship("User", back_populates="predictions")
 
 class Feedback(Base):
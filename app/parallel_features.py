@@ -0,0 +1,123 @@
+import os
+from multiprocessing import shared_memory
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.executor import run_pool
+
+# Worker processes for window features; 1 keeps feature building in-process
+FEATURE_WORKERS = int(os.environ.get("FEATURE_WORKERS", "1"))
+# Below this many rows the cost of shipping work to processes outweighs the gain
+FEATURE_PARALLEL_MIN_ROWS = int(os.environ.get("FEATURE_PARALLEL_MIN_ROWS", "200000"))
+
+
+def shard_bounds(group_ids: np.ndarray, n_shards: int) -> List[Tuple[int, int]]:
+    """Split rows sorted by series into contiguous shards of similar size.
+
+    Cuts only fall on series boundaries, so every series is handled by one
+    worker, and shards in order cover the rows in their original order.
+    """
+    n = len(group_ids)
+    starts = np.flatnonzero(np.r_[True, group_ids[1:] != group_ids[:-1]]) if n else np.array([], dtype=np.int64)
+    targets = np.arange(1, n_shards) * n / n_shards
+    # First series start at or after each target row
+    cuts = starts[np.minimum(np.searchsorted(starts, targets), len(starts) - 1)] if len(starts) else []
+    bounds = np.unique(np.r_[0, cuts, n]).astype(np.int64)
+    return [(int(a), int(b)) for a, b in zip(bounds[:-1], bounds[1:]) if b > a]
+
+
+class _SharedArray:
+    """A NumPy array backed by a named shared memory block"""
+
+    def __init__(self, shape: Tuple[int, ...], dtype: Any, name: Optional[str] = None):
+        self.dtype = np.dtype(dtype)
+        self.shape = shape
+        size = max(1, int(np.prod(shape)) * self.dtype.itemsize)
+        self.shm = shared_memory.SharedMemory(name=name, create=name is None, size=size)
+        self.array = np.ndarray(shape, dtype=self.dtype, buffer=self.shm.buf)
+
+    def spec(self) -> Tuple[str, Tuple[int, ...], str]:
+        return self.shm.name, self.shape, self.dtype.str
+
+    @classmethod
+    def attach(cls, spec: Tuple[str, Tuple[int, ...], str]) -> '_SharedArray':
+        name, shape, dtype = spec
+        return cls(shape, dtype, name=name)
+
+    def close(self, unlink: bool = False) -> None:
+        del self.array
+        self.shm.close()
+        if unlink:
+            self.shm.unlink()
+
+
+class _Owner:
+    """Base of an array handed out over a shared block; the block is closed once the array is freed"""
+
+    def __init__(self, shared: _SharedArray):
+        self.shared = shared
+        self.__array_interface__ = shared.array.__array_interface__
+
+    def __del__(self):
+        self.shared.close()
+
+
+def _window_shard(feature_spec: Dict[str, Any], values_spec, groups_spec,
+                  output_specs: Dict[str, Any], start: int, end: int) -> int:
+    """Compute window features for rows [start, end) straight into shared outputs"""
+    from app.feature_spec import FeaturePlan
+
+    values = _SharedArray.attach(values_spec)
+    groups = _SharedArray.attach(groups_spec)
+    outputs = {column: _SharedArray.attach(spec) for column, spec in output_specs.items()}
+    try:
+        features = FeaturePlan(feature_spec).window_features(values.array[start:end], groups.array[start:end])
+        for column, array in features.items():
+            outputs[column].array[start:end] = array
+    finally:
+        for shared in [values, groups] + list(outputs.values()):
+            shared.close()
+    return end - start
+
+
+def parallel_window_features(plan, values: np.ndarray, group_ids: np.ndarray,
+                             workers: int) -> Dict[str, np.ndarray]:
+    """FeaturePlan.window_features computed over series shards in worker processes.
+
+    Inputs are copied once into shared memory and every worker writes its
+    rows into preallocated shared output columns, so no frame is pickled and
+    the shards need no concatenation. The returned columns are those shared
+    blocks themselves, not copies. Results are identical to the serial
+    path because each series is computed whole by the same code. The
+    worker processes are started for the call and stopped after it.
+    """
+    dtypes = plan.window_dtypes(values.dtype)
+    shared_values = _SharedArray(values.shape, values.dtype)
+    shared_groups = _SharedArray(group_ids.shape, group_ids.dtype)
+    outputs = {column: _SharedArray(values.shape, dtype) for column, dtype in dtypes.items()}
+    try:
+        shared_values.array[:] = values
+        shared_groups.array[:] = group_ids
+
+        output_specs = {column: shared.spec() for column, shared in outputs.items()}
+        with run_pool(workers) as pool:
+            futures = [
+                pool.submit(_window_shard, plan.spec, shared_values.spec(), shared_groups.spec(), output_specs,
+                            start, end)
+                for start, end in shard_bounds(group_ids, workers)
+            ]
+            for future in futures:
+                future.result()
+    except BaseException:
+        for shared in outputs.values():
+            shared.close(unlink=True)
+        raise
+    finally:
+        for shared in [shared_values, shared_groups]:
+            shared.close(unlink=True)
+
+    # With the workers done the names can go; each block stays mapped until its column is freed
+    for shared in outputs.values():
+        shared.shm.unlink()
+    return {column: np.asarray(_Owner(shared)) for column, shared in outputs.items()}
@@ -0,0 +1,192 @@
+import json
+import logging
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, Iterator, Optional
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import and_, case, func, select
+from sqlalchemy.engine import Engine
+
+from app.database import engine as default_engine
+from app.models import Model, Prediction, PredictionRun
+
+logger = logging.getLogger(__name__)
+
+# Sums kept per category; averages are derived from them so summaries can be merged
+SUMMARY_SUMS = ['count', 'total_predicted_sales', 'total_actual_sales', 'revenue', 'accuracy_sum', 'accuracy_count']
+
+
+def _finish(sums: Dict[str, float]) -> Dict[str, Any]:
+    summary = {key: float(sums.get(key, 0)) for key in SUMMARY_SUMS}
+    summary['count'] = int(summary['count'])
+    summary['accuracy_count'] = int(summary['accuracy_count'])
+    summary['avg_accuracy'] = summary['accuracy_sum'] / summary['accuracy_count'] if summary['accuracy_count'] else None
+    return summary
+
+
+def _with_overall(categories: Dict[str, Dict[str, float]]) -> Dict[str, Any]:
+    overall = {key: sum(sums[key] for sums in categories.values()) for key in SUMMARY_SUMS}
+    return {
+        'categories': {category: _finish(sums) for category, sums in sorted(categories.items())},
+        'overall': _finish(overall)
+    }
+
+
+def summarize(frame: pd.DataFrame) -> Dict[str, Any]:
+    """Overall and per-category aggregates of prediction rows.
+
+    Categories are "<abc>-<xyz>" with missing classes as C and Z. Accuracy
+    is averaged over rows with non-zero actual sales; revenue counts the
+    actual sales of a row, or its prediction when there are none.
+    """
+    actual = frame['actual_sales'].astype(float)
+    predicted = frame['predicted_sales'].astype(float)
+    known = actual.notna() & (actual != 0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        accuracy = (100 * (1 - (actual - predicted).abs() / actual)).where(known)
+    parts = pd.DataFrame({
+        'category': frame['abc_class'].fillna('C') + '-' + frame['xyz_class'].fillna('Z'),
+        'predicted': predicted,
+        'actual': actual.fillna(0),
+        'revenue': actual.where(known, predicted),
+        'accuracy': accuracy
+    })
+    stats = parts.groupby('category').agg(
+        count=('predicted', 'size'),
+        total_predicted_sales=('predicted', 'sum'),
+        total_actual_sales=('actual', 'sum'),
+        revenue=('revenue', 'sum'),
+        accuracy_sum=('accuracy', 'sum'),
+        accuracy_count=('accuracy', 'count')
+    )
+    return _with_overall({category: row.to_dict() for category, row in stats.iterrows()})
+
+
+def merge_summaries(summaries: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+    """One summary over several runs' summaries"""
+    categories: Dict[str, Dict[str, float]] = {}
+    for summary in summaries:
+        for category, sums in summary.get('categories', {}).items():
+            merged = categories.setdefault(category, {key: 0 for key in SUMMARY_SUMS})
+            for key in SUMMARY_SUMS:
+                merged[key] += sums.get(key, 0)
+    return _with_overall(categories)
+
+
+def start_run(model_id: int, dataset_id: Optional[int], user_id: int, engine: Optional[Engine] = None) -> int:
+    """Insert a running PredictionRun and return its id"""
+    engine = engine or default_engine
+    with engine.begin() as conn:
+        return conn.execute(PredictionRun.__table__.insert().values(
+            model_id=model_id, dataset_id=dataset_id, created_by=user_id, status='running', rows_count=0,
+            started_at=datetime.now(timezone.utc)
+        )).inserted_primary_key[0]
+
+
+def fail_run(run_id: int, error: str, engine: Optional[Engine] = None) -> None:
+    """Mark a run failed and delete whatever predictions it had written"""
+    engine = engine or default_engine
+    with engine.begin() as conn:
+        conn.execute(Prediction.__table__.delete().where(Prediction.run_id == run_id))
+        conn.execute(PredictionRun.__table__.update().where(PredictionRun.id == run_id).values(
+            status='failed', rows_count=0, error=error, finished_at=datetime.now(timezone.utc)
+        ))
+
+
+def backfill_runs(engine: Optional[Engine] = None) -> int:
+    """Group predictions saved before runs existed into one completed run per model.
+
+    Their summaries are aggregated in the database. Returns the number of
+    runs created.
+    """
+    engine = engine or default_engine
+    predictions = Prediction.__table__
+    legacy = predictions.c.run_id.is_(None)
+    with engine.begin() as conn:
+        if conn.execute(select(predictions.c.id).where(legacy).limit(1)).first() is None:
+            return 0
+        known = and_(predictions.c.actual_sales.isnot(None), predictions.c.actual_sales != 0)
+        accuracy = 100 * (1 - func.abs(predictions.c.actual_sales - predictions.c.predicted_sales)
+                          / predictions.c.actual_sales)
+        rows = conn.execute(
+            select(
+                predictions.c.model_id,
+                func.coalesce(predictions.c.abc_class, 'C').label('abc'),
+                func.coalesce(predictions.c.xyz_class, 'Z').label('xyz'),
+                func.count().label('count'),
+                func.sum(predictions.c.predicted_sales).label('total_predicted_sales'),
+                func.sum(func.coalesce(predictions.c.actual_sales, 0)).label('total_actual_sales'),
+                func.sum(case((known, predictions.c.actual_sales), else_=predictions.c.predicted_sales)).label('revenue'),
+                func.sum(case((known, accuracy), else_=0)).label('accuracy_sum'),
+                func.sum(case((known, 1), else_=0)).label('accuracy_count'),
+                func.min(predictions.c.created_by).label('created_by'),
+                func.min(predictions.c.created_at).label('started_at'),
+                func.max(predictions.c.created_at).label('finished_at')
+            ).where(legacy).group_by('model_id', 'abc', 'xyz')
+        ).mappings().all()
+
+        by_model: Dict[int, Dict[str, Any]] = {}
+        for row in rows:
+            run = by_model.setdefault(row['model_id'], {'categories': {}, 'created_by': row['created_by'],
+                                                         'started_at': row['started_at'],
+                                                         'finished_at': row['finished_at']})
+            run['categories'][f"{row['abc']}-{row['xyz']}"] = {key: row[key] or 0 for key in SUMMARY_SUMS}
+            run['created_by'] = min(run['created_by'], row['created_by'])
+            run['started_at'] = min(run['started_at'], row['started_at'])
+            run['finished_at'] = max(run['finished_at'], row['finished_at'])
+
+        for model_id, run in by_model.items():
+            summary = _with_overall(run['categories'])
+            run_id = conn.execute(PredictionRun.__table__.insert().values(
+                model_id=model_id,
+                dataset_id=select(Model.dataset_id).where(Model.id == model_id).scalar_subquery(),
+                created_by=run['created_by'],
+                status='completed',
+                rows_count=summary['overall']['count'],
+                summary=json.dumps(summary),
+                started_at=run['started_at'],
+                finished_at=run['finished_at']
+            )).inserted_primary_key[0]
+            conn.execute(predictions.update().where(and_(legacy, predictions.c.model_id == model_id))
+                         .values(run_id=run_id))
+    logger.info(f"Grouped predictions saved before prediction runs into {len(by_model)} runs")
+    return len(by_model)
+
+
+# Prediction columns of a run's CSV export
+EXPORT_COLUMNS = ['store_id', 'dept_id', 'date', 'predicted_sales', 'actual_sales', 'abc_class', 'xyz_class']
+
+
+def iter_run_csv(run_id: int, engine: Optional[Engine] = None, batch_size: int = 65536) -> Iterator[str]:
+    """Stream a run's predictions out as CSV text, in the order they were written"""
+    engine = engine or default_engine
+    predictions = Prediction.__table__
+    query = (select(*[predictions.c[column] for column in EXPORT_COLUMNS])
+             .where(predictions.c.run_id == run_id).order_by(predictions.c.id))
+    with engine.connect() as conn:
+        result = conn.execution_options(yield_per=batch_size).execute(query)
+        header = True
+        for rows in result.partitions():
+            yield pd.DataFrame(rows, columns=EXPORT_COLUMNS).to_csv(index=False, header=header)
+            header = False
+        if header:
+            yield ','.join(EXPORT_COLUMNS) + '\n'
+
+
+def run_to_dict(run: PredictionRun) -> Dict[str, Any]:
+    return {
+        "id": run.id,
+        "model_id": run.model_id,
+        "model": {"name": run.model.name if run.model else "Unknown"},
+        "dataset_id": run.dataset_id,
+        "creator": {"name": run.creator.name if run.creator else "System"},
+        "status": run.status,
+        "rows_count": run.rows_count,
+        "summary": json.loads(run.summary) if run.summary else None,
+        "error": run.error,
+        "started_at": run.started_at.isoformat() if run.started_at else None,
+        "finished_at": run.finished_at.isoformat() if run.finished_at else None,
+        "duration_seconds": run.duration_seconds,
+        "created_at": run.created_at.isoformat() if run.created_at else None
+    }
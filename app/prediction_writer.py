@@ -0,0 +1,123 @@
+import io
+import os
+import json
+import time
+import logging
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Optional
+
+import numpy as np
+import pandas as pd
+from sqlalchemy.engine import Connection, Engine
+
+from app.database import engine as default_engine
+from app.models import Prediction, PredictionRun
+from app.prediction_runs import fail_run, summarize
+
+logger = logging.getLogger(__name__)
+
+# Predictions inserted and committed per transaction
+PREDICTION_WRITE_BATCH = int(os.environ.get("PREDICTION_WRITE_BATCH", "20000"))
+
+# Prediction columns written; id and created_at come from the database
+COLUMNS = ['model_id', 'run_id', 'store_id', 'dept_id', 'date', 'predicted_sales', 'actual_sales', 'abc_class',
+           'xyz_class', 'created_by']
+
+
+def prediction_frame(model_id: int, run_id: int, result: Dict[str, Any], user_id: int) -> pd.DataFrame:
+    """Prediction rows of a generate_predictions_by_category result, one column per table column"""
+    series = result['series']
+    classification = [result['abc_xyz_classification'].get(key, {}) for key in series['key']]
+    index = result['rows']['series']
+    return pd.DataFrame({
+        'model_id': model_id,
+        'run_id': run_id,
+        'store_id': np.asarray(series['store'], dtype=object)[index],
+        'dept_id': np.asarray(series['dept'], dtype=object)[index],
+        'date': np.datetime_as_string(result['rows']['date'], unit='D'),
+        'predicted_sales': result['rows']['predicted_sales'],
+        'actual_sales': result['rows']['actual_sales'],
+        'abc_class': np.asarray([data.get('abc_class') for data in classification], dtype=object)[index],
+        'xyz_class': np.asarray([data.get('xyz_class') for data in classification], dtype=object)[index],
+        'created_by': user_id
+    }, columns=COLUMNS)
+
+
+def _insert(conn: Connection, batch: pd.DataFrame) -> None:
+    """executemany of one batch with the Core insert statement, binding rows as tuples"""
+    statement = Prediction.__table__.insert().compile(dialect=conn.dialect, column_keys=COLUMNS)
+    if conn.dialect.positional:
+        conn.exec_driver_sql(str(statement), list(batch.itertuples(index=False, name=None)))
+    else:
+        conn.execute(Prediction.__table__.insert(), batch.to_dict('records'))
+
+
+def _copy(conn: Connection, batch: pd.DataFrame) -> None:
+    """COPY of one batch as CSV, for PostgreSQL through psycopg2 or psycopg 3"""
+    buffer = io.StringIO()
+    batch.to_csv(buffer, header=False, index=False)
+    sql = f"COPY {Prediction.__tablename__} ({', '.join(COLUMNS)}) FROM STDIN WITH (FORMAT csv)"
+    cursor = conn.connection.driver_connection.cursor()
+    try:
+        if hasattr(cursor, 'copy_expert'):
+            buffer.seek(0)
+            cursor.copy_expert(sql, buffer)
+        else:
+            with cursor.copy(sql) as copy:
+                copy.write(buffer.getvalue())
+    finally:
+        cursor.close()
+
+
+def write_predictions(run_id: int, result: Dict[str, Any], engine: Optional[Engine] = None,
+                      batch_size: Optional[int] = None,
+                      progress: Optional[Callable[[float, str], None]] = None) -> Dict[str, Any]:
+    """Insert the predictions of a generate_predictions_by_category result as a run's rows.
+
+    Each batch of ``batch_size`` rows is written and committed in its own
+    transaction, with COPY on PostgreSQL and a DBAPI executemany elsewhere;
+    no ORM objects are created, so the session's identity map stays empty.
+    ``progress`` is called after every batch. The run is then completed
+    with its row count, timing and summary (see prediction_runs.summarize),
+    which is returned. If writing fails the run is marked failed and its
+    rows deleted.
+    """
+    engine = engine or default_engine
+    batch_size = batch_size or PREDICTION_WRITE_BATCH
+    write = _copy if engine.dialect.name == 'postgresql' else _insert
+    runs = PredictionRun.__table__
+    with engine.connect() as conn:
+        run = conn.execute(runs.select().where(runs.c.id == run_id)).mappings().one()
+    model_id = run['model_id']
+
+    try:
+        frame = prediction_frame(model_id, run_id, result, run['created_by'])
+        summary = summarize(frame)
+        total = len(frame)
+        start = time.perf_counter()
+        for offset in range(0, total, batch_size):
+            with engine.begin() as conn:
+                write(conn, frame.iloc[offset:offset + batch_size])
+            done = min(offset + batch_size, total)
+            if progress is not None:
+                progress(done / total, f"Menyimpan prediksi ({done}/{total})")
+            logger.info(f"Saved {done}/{total} predictions of run {run_id} (model {model_id})")
+        logger.info(f"Saved {total} predictions of run {run_id} in {time.perf_counter() - start:.2f}s")
+
+        finished = datetime.now(timezone.utc)
+        started = run['started_at']
+        if started is not None and started.tzinfo is None:
+            # SQLite returns naive datetimes
+            started = started.replace(tzinfo=timezone.utc)
+        with engine.begin() as conn:
+            conn.execute(runs.update().where(runs.c.id == run_id).values(
+                status='completed',
+                rows_count=total,
+                summary=json.dumps(summary),
+                finished_at=finished,
+                duration_seconds=(finished - started).total_seconds() if started is not None else None
+            ))
+    except Exception as e:
+        fail_run(run_id, str(e), engine)
+        raise
+    return summary
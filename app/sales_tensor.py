@@ -0,0 +1,181 @@
+import os
+import json
+import shutil
+import uuid
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+# Dense tensors larger than this fall back to the long-format frame
+SALES_TENSOR_MAX_CELLS = int(os.environ.get("SALES_TENSOR_MAX_CELLS", "50000000"))
+
+TENSOR_COLUMNS = ['Store', 'Dept', 'Date', 'Weekly_Sales', 'IsHoliday']
+
+
+class SalesTensor:
+    """Dense (store, dept, week) view of a sales dataset.
+
+    ``sales`` holds Weekly_Sales with zeros where a series has no row for a
+    week, ``present`` marks which cells came from a row and ``holiday`` keeps
+    the IsHoliday flag per cell. Saved tensors are opened with
+    ``mmap_mode='r'`` so every worker process shares the same page cache
+    instead of holding its own copy.
+    """
+
+    def __init__(self, stores: np.ndarray, depts: np.ndarray, dates: np.ndarray,
+                 sales: np.ndarray, present: np.ndarray, holiday: np.ndarray):
+        self.stores = stores
+        self.depts = depts
+        self.dates = dates
+        self.sales = sales
+        self.present = present
+        self.holiday = holiday
+
+    @classmethod
+    def build(cls, df: pd.DataFrame, max_cells: Optional[int] = None) -> Optional['SalesTensor']:
+        """Pivot a long-format frame into a dense tensor.
+
+        Returns None when the frame has several rows for the same
+        (Store, Dept, Date) or when the dense shape would exceed
+        ``max_cells``; callers then stay on the long-format path.
+        """
+        max_cells = max_cells or SALES_TENSOR_MAX_CELLS
+
+        store_codes, stores = pd.factorize(df['Store'], sort=True)
+        dept_codes, depts = pd.factorize(df['Dept'], sort=True)
+        date_codes, dates = pd.factorize(pd.to_datetime(df['Date']), sort=True)
+        shape = (len(stores), len(depts), len(dates))
+        if np.prod(shape, dtype=np.int64) > max_cells:
+            return None
+
+        flat = np.ravel_multi_index((store_codes, dept_codes, date_codes), shape)
+        if len(np.unique(flat)) != len(flat):
+            return None
+
+        values = df['Weekly_Sales'].to_numpy(dtype=np.float32)
+        valid = ~np.isnan(values)
+
+        sales = np.zeros(shape, dtype=np.float32)
+        present = np.zeros(shape, dtype=bool)
+        holiday = np.zeros(shape, dtype=bool)
+        sales.reshape(-1)[flat[valid]] = values[valid]
+        present.reshape(-1)[flat[valid]] = True
+        holiday.reshape(-1)[flat] = df['IsHoliday'].to_numpy(dtype=bool)
+
+        return cls(np.asarray(stores), np.asarray(depts), np.asarray(dates), sales, present, holiday)
+
+    def save(self, path: str, source: Any = None) -> None:
+        """Write the tensor as .npy files plus a JSON index, replacing ``path``"""
+        tmp_dir = f"{path}.{uuid.uuid4().hex}.tmp"
+        os.makedirs(tmp_dir)
+        np.save(os.path.join(tmp_dir, "sales.npy"), self.sales)
+        np.save(os.path.join(tmp_dir, "present.npy"), self.present)
+        np.save(os.path.join(tmp_dir, "holiday.npy"), self.holiday)
+        with open(os.path.join(tmp_dir, "index.json"), "w") as f:
+            json.dump({
+                'dense': True,
+                'source': source,
+                'stores': self.stores.tolist(),
+                'depts': self.depts.tolist(),
+                'dates': [str(d) for d in self.dates.astype('datetime64[D]')],
+            }, f)
+        _replace_dir(tmp_dir, path)
+
+    @staticmethod
+    def save_unsupported(path: str, source: Any = None) -> None:
+        """Record that a dataset cannot be represented densely"""
+        tmp_dir = f"{path}.{uuid.uuid4().hex}.tmp"
+        os.makedirs(tmp_dir)
+        with open(os.path.join(tmp_dir, "index.json"), "w") as f:
+            json.dump({'dense': False, 'source': source}, f)
+        _replace_dir(tmp_dir, path)
+
+    @staticmethod
+    def read_index(path: str) -> Optional[Dict[str, Any]]:
+        index_path = os.path.join(path, "index.json")
+        if not os.path.exists(index_path):
+            return None
+        with open(index_path) as f:
+            return json.load(f)
+
+    @classmethod
+    def load(cls, path: str, index: Optional[Dict[str, Any]] = None) -> 'SalesTensor':
+        """Open a saved tensor as read-only memory maps"""
+        index = index or cls.read_index(path)
+        return cls(
+            np.array(index['stores']),
+            np.array(index['depts']),
+            np.array(index['dates'], dtype='datetime64[ns]'),
+            np.load(os.path.join(path, "sales.npy"), mmap_mode='r'),
+            np.load(os.path.join(path, "present.npy"), mmap_mode='r'),
+            np.load(os.path.join(path, "holiday.npy"), mmap_mode='r'),
+        )
+
+    def series_stats(self) -> pd.DataFrame:
+        """Sum, mean, sample std and count per (Store, Dept) series"""
+        totals, counts, stds = [], [], []
+        # Reduce one store at a time so float64 temporaries stay small
+        for s in range(len(self.stores)):
+            sales = np.asarray(self.sales[s], dtype=np.float64)
+            present = np.asarray(self.present[s])
+            count = present.sum(axis=1)
+            total = sales.sum(axis=1)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                mean = total / count
+                sq_dev = np.where(present, (sales - mean[:, None]) ** 2, 0.0).sum(axis=1)
+                std = np.sqrt(sq_dev / (count - 1))
+            std[count < 2] = np.nan
+            totals.append(total)
+            counts.append(count)
+            stds.append(std)
+
+        total = np.concatenate(totals)
+        count = np.concatenate(counts)
+        std = np.concatenate(stds)
+        stats = pd.DataFrame({
+            'Store': np.repeat(self.stores, len(self.depts)),
+            'Dept': np.tile(self.depts, len(self.stores)),
+            'Total_Sales': total,
+            'Mean_Sales': total / np.maximum(count, 1),
+            'Std_Sales': std,
+            'Count': count,
+        })
+        return stats[stats['Count'] > 0].reset_index(drop=True)
+
+    def date_totals(self) -> pd.DataFrame:
+        """Total sales per week across all series"""
+        totals = np.asarray(self.sales, dtype=np.float64).sum(axis=(0, 1))
+        return pd.DataFrame({'Date': self.dates, 'Weekly_Sales': totals})
+
+    def store_totals(self) -> pd.DataFrame:
+        """Total sales per store"""
+        totals = np.asarray(self.sales, dtype=np.float64).sum(axis=(1, 2))
+        return pd.DataFrame({'Store': self.stores, 'Weekly_Sales': totals})
+
+    def dept_totals(self) -> pd.DataFrame:
+        """Total and mean sales per department"""
+        totals = np.asarray(self.sales, dtype=np.float64).sum(axis=(0, 2))
+        counts = np.asarray(self.present).sum(axis=(0, 2))
+        return pd.DataFrame({'Dept': self.depts, 'sum': totals, 'mean': totals / np.maximum(counts, 1)})
+
+    def holiday_means(self) -> pd.DataFrame:
+        """Mean sales for holiday and non-holiday weeks"""
+        sales = np.asarray(self.sales, dtype=np.float64)
+        present = np.asarray(self.present)
+        holiday = np.asarray(self.holiday)
+        rows = []
+        for flag in (False, True):
+            mask = present & (holiday == flag)
+            if mask.any():
+                rows.append({'IsHoliday': flag, 'Weekly_Sales': sales[mask].mean()})
+        return pd.DataFrame(rows, columns=['IsHoliday', 'Weekly_Sales'])
+
+
+def _replace_dir(tmp_dir: str, path: str) -> None:
+    shutil.rmtree(path, ignore_errors=True)
+    try:
+        os.replace(tmp_dir, path)
+    except OSError:
+        # Another worker published the same tensor first
+        shutil.rmtree(tmp_dir, ignore_errors=True)
@@ -0,0 +1,242 @@
+import os
+import time
+import heapq
+import asyncio
+import logging
+import itertools
+from collections import defaultdict, deque
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, Deque, Dict, List, Optional
+
+from threadpoolctl import threadpool_limits
+
+logger = logging.getLogger(__name__)
+
+
+def _physical_memory_mb() -> int:
+    try:
+        return int(os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES') / (1024 * 1024))
+    except (ValueError, OSError, AttributeError):
+        return 4096
+
+
+# Cores handed out to running ML work
+SCHEDULER_CPUS = int(os.environ.get("SCHEDULER_CPUS", str(os.cpu_count() or 1)))
+# Memory handed out to running ML work; by default three quarters of RAM
+SCHEDULER_MEMORY_MB = int(os.environ.get("SCHEDULER_MEMORY_MB", str(_physical_memory_mb() * 3 // 4)))
+# Cores batch work leaves free for interactive work; at least one whenever there are two or more.
+# With a single core nothing can be kept free, so predictions wait for a running batch run to finish.
+SCHEDULER_INTERACTIVE_CPUS = int(os.environ.get("SCHEDULER_INTERACTIVE_CPUS", "1"))
+
+# Lower runs first. Interactive work is what a user waits on in the browser.
+PRIORITIES = {
+    'predict': 0,
+    'train': 1,
+    'warm_start': 1,
+    'backtest': 2,
+    'optimize': 2,
+}
+INTERACTIVE_PRIORITY = 0
+# Most cores one run of a kind can use; batch kinds take whatever is free
+MAX_CPUS = {'predict': 2}
+# Estimated peak memory: a fixed part plus MB per million dataset rows
+BASE_MEMORY_MB = 150
+MEMORY_MB_PER_MILLION_ROWS = {
+    'predict': 400,
+    'train': 800,
+    'warm_start': 800,
+    'backtest': 1000,
+    'optimize': 1000,
+    # External-memory training: what XGBoost keeps per row, on top of its batch budget
+    'external': 64,
+}
+# Waits kept per kind for the wait-time statistics
+WAIT_HISTORY = 100
+
+# Cores of the run in this process, set by cpu_allocation
+_cpu_limit: Optional[int] = None
+
+
+def estimate_memory_mb(kind: str, rows: Optional[int]) -> int:
+    """Peak memory a run of ``kind`` over a dataset of ``rows`` rows is budgeted"""
+    return int(BASE_MEMORY_MB + MEMORY_MB_PER_MILLION_ROWS.get(kind, 800) * (rows or 0) / 1_000_000)
+
+
+def cpu_limit() -> int:
+    """Cores this process may use: its run's allocation inside cpu_allocation, otherwise all"""
+    return _cpu_limit or os.cpu_count() or 1
+
+
+@contextmanager
+def cpu_allocation(cpus: Optional[int]):
+    """Hold a run in this process to ``cpus`` cores.
+
+    OpenMP (and so XGBoost's default nthread) and BLAS thread pools are
+    limited for the duration, and cpu_limit() reports the allocation so
+    pools of worker processes size themselves to it.
+    """
+    global _cpu_limit
+    if not cpus:
+        yield
+        return
+    previous = _cpu_limit
+    _cpu_limit = cpus
+    try:
+        with threadpool_limits(limits=cpus):
+            yield
+    finally:
+        _cpu_limit = previous
+
+
+class Allocation:
+    """Cores and memory granted to one admitted run"""
+
+    def __init__(self, run_id: int, kind: str, label: str, cpus: int, memory_mb: int, waited: float):
+        self.run_id = run_id
+        self.kind = kind
+        self.label = label
+        self.cpus = cpus
+        self.memory_mb = memory_mb
+        self.waited = waited
+        self.started = time.monotonic()
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'id': self.run_id,
+            'kind': self.kind,
+            'label': self.label,
+            'cpus': self.cpus,
+            'memory_mb': self.memory_mb,
+            'wait_seconds': round(self.waited, 3),
+            'running_seconds': round(time.monotonic() - self.started, 3),
+        }
+
+
+class _Request:
+    def __init__(self, run_id: int, kind: str, label: str, priority: int, memory_mb: int, max_cpus: int):
+        self.run_id = run_id
+        self.kind = kind
+        self.label = label
+        self.priority = priority
+        self.memory_mb = memory_mb
+        self.max_cpus = max_cpus
+        self.submitted = time.monotonic()
+        self.future: asyncio.Future = asyncio.get_running_loop().create_future()
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'id': self.run_id,
+            'kind': self.kind,
+            'label': self.label,
+            'priority': self.priority,
+            'memory_mb': self.memory_mb,
+            'wait_seconds': round(time.monotonic() - self.submitted, 3),
+        }
+
+
+class Scheduler:
+    """Admission control for ML runs on the event loop.
+
+    Runs ask for a slot with their kind and estimated memory and wait in a
+    priority queue (PRIORITIES, then arrival order). The head of the queue
+    is admitted once a core is free and its memory fits, or when nothing
+    else is running so oversized runs still get to run alone; runs behind
+    it wait even if they would fit, so large batch runs are not starved.
+    An admitted run gets the free cores up to its kind's MAX_CPUS, less
+    SCHEDULER_INTERACTIVE_CPUS (at least one) for batch kinds, and is
+    expected to run inside cpu_allocation with that many. On a single core
+    no core can be reserved, so interactive runs are serialized behind a
+    running batch run and only overtake queued ones.
+    """
+
+    def __init__(self, cpus: Optional[int] = None, memory_mb: Optional[int] = None,
+                 interactive_cpus: Optional[int] = None):
+        self.cpus = cpus or SCHEDULER_CPUS
+        self.memory_mb = memory_mb or SCHEDULER_MEMORY_MB
+        interactive_cpus = SCHEDULER_INTERACTIVE_CPUS if interactive_cpus is None else interactive_cpus
+        self.interactive_cpus = min(max(interactive_cpus, 1), self.cpus - 1)
+        self._queue: List[Any] = []
+        self._running: Dict[int, Allocation] = {}
+        self._ids = itertools.count(1)
+        self._waits: Dict[str, Deque[float]] = defaultdict(lambda: deque(maxlen=WAIT_HISTORY))
+        self._admitted: Dict[str, int] = defaultdict(int)
+
+    @property
+    def used_cpus(self) -> int:
+        return sum(allocation.cpus for allocation in self._running.values())
+
+    @property
+    def used_memory_mb(self) -> int:
+        return sum(allocation.memory_mb for allocation in self._running.values())
+
+    @asynccontextmanager
+    async def slot(self, kind: str, label: str = "", memory_mb: Optional[int] = None):
+        """Wait for admission and yield the Allocation; it is released on exit"""
+        priority = PRIORITIES.get(kind, max(PRIORITIES.values()))
+        request = _Request(next(self._ids), kind, label, priority,
+                           memory_mb if memory_mb is not None else BASE_MEMORY_MB,
+                           min(MAX_CPUS.get(kind, self.cpus), self.cpus))
+        heapq.heappush(self._queue, (request.priority, request.run_id, request))
+        self._dispatch()
+        try:
+            allocation = await request.future
+        except BaseException:
+            if request.future.done() and not request.future.cancelled():
+                # Admitted just as the waiter was cancelled
+                self._release(request.future.result())
+            else:
+                self._queue = [entry for entry in self._queue if entry[2] is not request]
+                heapq.heapify(self._queue)
+                self._dispatch()
+            raise
+        try:
+            yield allocation
+        finally:
+            self._release(allocation)
+
+    def _free_cpus(self, priority: int) -> int:
+        reserved = 0 if priority == INTERACTIVE_PRIORITY else self.interactive_cpus
+        return self.cpus - reserved - self.used_cpus
+
+    def _dispatch(self) -> None:
+        while self._queue:
+            _, _, request = self._queue[0]
+            free_cpus = self._free_cpus(request.priority)
+            fits = free_cpus >= 1 and self.used_memory_mb + request.memory_mb <= self.memory_mb
+            if self._running and not fits:
+                return
+            heapq.heappop(self._queue)
+            waited = time.monotonic() - request.submitted
+            allocation = Allocation(request.run_id, request.kind, request.label,
+                                    max(1, min(request.max_cpus, free_cpus)), request.memory_mb, waited)
+            self._running[allocation.run_id] = allocation
+            self._waits[request.kind].append(waited)
+            self._admitted[request.kind] += 1
+            request.future.set_result(allocation)
+            logger.info(f"Admitted {request.kind} run {request.label} with {allocation.cpus} CPU, "
+                        f"{allocation.memory_mb} MB after {waited:.1f}s")
+
+    def _release(self, allocation: Allocation) -> None:
+        if self._running.pop(allocation.run_id, None) is not None:
+            self._dispatch()
+
+    def stats(self) -> Dict[str, Any]:
+        waits = {
+            kind: {
+                'admitted': self._admitted[kind],
+                'mean_wait_seconds': round(sum(history) / len(history), 3),
+                'max_wait_seconds': round(max(history), 3),
+            }
+            for kind, history in self._waits.items() if history
+        }
+        return {
+            'cpus': self.cpus,
+            'memory_mb': self.memory_mb,
+            'interactive_cpus': self.interactive_cpus,
+            'used_cpus': self.used_cpus,
+            'used_memory_mb': self.used_memory_mb,
+            'queue_depth': len(self._queue),
+            'queued': [entry[2].to_dict() for entry in sorted(self._queue)],
+            'running': [allocation.to_dict() for allocation in self._running.values()],
+            'waits': waits,
+        }
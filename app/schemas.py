@@ -1,6 +1,6 @@
 from pydantic import BaseModel
 from typing import Optional, List, Dict, Any
-from datetime import datetime
+from datetime import datetime, date as date_type
 
 # User schemas
 class UserBase(BaseModel):
@@ -62,16 +62,35 @@ class ModelBase(BaseModel):
 class TrainModelRequest(BaseModel):
     dataset_id: int
     parameters: Optional[Dict[str, Any]] = None
+    feature_spec: Optional[Dict[str, Any]] = None
+    # Continue the booster of this model instead of training from scratch
+    parent_model_id: Optional[int] = None
+    compare_full_retrain: bool = False
+    # Stream feature batches from disk instead of loading the dataset
+    external_memory: bool = False
+    memory_budget_mb: Optional[int] = None
+    # One model per segment ("abc_xyz" or "store") plus a global fallback
+    segment_by: Optional[str] = None
 
 class OptimizeModelRequest(BaseModel):
     dataset_id: int
     n_trials: int = 50
+    feature_spec: Optional[Dict[str, Any]] = None
+    search: Optional[Dict[str, Any]] = None
+
+class BacktestRequest(BaseModel):
+    dataset_id: int
+    model_ids: List[int]
+    n_folds: Optional[int] = None
+    horizon_weeks: Optional[int] = None
 
 class ModelResponse(ModelBase):
     id: int
     dataset_id: int
     parameters: Optional[str] = None
+    feature_spec: Optional[str] = None
     metrics: Optional[Dict[str, Any]] = None
+    parent_model_id: Optional[int] = None
     trained_by: int
     status: str
     created_at: str
@@ -86,8 +105,10 @@ class PredictionRequest(BaseModel):
 class PredictionResponse(BaseModel):
     id: int
     model_id: int
+    run_id: Optional[int] = None
     store_id: str
     dept_id: str
+    date: Optional[date_type] = None
     predicted_sales: float
     actual_sales: Optional[float] = None
     abc_class: Optional[str] = None
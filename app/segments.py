@@ -0,0 +1,139 @@
+import os
+import time
+import shutil
+import tempfile
+from concurrent.futures import wait
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+
+from app.executor import run_pool
+from app.scheduler import cpu_limit
+
+# Segment models fitted at the same time, each in its own process; 1 fits them in-process
+SEGMENT_WORKERS = int(os.environ.get("SEGMENT_WORKERS", str(os.cpu_count() or 1)))
+# Segments with fewer training rows get no model of their own; their series use the global model
+SEGMENT_MIN_ROWS = int(os.environ.get("SEGMENT_MIN_ROWS", "200"))
+
+SEGMENT_BY = ["abc_xyz", "store"]
+# Label of the model fitted on every row, used for series without a segment model
+GLOBAL_SEGMENT = "*"
+
+
+def series_keys(frame: pd.DataFrame) -> pd.Series:
+    """"Store_Dept" key of every row, as used by classify_abc_xyz"""
+    return frame['Store'].astype(int).astype(str) + '_' + frame['Dept'].astype(int).astype(str)
+
+
+def series_segments(frame: pd.DataFrame, by: str,
+                    classification: Optional[Dict[str, Dict[str, Any]]] = None) -> Dict[str, str]:
+    """Segment of every series of a frame: its ABC-XYZ category or its store"""
+    series = frame[['Store', 'Dept']].drop_duplicates()
+    keys = series_keys(series)
+    if by == "store":
+        labels = series['Store'].astype(int).astype(str)
+    elif by == "abc_xyz":
+        labels = keys.map(lambda key: classification.get(key, {}).get('category_name', 'C-Z'))
+    else:
+        raise ValueError(f"Segmentasi tidak dikenal: {by}")
+    return dict(zip(keys, labels))
+
+
+def route_rows(segments: Dict[str, str], models: Dict[str, Any], frame: pd.DataFrame) -> Dict[str, np.ndarray]:
+    """Row positions of a frame per model label.
+
+    Series are looked up in ``segments``; series that are unknown or whose
+    segment has no model go to GLOBAL_SEGMENT.
+    """
+    labels = series_keys(frame).map(segments)
+    labels = labels.where(labels.isin(list(models)), GLOBAL_SEGMENT).to_numpy()
+    codes, uniques = pd.factorize(labels)
+    order = np.argsort(codes, kind='stable')
+    bounds = np.flatnonzero(np.diff(codes[order])) + 1
+    return {label: rows for label, rows in zip(uniques, np.split(order, bounds))}
+
+
+def fit_segment(X_train, y_train, X_test, model_params: Dict[str, Any], columns: List[str],
+                types: Optional[List[str]], n_jobs: Optional[int] = None) -> Dict[str, Any]:
+    """Fit one segment's booster; returns it serialized with its test predictions"""
+    model = xgb.XGBRegressor(**model_params, n_jobs=n_jobs)
+    dtrain = xgb.QuantileDMatrix(X_train, y_train, feature_names=columns, feature_types=types,
+                                 enable_categorical=True, nthread=n_jobs)
+    start = time.perf_counter()
+    booster = xgb.train(model.get_xgb_params(), dtrain, num_boost_round=model.n_estimators)
+    seconds = time.perf_counter() - start
+    dtest = xgb.QuantileDMatrix(X_test, ref=dtrain, feature_names=columns, feature_types=types,
+                                enable_categorical=True, nthread=n_jobs)
+    return {
+        'booster': bytes(booster.save_raw('ubj')),
+        'predictions': booster.predict(dtest),
+        'training_seconds': seconds
+    }
+
+
+def _segment_worker(data_dir: str, train_rows: np.ndarray, test_rows: np.ndarray, model_params: Dict[str, Any],
+                    columns: List[str], types: Optional[List[str]], n_jobs: int) -> Dict[str, Any]:
+    """fit_segment on the rows of arrays saved in data_dir"""
+    arrays = {key: np.load(os.path.join(data_dir, f"{key}.npy"), mmap_mode='r')
+              for key in ('X_train', 'y_train', 'X_test')}
+    return fit_segment(arrays['X_train'][train_rows], arrays['y_train'][train_rows], arrays['X_test'][test_rows],
+                       model_params, columns, types, n_jobs)
+
+
+def fit_segments(X_train: np.ndarray, y_train: np.ndarray, X_test: np.ndarray, train_labels: np.ndarray,
+                 test_labels: np.ndarray, model_params: Dict[str, Any], columns: List[str],
+                 types: Optional[List[str]], workers: Optional[int] = None,
+                 on_segment: Optional[Callable[[int, int], None]] = None) -> Dict[str, Dict[str, Any]]:
+    """Fit GLOBAL_SEGMENT on every row and one model per label with enough training rows.
+
+    Arrays are plain float32 (categoricals as codes, marked 'c' in
+    ``types``). With several workers they are saved once to a temporary
+    directory that every worker process maps, and segments are submitted
+    largest first so the pool stays busy. ``on_segment`` is called with the
+    number of finished and total segments; if it raises, queued segments
+    are cancelled and the error is re-raised once running ones finish.
+    Returns fit_segment's result plus the row positions per label.
+    """
+    on_segment = on_segment or (lambda done, total: None)
+    labels, counts = np.unique(train_labels, return_counts=True)
+    tasks = {GLOBAL_SEGMENT: (np.arange(len(y_train)), np.arange(len(X_test)))}
+    for label, count in sorted(zip(labels, counts), key=lambda item: -item[1]):
+        if count >= SEGMENT_MIN_ROWS:
+            tasks[str(label)] = (np.flatnonzero(train_labels == label), np.flatnonzero(test_labels == label))
+
+    workers = min(workers or SEGMENT_WORKERS, len(tasks), cpu_limit())
+    results: Dict[str, Dict[str, Any]] = {}
+    if workers <= 1:
+        for label, (train_rows, test_rows) in tasks.items():
+            results[label] = fit_segment(X_train[train_rows], y_train[train_rows], X_test[test_rows],
+                                         model_params, columns, types)
+            on_segment(len(results), len(tasks))
+    else:
+        data_dir = tempfile.mkdtemp(prefix="segments-")
+        try:
+            for key, array in (('X_train', X_train), ('y_train', y_train), ('X_test', X_test)):
+                np.save(os.path.join(data_dir, f"{key}.npy"), array)
+            n_jobs = max(1, cpu_limit() // workers)
+            with run_pool(workers) as pool:
+                futures = {pool.submit(_segment_worker, data_dir, train_rows, test_rows, model_params, columns,
+                                       types, n_jobs): label for label, (train_rows, test_rows) in tasks.items()}
+                try:
+                    pending = set(futures)
+                    while pending:
+                        done, pending = wait(pending, timeout=1.0)
+                        for future in done:
+                            results[futures[future]] = future.result()
+                        on_segment(len(results), len(tasks))
+                except BaseException:
+                    for future in futures:
+                        future.cancel()
+                    wait(futures)
+                    raise
+        finally:
+            shutil.rmtree(data_dir, ignore_errors=True)
+
+    for label, (train_rows, test_rows) in tasks.items():
+        results[label].update(train_rows=train_rows, test_rows=test_rows)
+    return results
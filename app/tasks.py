@@ -0,0 +1,202 @@
+"""
+Entry points for work that runs in Executor worker processes.
+
+Each function takes and returns plain picklable values and reaches data
+through per-process singletons, so a worker keeps its dataset cache and
+loaded models between calls. This module must not import app.main.
+"""
+import os
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from app.database import SessionLocal
+from app.models import TrainingJob
+from app.dataset_store import DatasetStore
+from app.dataset_cache import DATASET_CACHE_MAX_MB, DatasetCache
+from app.feature_store import FeatureStore
+from app.ml_service import MLService
+from app.model_registry import MODEL_CACHE_MAX_MB, ModelRegistry
+from app.executor import after_task, publish_worker_stats, worker_count
+from app.visualization import VisualizationService
+from app.scheduler import cpu_allocation
+
+# Seconds between progress writes (and cancellation checks) of a running job
+JOB_PROGRESS_INTERVAL = float(os.environ.get("JOB_PROGRESS_INTERVAL", "1.0"))
+
+_services: Dict[str, Any] = {}
+
+
+class JobCancelled(Exception):
+    """Raised inside a job once cancellation of it has been requested"""
+
+
+class JobReporter:
+    """Progress callback that records a job's progress on its TrainingJob row.
+
+    Writes are throttled to one per JOB_PROGRESS_INTERVAL; each write also
+    reads the row's cancel flag and raises JobCancelled when it is set, so
+    a running job stops at its next progress report.
+    """
+
+    def __init__(self, job_id: int, interval: Optional[float] = None):
+        self.job_id = job_id
+        self.interval = JOB_PROGRESS_INTERVAL if interval is None else interval
+        self._last = 0.0
+
+    def __call__(self, fraction: float, message: str) -> None:
+        now = time.monotonic()
+        if now - self._last < self.interval:
+            return
+        self._last = now
+        db = SessionLocal()
+        try:
+            job = db.query(TrainingJob).filter(TrainingJob.id == self.job_id).first()
+            if job is None:
+                return
+            job.progress = round(min(max(fraction, 0.0), 1.0), 4)
+            job.message = message
+            db.commit()
+            cancelled = job.cancel_requested
+        finally:
+            db.close()
+        if cancelled:
+            raise JobCancelled(f"Job {self.job_id} dibatalkan")
+
+
+def _reporter(job_id: Optional[int]) -> Optional[JobReporter]:
+    return JobReporter(job_id) if job_id is not None else None
+
+
+def services() -> Dict[str, Any]:
+    """Dataset, feature and model services of the current process.
+
+    Every CPU worker has its own dataset cache and model registry, so each
+    gets an equal share of DATASET_CACHE_MAX_MB and MODEL_CACHE_MAX_MB.
+    """
+    if not _services:
+        store = DatasetStore()
+        workers = worker_count()
+        _services['dataset_store'] = store
+        _services['dataset_cache'] = DatasetCache(store, max_mb=DATASET_CACHE_MAX_MB // workers)
+        _services['feature_store'] = FeatureStore(store)
+        _services['ml_service'] = MLService(_services['feature_store'],
+                                            registry=ModelRegistry(max_mb=MODEL_CACHE_MAX_MB // workers))
+        _services['viz_service'] = VisualizationService()
+    return _services
+
+
+def _publish_stats() -> None:
+    if _services:
+        publish_worker_stats({
+            'dataset_cache': _services['dataset_cache'].stats(),
+            'model_registry': _services['ml_service'].registry.stats(),
+            'feature_store': _services['feature_store'].stats(),
+        })
+
+
+after_task(_publish_stats)
+
+
+def run_allocated(cpus: Optional[int], fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+    """Run another task of this module held to the cores the scheduler allocated to it"""
+    with cpu_allocation(cpus):
+        return fn(*args, **kwargs)
+
+
+def train_model(dataset_id: int, parameters: Dict[str, Any], feature_spec: Dict[str, Any],
+                model_id: int, job_id: Optional[int] = None) -> Dict[str, Any]:
+    s = services()
+    df = s['dataset_cache'].get(dataset_id)
+    result = s['ml_service'].train_model(df, parameters, dataset_id=dataset_id, feature_spec=feature_spec,
+                                         model_id=model_id, progress=_reporter(job_id))
+    result['feature_importance'] = {k: float(v) for k, v in result['feature_importance'].items()}
+    return result
+
+
+def train_segmented(dataset_id: int, parameters: Dict[str, Any], segment_by: str, feature_spec: Dict[str, Any],
+                    model_id: int, job_id: Optional[int] = None) -> Dict[str, Any]:
+    s = services()
+    df = s['dataset_cache'].get(dataset_id)
+    result = s['ml_service'].train_segmented(df, parameters, segment_by, dataset_id=dataset_id,
+                                             feature_spec=feature_spec, model_id=model_id,
+                                             tensor=s['dataset_store'].load_tensor(dataset_id),
+                                             progress=_reporter(job_id))
+    result['feature_importance'] = {k: float(v) for k, v in result['feature_importance'].items()}
+    return result
+
+
+def train_model_external(dataset_id: int, parameters: Dict[str, Any], feature_spec: Dict[str, Any],
+                         model_id: int, memory_mb: Optional[int] = None, job_id: Optional[int] = None) -> Dict[str, Any]:
+    s = services()
+    result = s['ml_service'].train_model_external(s['dataset_store'], dataset_id, parameters, feature_spec=feature_spec,
+                                                  model_id=model_id, memory_mb=memory_mb, progress=_reporter(job_id))
+    result['feature_importance'] = {k: float(v) for k, v in result['feature_importance'].items()}
+    return result
+
+
+def warm_start_model(dataset_id: int, parent_model_id: int, parameters: Dict[str, Any], model_id: int,
+                     compare_full_retrain: bool = False, job_id: Optional[int] = None) -> Dict[str, Any]:
+    s = services()
+    df = s['dataset_cache'].get(dataset_id)
+    result = s['ml_service'].warm_start_model(df, parent_model_id, parameters, dataset_id=dataset_id,
+                                              model_id=model_id, compare_full_retrain=compare_full_retrain,
+                                              progress=_reporter(job_id))
+    result['feature_importance'] = {k: float(v) for k, v in result['feature_importance'].items()}
+    return result
+
+
+def optimize_model(dataset_id: int, n_trials: int, feature_spec: Dict[str, Any], model_id: int,
+                   job_id: Optional[int] = None, search: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    s = services()
+    df = s['dataset_cache'].get(dataset_id)
+    return s['ml_service'].optimize_model(df, n_trials, dataset_id=dataset_id, feature_spec=feature_spec,
+                                          model_id=model_id, progress=_reporter(job_id), search=search)
+
+
+def backtest_models(dataset_id: int, model_ids: List[int], n_folds: Optional[int] = None,
+                    horizon_weeks: Optional[int] = None) -> Dict[str, Any]:
+    s = services()
+    df = s['dataset_cache'].get(dataset_id)
+    return s['ml_service'].backtest_models(df, model_ids, dataset_id=dataset_id, n_folds=n_folds,
+                                           horizon_weeks=horizon_weeks,
+                                           tensor=s['dataset_store'].load_tensor(dataset_id))
+
+
+def generate_predictions(dataset_id: int, model_id: int, feature_spec: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    s = services()
+    df = s['dataset_cache'].get(dataset_id)
+    return s['ml_service'].generate_predictions_by_category(
+        df, model_id, tensor=s['dataset_store'].load_tensor(dataset_id),
+        dataset_id=dataset_id, feature_spec=feature_spec
+    )
+
+
+def sales_trend_chart(dataset_id: int) -> Dict[str, Any]:
+    s = services()
+    tensor = s['dataset_store'].load_tensor(dataset_id)
+    if tensor is not None:
+        return s['viz_service'].create_sales_trend_chart(tensor=tensor)
+    return s['viz_service'].create_sales_trend_chart(s['dataset_cache'].get(dataset_id, columns=['Date', 'Weekly_Sales']))
+
+
+def abc_xyz_heatmap(dataset_id: int) -> Dict[str, Any]:
+    s = services()
+    tensor = s['dataset_store'].load_tensor(dataset_id)
+    if tensor is not None:
+        return s['viz_service'].create_abc_xyz_heatmap(tensor=tensor)
+    return s['viz_service'].create_abc_xyz_heatmap(s['dataset_cache'].get(dataset_id, columns=['Store', 'Dept', 'Weekly_Sales']))
+
+
+def combined_stats(snapshots: List[Dict[str, Any]], name: str,
+                   shared: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Totals of one per-worker cache's stats (Executor.worker_stats), with each worker's own.
+
+    ``shared`` holds figures every worker sees alike, such as the entries
+    of an on-disk store; they are reported once instead of summed.
+    """
+    shared = shared or {}
+    workers = [dict(snapshot[name], pid=snapshot['pid']) for snapshot in snapshots if name in snapshot]
+    totals = {key: sum(worker[key] for worker in workers)
+              for key in ('hits', 'misses', 'evictions', 'entries', 'bytes', 'max_bytes') if key not in shared}
+    requests = totals['hits'] + totals['misses']
+    return dict(totals, **shared, hit_rate=totals['hits'] / requests if requests else 0.0, workers=workers)
@@ -0,0 +1,208 @@
+"""
+NumPy evaluator for boosted tree ensembles.
+
+A booster's trees are flattened into one set of contiguous node arrays and
+a batch is evaluated level by level: every (row, tree) pair keeps the index
+of its current node, and each step gathers the split feature, threshold
+and children of all of them at once. The compiled ensemble only holds
+NumPy arrays, so it pickles to worker processes that never import xgboost.
+"""
+import os
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+# Engine for batch predictions: "xgboost" (booster.predict) or "numpy" (TreeEnsemble)
+PREDICT_ENGINE = os.environ.get("PREDICT_ENGINE", "xgboost")
+# (row, tree) pairs evaluated at once; bounds the temporaries to a few hundred MB
+TREE_ENGINE_CHUNK = int(os.environ.get("TREE_ENGINE_CHUNK", str(1 << 22)))
+
+# Objectives whose prediction is the raw margin
+IDENTITY_OBJECTIVES = ['reg:squarederror', 'reg:absoluteerror', 'reg:pseudohubererror', 'reg:quantileerror']
+
+
+def _depth(left: List[int], right: List[int]) -> int:
+    depth, level = 0, [0]
+    while True:
+        level = [child for node in level for child in (left[node], right[node]) if child != -1]
+        if not level:
+            return depth
+        depth += 1
+
+
+class TreeEnsemble:
+    """Flattened trees of a gbtree booster with an identity-link objective.
+
+    Node arrays are indexed by global node id; tree t starts at
+    ``roots[t]``. Leaves point to themselves, so a row that reaches a
+    leaf before ``max_depth`` steps stays there. Categorical nodes index a
+    row of ``categories``, which marks the codes sent right.
+    """
+
+    def __init__(self, feature_names: Optional[List[str]], roots: np.ndarray, feature: np.ndarray,
+                 threshold: np.ndarray, left: np.ndarray, right: np.ndarray, default_left: np.ndarray,
+                 value: np.ndarray, category_row: np.ndarray, categories: np.ndarray, base_score: float,
+                 max_depth: int):
+        self.feature_names = feature_names
+        self.roots = roots
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        # Right and left child of node i at 2i and 2i + 1
+        self.children = np.column_stack([right, left]).ravel()
+        self.default_left = default_left
+        self.value = value
+        self.category_row = category_row
+        self.categories = categories
+        self.base_score = np.float32(base_score)
+        self.max_depth = max_depth
+
+    @property
+    def n_trees(self) -> int:
+        return len(self.roots)
+
+    @classmethod
+    def from_booster(cls, booster: Any, iteration_range: Optional[Tuple[int, int]] = None) -> 'TreeEnsemble':
+        """Compile an xgboost Booster.
+
+        Like XGBRegressor.predict, an early-stopped booster is compiled up
+        to its best iteration unless ``iteration_range`` is given. Raises
+        ValueError for boosters it cannot evaluate (dart, gblinear, or
+        objectives with a link function).
+        """
+        model = json.loads(bytes(booster.save_raw('json')))
+        learner = model['learner']
+        gbm = learner['gradient_booster']
+        if gbm['name'] != 'gbtree':
+            raise ValueError(f"Booster {gbm['name']} tidak didukung mesin prediksi NumPy")
+        objective = learner['objective']['name']
+        if objective not in IDENTITY_OBJECTIVES:
+            raise ValueError(f"Objective {objective} tidak didukung mesin prediksi NumPy")
+        if int(learner['learner_model_param'].get('num_target', '1')) > 1:
+            raise ValueError("Model multi-target tidak didukung mesin prediksi NumPy")
+
+        if iteration_range is None:
+            best_iteration = booster.attr('best_iteration')
+            iteration_range = (0, int(best_iteration) + 1) if best_iteration is not None else (0, 0)
+        indptr = gbm['model']['iteration_indptr']
+        begin, end = iteration_range
+        end = end if end > 0 else len(indptr) - 1
+        trees = gbm['model']['trees'][indptr[begin]:indptr[end]]
+
+        roots, feature, threshold, left, right, default_left, value, category_row = [], [], [], [], [], [], [], []
+        category_sets = []
+        max_depth = 0
+        offset = 0
+        for tree in trees:
+            n = len(tree['left_children'])
+            node_left = np.asarray(tree['left_children'], dtype=np.int32)
+            is_leaf = node_left == -1
+            own = np.arange(offset, offset + n, dtype=np.int32)
+            roots.append(offset)
+            feature.append(np.where(is_leaf, 0, tree['split_indices']).astype(np.int32))
+            threshold.append(np.where(is_leaf, 0, tree['split_conditions']).astype(np.float32))
+            left.append(np.where(is_leaf, own, node_left + offset).astype(np.int32))
+            right.append(np.where(is_leaf, own, np.asarray(tree['right_children'], dtype=np.int32) + offset))
+            default_left.append(np.asarray(tree['default_left'], dtype=bool))
+            # A leaf's value is stored in its split condition
+            value.append(np.where(is_leaf, tree['split_conditions'], 0).astype(np.float32))
+
+            rows = np.full(n, -1, dtype=np.int32)
+            for node, start, size in zip(tree['categories_nodes'], tree['categories_segments'],
+                                         tree['categories_sizes']):
+                rows[node] = len(category_sets)
+                category_sets.append(tree['categories'][start:start + size])
+            category_row.append(rows)
+            max_depth = max(max_depth, _depth(tree['left_children'], tree['right_children']))
+            offset += n
+
+        width = max((max(codes) + 1 for codes in category_sets if codes), default=1)
+        categories = np.zeros((max(1, len(category_sets)), width), dtype=bool)
+        for row, codes in enumerate(category_sets):
+            categories[row, codes] = True
+
+        def concat(parts, dtype):
+            return np.concatenate(parts).astype(dtype) if parts else np.zeros(0, dtype=dtype)
+
+        return cls(
+            booster.feature_names,
+            np.asarray(roots, dtype=np.int32),
+            concat(feature, np.int32),
+            concat(threshold, np.float32),
+            concat(left, np.int32),
+            concat(right, np.int32),
+            concat(default_left, bool),
+            concat(value, np.float32),
+            concat(category_row, np.int32),
+            categories,
+            float(learner['learner_model_param']['base_score']),
+            max_depth
+        )
+
+    def features(self, X) -> np.ndarray:
+        """Float32 matrix of a batch in the booster's feature order.
+
+        Frames are matched by column name and categoricals replaced by
+        their codes, with missing categories as NaN like XGBoost's own
+        DataFrame input.
+        """
+        if isinstance(X, pd.DataFrame):
+            if self.feature_names is not None:
+                X = X[self.feature_names]
+            columns = {}
+            for column in X.columns:
+                values = X[column]
+                if isinstance(values.dtype, pd.CategoricalDtype):
+                    codes = values.cat.codes.to_numpy(dtype=np.float32)
+                    codes[codes < 0] = np.nan
+                    columns[column] = codes
+                else:
+                    columns[column] = values.to_numpy(dtype=np.float32, na_value=np.nan)
+            return np.column_stack(list(columns.values())) if columns else np.zeros((len(X), 0), np.float32)
+        return np.ascontiguousarray(X, dtype=np.float32)
+
+    def predict(self, X) -> np.ndarray:
+        """Predictions for a batch (frame or array), as float32"""
+        X = self.features(X)
+        out = np.full(len(X), self.base_score, dtype=np.float32)
+        if not self.n_trees or not len(X):
+            return out
+        step = max(1, TREE_ENGINE_CHUNK // self.n_trees)
+        for start in range(0, len(X), step):
+            out[start:start + step] += self._margin(X[start:start + step])
+        return out
+
+    def _margin(self, X: np.ndarray) -> np.ndarray:
+        node = np.broadcast_to(self.roots, (len(X), self.n_trees)).copy()
+        # Flat offset of every row's first feature, so one np.take gathers the split values
+        row_start = (np.arange(len(X), dtype=np.int64) * X.shape[1])[:, None]
+        X = X.ravel()
+        has_missing = bool(np.isnan(X).any())
+        has_categories = bool((self.category_row >= 0).any())
+        width = self.categories.shape[1]
+        for _ in range(self.max_depth):
+            x = np.take(X, row_start + np.take(self.feature, node))
+            go_left = x < np.take(self.threshold, node)
+            if has_categories:
+                row = np.take(self.category_row, node)
+                categorical = row >= 0
+                if categorical.any():
+                    # Codes in the node's set go right; invalid codes go left
+                    codes = np.where(np.isnan(x) | (x < 0) | (x >= width), -1, x).astype(np.int32)
+                    in_set = (codes >= 0) & self.categories[np.maximum(row, 0), np.maximum(codes, 0)]
+                    go_left = np.where(categorical, ~in_set, go_left)
+            if has_missing:
+                go_left = np.where(np.isnan(x), np.take(self.default_left, node), go_left)
+            node = np.take(self.children, 2 * node + go_left)
+        return np.take(self.value, node).sum(axis=1, dtype=np.float32)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'trees': self.n_trees,
+            'nodes': len(self.feature),
+            'max_depth': self.max_depth,
+            'categorical_nodes': int((self.category_row >= 0).sum())
+        }
@@ -0,0 +1,434 @@
+import os
+import json
+import math
+import shutil
+import warnings
+import tempfile
+import threading
+from concurrent.futures import wait
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import optuna
+import pandas as pd
+import xgboost as xgb
+
+from app.database import SQLALCHEMY_DATABASE_URL
+from app.executor import run_pool
+from app.scheduler import cpu_limit
+
+# Where Optuna studies live; by default the application database. Workers get the server's value (see
+# executor.worker_environ), so trial_history reads the studies the workers write.
+OPTUNA_STORAGE_URL = os.environ.get("OPTUNA_STORAGE_URL", SQLALCHEMY_DATABASE_URL)
+# Trials run at the same time, each in its own process
+OPTUNA_PARALLEL_TRIALS = int(os.environ.get("OPTUNA_PARALLEL_TRIALS", "1"))
+# Trials whose process stopped sending heartbeats for this long are marked failed
+OPTUNA_HEARTBEAT_SECONDS = int(os.environ.get("OPTUNA_HEARTBEAT_SECONDS", "60"))
+# Boosting rounds a trial may use; early stopping usually ends it sooner
+OPTUNA_MAX_ROUNDS = int(os.environ.get("OPTUNA_MAX_ROUNDS", "300"))
+# Rounds without validation improvement before a trial stops
+OPTUNA_EARLY_STOPPING_ROUNDS = int(os.environ.get("OPTUNA_EARLY_STOPPING_ROUNDS", "30"))
+# hyperband, median or none
+OPTUNA_PRUNER = os.environ.get("OPTUNA_PRUNER", "hyperband")
+# Rounds between validation scores reported to the pruner
+OPTUNA_REPORT_EVERY = int(os.environ.get("OPTUNA_REPORT_EVERY", "10"))
+# standard or successive_halving
+OPTUNA_SEARCH_MODE = os.environ.get("OPTUNA_SEARCH_MODE", "standard")
+# Share of the training rows seen at each successive-halving rung
+OPTUNA_SH_FRACTIONS = [float(f) for f in os.environ.get("OPTUNA_SH_FRACTIONS", "0.1,0.3,1.0").split(",")]
+# Each rung keeps the best 1/eta of the configurations of the rung before
+OPTUNA_SH_ETA = int(os.environ.get("OPTUNA_SH_ETA", "3"))
+
+SEARCH_MODES = ["standard", "successive_halving"]
+# Series are stratified by total sales into this many groups before sampling
+SAMPLE_STRATA = 4
+
+STOP_ATTR = "stop_requested"
+FINISHED_STATES = (optuna.trial.TrialState.COMPLETE, optuna.trial.TrialState.PRUNED)
+
+optuna.logging.set_verbosity(optuna.logging.WARNING)
+# Heartbeats are marked experimental but stable enough for stale-trial cleanup
+warnings.filterwarnings('ignore', category=optuna.exceptions.ExperimentalWarning)
+
+_storages: Dict[str, optuna.storages.RDBStorage] = {}
+_storage_lock = threading.Lock()
+
+
+def get_storage(url: Optional[str] = None) -> optuna.storages.RDBStorage:
+    """RDB storage shared by every study of this process"""
+    url = url or OPTUNA_STORAGE_URL
+    with _storage_lock:
+        if url not in _storages:
+            engine_kwargs = {"connect_args": {"timeout": 30}} if url.startswith("sqlite") else {}
+            _storages[url] = optuna.storages.RDBStorage(
+                url,
+                engine_kwargs=engine_kwargs,
+                heartbeat_interval=OPTUNA_HEARTBEAT_SECONDS,
+                grace_period=2 * OPTUNA_HEARTBEAT_SECONDS,
+            )
+        return _storages[url]
+
+
+def study_name(model_id: int) -> str:
+    return f"model_{model_id}"
+
+
+def make_pruner(kind: Optional[str] = None) -> optuna.pruners.BasePruner:
+    """Pruner named by OPTUNA_PRUNER.
+
+    Pruners are not stored with a study, so every process that runs trials
+    of a study builds its own from the same settings.
+    """
+    kind = (kind or OPTUNA_PRUNER).lower()
+    if kind == "median":
+        return optuna.pruners.MedianPruner(n_startup_trials=5, n_warmup_steps=3 * OPTUNA_REPORT_EVERY,
+                                           interval_steps=OPTUNA_REPORT_EVERY)
+    if kind == "none":
+        return optuna.pruners.NopPruner()
+    return optuna.pruners.HyperbandPruner(min_resource=OPTUNA_REPORT_EVERY, max_resource=OPTUNA_MAX_ROUNDS,
+                                          reduction_factor=3)
+
+
+def suggest_params(trial: optuna.Trial) -> Dict[str, Any]:
+    """XGBoost search space of optimize_model; the number of rounds comes from early stopping"""
+    return {
+        'max_depth': trial.suggest_int('max_depth', 3, 10),
+        'learning_rate': trial.suggest_float('learning_rate', 0.01, 0.3),
+        'subsample': trial.suggest_float('subsample', 0.6, 1.0),
+        'colsample_bytree': trial.suggest_float('colsample_bytree', 0.6, 1.0),
+        'reg_alpha': trial.suggest_float('reg_alpha', 0, 10),
+        'reg_lambda': trial.suggest_float('reg_lambda', 0, 10),
+        'random_state': 42
+    }
+
+
+class PruningCallback(xgb.callback.TrainingCallback):
+    """Reports the validation RMSE to a trial every few rounds and stops the trial once it is pruned"""
+
+    def __init__(self, trial: optuna.Trial, every: int):
+        self.trial = trial
+        self.every = every
+
+    def after_iteration(self, model, epoch: int, evals_log) -> bool:
+        step = epoch + 1
+        if step % self.every == 0:
+            self.trial.report(evals_log['validation_0']['rmse'][-1], step)
+            if self.trial.should_prune():
+                raise optuna.TrialPruned(f"Dipangkas pada iterasi {step}")
+        return False
+
+
+class TrialObjective:
+    """Trains one booster per trial with early stopping and returns its best validation RMSE.
+
+    The quantized training and validation matrices are built on the first
+    trial and shared by the rest. The round with the best score is kept in
+    the trial's ``best_iteration`` user attribute. ``feature_types`` marks
+    categorical columns ('c') of plain arrays; DataFrames carry their own.
+    """
+
+    def __init__(self, X_train, y_train, X_valid, y_valid, n_jobs: Optional[int] = None,
+                 feature_types: Optional[List[str]] = None):
+        self.X_train = X_train
+        self.y_train = y_train
+        self.X_valid = X_valid
+        self.y_valid = y_valid
+        self.n_jobs = n_jobs
+        self.feature_types = feature_types
+        self._matrices = None
+
+    def matrices(self) -> Tuple[xgb.DMatrix, xgb.DMatrix]:
+        if self._matrices is None:
+            dtrain = xgb.QuantileDMatrix(self.X_train, self.y_train, feature_types=self.feature_types,
+                                         enable_categorical=True, nthread=self.n_jobs)
+            dvalid = xgb.QuantileDMatrix(self.X_valid, self.y_valid, ref=dtrain, feature_types=self.feature_types,
+                                         enable_categorical=True, nthread=self.n_jobs)
+            self._matrices = (dtrain, dvalid)
+        return self._matrices
+
+    def __call__(self, trial: optuna.Trial) -> float:
+        dtrain, dvalid = self.matrices()
+        params = xgb.XGBRegressor(**suggest_params(trial), eval_metric='rmse', n_jobs=self.n_jobs).get_xgb_params()
+        booster = xgb.train(params, dtrain, num_boost_round=OPTUNA_MAX_ROUNDS, evals=[(dvalid, 'validation_0')],
+                            early_stopping_rounds=OPTUNA_EARLY_STOPPING_ROUNDS,
+                            callbacks=[PruningCallback(trial, OPTUNA_REPORT_EVERY)], verbose_eval=False)
+        trial.set_user_attr('best_iteration', int(booster.best_iteration))
+        return float(booster.best_score)
+
+
+def feature_types(X: pd.DataFrame) -> Optional[List[str]]:
+    """XGBoost feature types of a frame's columns, or None when none is categorical"""
+    types = ['c' if isinstance(dtype, pd.CategoricalDtype) else 'q' for dtype in X.dtypes]
+    return types if 'c' in types else None
+
+
+def as_float32(X) -> np.ndarray:
+    """Plain float32 copy of a feature frame, categoricals as their codes"""
+    if isinstance(X, pd.DataFrame):
+        X = pd.DataFrame({column: X[column].cat.codes if isinstance(X[column].dtype, pd.CategoricalDtype)
+                          else X[column] for column in X.columns})
+    return np.asarray(X, dtype=np.float32)
+
+
+def final_trial(study: optuna.Study) -> optuna.trial.FrozenTrial:
+    """Best completed trial of the highest rung; every trial is rung 0 outside successive halving"""
+    complete = study.get_trials(deepcopy=False, states=(optuna.trial.TrialState.COMPLETE,))
+    if not complete:
+        raise ValueError("Tidak ada trial yang selesai")
+    top = max(trial.user_attrs.get('rung', 0) for trial in complete)
+    return min((trial for trial in complete if trial.user_attrs.get('rung', 0) == top), key=lambda trial: trial.value)
+
+
+def tuned_params(study: optuna.Study) -> Dict[str, Any]:
+    """Parameters of the final trial, with n_estimators set to its early-stopped round count"""
+    trial = final_trial(study)
+    params = dict(trial.params)
+    best_iteration = trial.user_attrs.get('best_iteration')
+    if best_iteration is not None:
+        params['n_estimators'] = best_iteration + 1
+    return params
+
+
+def normalize_search_spec(spec: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Fill in defaults and validate a search spec.
+
+    Raises ValueError for an unknown mode, fractions outside (0, 1] or not
+    increasing, or eta below 2. A full-data rung is added if missing.
+    ``backtest_folds`` above 0 scores trials on rolling-origin folds (see
+    app.backtest) instead of a random validation split.
+    """
+    normalized = {'mode': OPTUNA_SEARCH_MODE, 'fractions': list(OPTUNA_SH_FRACTIONS), 'eta': OPTUNA_SH_ETA,
+                  'backtest_folds': 0, 'backtest_horizon_weeks': None}
+    for key, value in (spec or {}).items():
+        if key not in normalized:
+            raise ValueError(f"Spesifikasi pencarian tidak dikenal: {key}")
+        normalized[key] = value
+
+    if normalized['mode'] not in SEARCH_MODES:
+        raise ValueError(f"Mode pencarian tidak dikenal: {normalized['mode']}")
+    fractions = [float(f) for f in normalized['fractions']]
+    if not fractions or any(not 0 < f <= 1 for f in fractions):
+        raise ValueError("Nilai fractions harus di antara 0 dan 1")
+    if any(b <= a for a, b in zip(fractions, fractions[1:])):
+        raise ValueError("Nilai fractions harus naik")
+    if fractions[-1] < 1:
+        fractions.append(1.0)
+    if not isinstance(normalized['eta'], int) or isinstance(normalized['eta'], bool) or normalized['eta'] < 2:
+        raise ValueError("Nilai eta harus bilangan bulat >= 2")
+    normalized['fractions'] = fractions
+    for key in ('backtest_folds', 'backtest_horizon_weeks'):
+        value = normalized[key]
+        if value is not None and (not isinstance(value, int) or isinstance(value, bool) or value < 0):
+            raise ValueError(f"Nilai {key} harus bilangan bulat >= 0")
+    if normalized['backtest_folds'] and normalized['mode'] == 'successive_halving':
+        raise ValueError("Backtest tidak dapat digabung dengan successive halving")
+    return normalized
+
+
+def rung_sizes(n_trials: int, fractions: List[float], eta: int) -> List[int]:
+    """Configurations evaluated at each successive-halving rung"""
+    sizes = [n_trials]
+    for _ in fractions[1:]:
+        sizes.append(max(1, math.ceil(sizes[-1] / eta)))
+    return sizes
+
+
+def sample_rows(series_ids: np.ndarray, dates: np.ndarray, sales: np.ndarray, fraction: float,
+                seed: int = 42) -> np.ndarray:
+    """Boolean mask of about ``fraction`` of the rows: a stratified sample of series over recent weeks.
+
+    The fraction is split evenly between series and weeks (its square root
+    each). Series are stratified by total sales so every volume class stays
+    represented, and only the most recent weeks of the sampled series are
+    kept.
+    """
+    n = len(series_ids)
+    if fraction >= 1 or n == 0:
+        return np.ones(n, dtype=bool)
+    share = math.sqrt(fraction)
+
+    codes, _ = pd.factorize(series_ids)
+    totals = np.bincount(codes, weights=sales)
+    strata = pd.qcut(pd.Series(totals).rank(method='first'), q=min(SAMPLE_STRATA, len(totals)),
+                     labels=False).to_numpy()
+    rng = np.random.default_rng(seed)
+    chosen = []
+    for stratum in np.unique(strata):
+        members = np.flatnonzero(strata == stratum)
+        chosen.append(rng.choice(members, max(1, round(share * len(members))), replace=False))
+    series_mask = np.isin(codes, np.concatenate(chosen))
+
+    weeks = np.unique(dates)
+    cutoff = weeks[len(weeks) - max(1, math.ceil(share * len(weeks)))]
+    return series_mask & (dates >= cutoff)
+
+
+def threads_per_trial(parallel_trials: int, cpus: Optional[int] = None) -> int:
+    """XGBoost threads per trial so concurrent trials share the cores without oversubscribing"""
+    return max(1, (cpus or cpu_limit()) // max(1, parallel_trials))
+
+
+def finished_trials(study: optuna.Study) -> int:
+    return len(study.get_trials(deepcopy=False, states=FINISHED_STATES))
+
+
+def _stop_when_requested(study: optuna.Study, trial: optuna.trial.FrozenTrial) -> None:
+    if study.user_attrs.get(STOP_ATTR):
+        study.stop()
+
+
+def _trial_worker(storage_url: str, name: str, data_dir: str, n_trials: int, n_jobs: int,
+                  types: Optional[List[str]] = None) -> int:
+    """Run n_trials of a stored study on arrays saved in data_dir"""
+    arrays = {key: np.load(os.path.join(data_dir, f"{key}.npy"), mmap_mode='r')
+              for key in ('X_train', 'y_train', 'X_valid', 'y_valid')}
+    study = optuna.load_study(study_name=name, storage=get_storage(storage_url), pruner=make_pruner())
+    if study.user_attrs.get(STOP_ATTR):
+        return 0
+    study.optimize(TrialObjective(n_jobs=n_jobs, feature_types=types, **arrays), n_trials=n_trials,
+                   callbacks=[_stop_when_requested])
+    return n_trials
+
+
+def run_study(X_train, y_train, X_valid, y_valid, n_trials: int, name: Optional[str] = None,
+              parallel_trials: Optional[int] = None,
+              on_trial: Optional[Callable[[int], None]] = None,
+              objective: Optional[Callable[[optuna.Trial], float]] = None) -> optuna.Study:
+    """Run (or resume) an Optuna study until it has n_trials finished trials.
+
+    With a name the study is kept in OPTUNA_STORAGE_URL, so a study that was
+    interrupted continues with the trials it still lacks. Trials stop early
+    on the validation rows and losing ones are pruned. Parallel trials
+    need stored studies: each worker process loads the study and saved
+    training arrays and runs its share of the trials, with the cores split
+    between the workers. ``on_trial`` is called with the number of finished
+    trials; if it raises, the workers are asked to stop and the error is
+    re-raised once they have. A custom ``objective`` (e.g. a
+    BacktestObjective, which parallelizes within a trial) replaces the
+    training arrays and runs its trials one at a time.
+    """
+    on_trial = on_trial or (lambda done: None)
+    if name is None:
+        study = optuna.create_study(direction='minimize', pruner=make_pruner())
+    else:
+        study = optuna.create_study(direction='minimize', study_name=name, pruner=make_pruner(),
+                                    storage=get_storage(), load_if_exists=True)
+        study.set_user_attr(STOP_ATTR, False)
+    remaining = n_trials - finished_trials(study)
+    if remaining <= 0:
+        return study
+
+    workers = min(parallel_trials or OPTUNA_PARALLEL_TRIALS, remaining, cpu_limit())
+    if name is None or workers <= 1 or objective is not None:
+        objective = objective or TrialObjective(X_train, y_train, X_valid, y_valid)
+        study.optimize(objective, n_trials=remaining,
+                       callbacks=[lambda study, trial: on_trial(finished_trials(study))])
+        return study
+
+    data_dir = tempfile.mkdtemp(prefix="optuna-")
+    try:
+        for key, array in (('X_train', X_train), ('y_train', y_train), ('X_valid', X_valid), ('y_valid', y_valid)):
+            np.save(os.path.join(data_dir, f"{key}.npy"), as_float32(array))
+        n_jobs = threads_per_trial(workers)
+        shares = [remaining // workers + (1 if i < remaining % workers else 0) for i in range(workers)]
+        types = feature_types(X_train)
+        with run_pool(workers) as pool:
+            futures = [pool.submit(_trial_worker, OPTUNA_STORAGE_URL, name, data_dir, share, n_jobs, types)
+                       for share in shares]
+            try:
+                pending = futures
+                while pending:
+                    _, pending = wait(pending, timeout=1.0)
+                    on_trial(finished_trials(study))
+            except BaseException:
+                study.set_user_attr(STOP_ATTR, True)
+                wait(futures)
+                raise
+        for future in futures:
+            future.result()
+        return study
+    finally:
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+
+def _params_key(params: Dict[str, Any]) -> str:
+    return json.dumps(params, sort_keys=True)
+
+
+def run_successive_halving(X_train, y_train, X_valid, y_valid, series_ids: np.ndarray, dates: np.ndarray,
+                           n_trials: int, fractions: List[float], eta: int, name: Optional[str] = None,
+                           on_trial: Optional[Callable[[int], None]] = None,
+                           sampler: Optional[optuna.samplers.BaseSampler] = None) -> optuna.Study:
+    """Successive halving over the share of rows each trial sees.
+
+    ``series_ids`` and ``dates`` describe the rows of X_train followed by
+    those of X_valid. Rung 0 samples n_trials configurations and trains and
+    scores them on ``sample_rows(fractions[0])``; each following rung
+    re-runs the best 1/eta of the previous rung on a larger sample, and the
+    last rung on all rows. Every trial records its ``rung`` and
+    ``data_fraction``. Rungs run one trial at a time, and a stored study
+    resumes from its recorded rungs.
+    """
+    on_trial = on_trial or (lambda done: None)
+    if name is None:
+        study = optuna.create_study(direction='minimize', sampler=sampler, pruner=optuna.pruners.NopPruner())
+    else:
+        study = optuna.create_study(direction='minimize', study_name=name, sampler=sampler,
+                                    pruner=optuna.pruners.NopPruner(), storage=get_storage(), load_if_exists=True)
+    sizes = rung_sizes(n_trials, fractions, eta)
+    n_train = len(X_train)
+    sales = np.concatenate([np.asarray(y_train, dtype=np.float64), np.asarray(y_valid, dtype=np.float64)])
+
+    for rung, (fraction, size) in enumerate(zip(fractions, sizes)):
+        complete = study.get_trials(deepcopy=False, states=(optuna.trial.TrialState.COMPLETE,))
+        done = [trial for trial in complete if trial.user_attrs.get('rung', 0) == rung]
+        if rung == 0:
+            todo = [None] * max(0, size - len(done))
+        else:
+            previous = sorted((trial for trial in complete if trial.user_attrs.get('rung', 0) == rung - 1),
+                              key=lambda trial: trial.value)[:size]
+            seen = {_params_key(trial.params) for trial in done}
+            todo = [trial.params for trial in previous if _params_key(trial.params) not in seen]
+        if not todo:
+            continue
+
+        # Every configuration of a rung sees the same sample
+        mask = sample_rows(series_ids, dates, sales, fraction)
+        train_mask, valid_mask = mask[:n_train], mask[n_train:]
+        objective = TrialObjective(X_train[train_mask], y_train[train_mask], X_valid[valid_mask], y_valid[valid_mask])
+        for params in todo:
+            if params is not None:
+                study.enqueue_trial(params)
+            trial = study.ask()
+            trial.set_user_attr('rung', rung)
+            trial.set_user_attr('data_fraction', fraction)
+            try:
+                value = objective(trial)
+            except Exception:
+                study.tell(trial, state=optuna.trial.TrialState.FAIL)
+                raise
+            study.tell(trial, value)
+            on_trial(finished_trials(study))
+    return study
+
+
+def trial_history(name: str) -> Optional[List[Dict[str, Any]]]:
+    """Trials of a stored study, or None if there is no such study"""
+    try:
+        study = optuna.load_study(study_name=name, storage=get_storage())
+    except KeyError:
+        return None
+    return [
+        {
+            'number': trial.number,
+            'state': trial.state.name,
+            'value': trial.value,
+            'params': trial.params,
+            'best_iteration': trial.user_attrs.get('best_iteration'),
+            'rung': trial.user_attrs.get('rung', 0),
+            'data_fraction': trial.user_attrs.get('data_fraction', 1.0),
+            'started_at': trial.datetime_start.isoformat() if trial.datetime_start else None,
+            'duration_seconds': trial.duration.total_seconds() if trial.duration else None,
+        }
+        for trial in study.get_trials(deepcopy=False)
+    ]
@@ -3,15 +3,17 @@ import plotly.express as px
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 import json
-from typing import Dict, Any
+from typing import Dict, Any, Optional
+from app.sales_tensor import SalesTensor
 
 class VisualizationService:
-    def create_sales_trend_chart(self, df: pd.DataFrame) -> Dict[str, Any]:
+    def create_sales_trend_chart(self, df: Optional[pd.DataFrame] = None, tensor: Optional[SalesTensor] = None) -> Dict[str, Any]:
         """Create sales trend visualization"""
-        df['Date'] = pd.to_datetime(df['Date'])
-        
         # Aggregate sales by date
-        daily_sales = df.groupby('Date')['Weekly_Sales'].sum().reset_index()
+        if tensor is not None:
+            daily_sales = tensor.date_totals()
+        else:
+            daily_sales = df.groupby(pd.to_datetime(df['Date']))['Weekly_Sales'].sum().reset_index()
         
         # Create line chart
         fig = px.line(
@@ -30,14 +32,17 @@ class VisualizationService:
         
         return json.loads(fig.to_json())
     
-    def create_abc_xyz_heatmap(self, df: pd.DataFrame) -> Dict[str, Any]:
+    def create_abc_xyz_heatmap(self, df: Optional[pd.DataFrame] = None, tensor: Optional[SalesTensor] = None) -> Dict[str, Any]:
         """Create ABC-XYZ classification heatmap"""
         # Calculate ABC-XYZ classification
-        dept_stats = df.groupby(['Store', 'Dept']).agg({
-            'Weekly_Sales': ['sum', 'mean', 'std']
-        }).reset_index()
-        
-        dept_stats.columns = ['Store', 'Dept', 'Total_Sales', 'Mean_Sales', 'Std_Sales']
+        if tensor is not None:
+            dept_stats = tensor.series_stats()
+        else:
+            dept_stats = df.groupby(['Store', 'Dept'], observed=True).agg({
+                'Weekly_Sales': ['sum', 'mean', 'std']
+            }).reset_index()
+            
+            dept_stats.columns = ['Store', 'Dept', 'Total_Sales', 'Mean_Sales', 'Std_Sales']
         dept_stats['CV'] = dept_stats['Std_Sales'] / dept_stats['Mean_Sales']
         dept_stats['CV'] = dept_stats['CV'].fillna(0)
         
@@ -84,9 +89,12 @@ class VisualizationService:
         
         return json.loads(fig.to_json())
     
-    def create_department_performance_chart(self, df: pd.DataFrame) -> Dict[str, Any]:
+    def create_department_performance_chart(self, df: Optional[pd.DataFrame] = None, tensor: Optional[SalesTensor] = None) -> Dict[str, Any]:
         """Create department performance comparison"""
-        dept_performance = df.groupby('Dept')['Weekly_Sales'].agg(['sum', 'mean']).reset_index()
+        if tensor is not None:
+            dept_performance = tensor.dept_totals()
+        else:
+            dept_performance = df.groupby('Dept', observed=True)['Weekly_Sales'].agg(['sum', 'mean']).reset_index()
         dept_performance.columns = ['Dept', 'Total_Sales', 'Avg_Sales']
         dept_performance = dept_performance.sort_values('Total_Sales', ascending=False).head(10)
         
@@ -100,9 +108,12 @@ class VisualizationService:
         
         return json.loads(fig.to_json())
     
-    def create_store_comparison_chart(self, df: pd.DataFrame) -> Dict[str, Any]:
+    def create_store_comparison_chart(self, df: Optional[pd.DataFrame] = None, tensor: Optional[SalesTensor] = None) -> Dict[str, Any]:
         """Create store performance comparison"""
-        store_performance = df.groupby('Store')['Weekly_Sales'].sum().reset_index()
+        if tensor is not None:
+            store_performance = tensor.store_totals()
+        else:
+            store_performance = df.groupby('Store', observed=True)['Weekly_Sales'].sum().reset_index()
         store_performance = store_performance.sort_values('Weekly_Sales', ascending=False)
         
         fig = px.bar(
@@ -115,9 +126,12 @@ class VisualizationService:
         
         return json.loads(fig.to_json())
     
-    def create_holiday_impact_chart(self, df: pd.DataFrame) -> Dict[str, Any]:
+    def create_holiday_impact_chart(self, df: Optional[pd.DataFrame] = None, tensor: Optional[SalesTensor] = None) -> Dict[str, Any]:
         """Create holiday impact analysis"""
-        holiday_impact = df.groupby('IsHoliday')['Weekly_Sales'].mean().reset_index()
+        if tensor is not None:
+            holiday_impact = tensor.holiday_means()
+        else:
+            holiday_impact = df.groupby('IsHoliday')['Weekly_Sales'].mean().reset_index()
         holiday_impact['IsHoliday'] = holiday_impact['IsHoliday'].map({True: 'Hari Libur', False: 'Hari Biasa'})
         
         fig = px.bar(
@@ -0,0 +1,85 @@
+"""
+Benchmark the compact training path against the current one.
+
+The current path label-encodes Store and Dept into float64 feature columns
+and fits XGBRegressor on the frame; the compact path ({'compact': True}
+feature spec) keeps Store and Dept as categoricals, casts the features to
+float32 and fits the hist method on a QuantileDMatrix shared with the test
+rows. Each run happens in its own child process so peak resident memory is
+measured per path.
+
+Usage: python benchmarks/bench_compact_training.py [rows] [n_estimators]
+"""
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.ml_service import MLService
+from bench_feature_engine import make_sales_frame
+
+SPECS = {'current': None, 'compact': {'compact': True}}
+
+
+def rss_mb(field: str) -> float:
+    """VmRSS (now) or VmHWM (peak) of this process"""
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith(field + ':'):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def child(mode: str, n_rows: int, n_estimators: int) -> None:
+    df = make_sales_frame(n_rows)
+    season = 1 + np.sin(df['Date'].dt.dayofyear / 58.0)
+    df['Weekly_Sales'] = (0.2 * df['Weekly_Sales'] + 20000 * season * (df['Store'].astype(int) % 7 + 1)).astype('float32')
+    os.chdir(tempfile.mkdtemp(prefix="bench_compact_"))
+    os.makedirs("models")
+    base = rss_mb('VmRSS')
+
+    service = MLService()
+    X, _, _, _, _ = service.prepare_data(df, SPECS[mode])
+    features_mb = X.memory_usage(deep=True).sum() / (1024 * 1024)
+    del X
+    start = time.perf_counter()
+    result = service.train_model(df, {'n_estimators': n_estimators, 'max_depth': 6}, feature_spec=SPECS[mode],
+                                 model_id=1)
+    print(json.dumps({
+        'seconds': time.perf_counter() - start,
+        'fit_seconds': result['metrics']['training_seconds'],
+        'rmse': result['metrics']['rmse'],
+        'features_mb': features_mb,
+        # Above the process before featurizing: pandas, the frames and XGBoost's matrices
+        'peak_mb': rss_mb('VmHWM') - base,
+    }))
+
+
+def main(n_rows: int, n_estimators: int) -> None:
+    print(f"{n_rows} rows, {n_estimators} rounds")
+    results = {}
+    for mode in SPECS:
+        proc = subprocess.run([sys.executable, os.path.abspath(__file__), '--child', mode, str(n_rows),
+                               str(n_estimators)], capture_output=True, text=True, check=True)
+        results[mode] = outcome = json.loads(proc.stdout.strip().splitlines()[-1])
+        print(f"{mode:>8}: train_model {outcome['seconds']:6.2f}s (fit {outcome['fit_seconds']:6.2f}s), "
+              f"peak memory +{outcome['peak_mb']:.0f} MB, feature frame {outcome['features_mb']:.0f} MB, "
+              f"test RMSE {outcome['rmse']:.1f}")
+    current, compact = results['current'], results['compact']
+    print(f"compact / current: fit time {compact['fit_seconds'] / current['fit_seconds']:.2f}x, "
+          f"peak memory {compact['peak_mb'] / current['peak_mb']:.2f}x")
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    if args and args[0] == '--child':
+        child(args[1], int(args[2]), int(args[3]))
+    else:
+        main(int(args[0]) if args else 2_000_000,
+             int(args[1]) if len(args) > 1 else 100)
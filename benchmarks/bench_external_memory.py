@@ -0,0 +1,162 @@
+"""
+Benchmark external-memory training on a dataset larger than the memory
+available to the training process.
+
+A synthetic dataset is written to a temporary dataset store, Parquet part
+by part. Each training run happens in a child process whose heap is capped
+with RLIMIT_DATA, standing in for the machine's RAM: first the in-memory
+path (DatasetStore.load + MLService.train_model), then
+MLService.train_model_external with a batch budget inside the cap. The
+dataset size is the feature frame prepare_data would build for it,
+estimated from a sample.
+
+Usage: python benchmarks/bench_external_memory.py [memory limit MB] [rows] [batch budget MB]
+"""
+import json
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.dataset_store import DatasetStore
+from app.ml_service import MLService
+
+# A wide feature set: the feature frame grows with it, while the ~50 bytes per
+# row XGBoost keeps in memory for external-memory training do not
+SPEC = {
+    'lags': [1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13, 26, 52],
+    'rolling': {'windows': [2, 3, 4, 6, 8, 13, 26, 52], 'stats': ['mean', 'std']},
+    'holiday_distance': True,
+}
+PARAMETERS = {'n_estimators': 20, 'max_depth': 6}
+STORES, DEPTS = 45, 99
+DATASET_ID = 1
+CHILD_TIMEOUT = 3600
+
+
+def write_dataset(store: DatasetStore, n_rows: int, seed: int = 42) -> None:
+    """45 stores x 99 departments of weekly sales, one Parquet part per store"""
+    rng = np.random.default_rng(seed)
+    n_weeks = int(np.ceil(n_rows / (STORES * DEPTS)))
+    weeks = np.tile(np.arange(n_weeks), DEPTS)
+    dates = pd.Timestamp('1990-01-05') + pd.to_timedelta(weeks * 7, unit='D')
+    season = 1 + np.sin(dates.dayofyear.to_numpy() / 58.0)
+    directory = store.dataset_dir(DATASET_ID)
+    os.makedirs(directory, exist_ok=True)
+    for s in range(STORES):
+        frame = pd.DataFrame({
+            'Store': np.full(len(weeks), s + 1),
+            'Dept': np.repeat(np.arange(DEPTS) + 1, n_weeks),
+            'Date': dates,
+            'Weekly_Sales': (20000 * season * (s % 7 + 1) + rng.gamma(2.0, 2000.0, len(weeks))).astype('float32'),
+            'IsHoliday': weeks % 13 == 0,
+        })
+        pq.write_table(pa.Table.from_pandas(frame, preserve_index=False),
+                       os.path.join(directory, f"part-{s:05d}.parquet"))
+
+
+def feature_bytes_per_row(store: DatasetStore) -> float:
+    sample = store.load(DATASET_ID, filters=[('Store', '=', 1)])
+    _, _, processed, _, _ = MLService().prepare_data(sample, SPEC)
+    return processed.memory_usage(deep=True).sum() / len(sample)
+
+
+def heap_mb() -> float:
+    """Data segment of this process, the memory RLIMIT_DATA caps"""
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith('VmData:'):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def child(mode: str, data_dir: str, limit_mb: int, budget_mb: int) -> None:
+    limit = limit_mb * 1024 * 1024
+    resource.setrlimit(resource.RLIMIT_DATA, (limit, limit))
+    peak = [heap_mb()]
+
+    def sample():
+        while True:
+            peak[0] = max(peak[0], heap_mb())
+            time.sleep(0.05)
+
+    threading.Thread(target=sample, daemon=True).start()
+    os.chdir(data_dir)
+    store = DatasetStore("data")
+    service = MLService()
+    start = time.perf_counter()
+    try:
+        if mode == 'external':
+            result = service.train_model_external(store, DATASET_ID, PARAMETERS, feature_spec=SPEC, model_id=1,
+                                                  memory_mb=budget_mb)
+        else:
+            result = service.train_model(store.load(DATASET_ID), PARAMETERS, feature_spec=SPEC, model_id=1)
+        outcome = {'rmse': result['metrics']['rmse'], 'detail': result['metrics'].get('external_memory')}
+    except MemoryError:
+        outcome = {'error': 'MemoryError'}
+    outcome['seconds'] = time.perf_counter() - start
+    # RSS also counts the page cache files XGBoost maps in, which the kernel can drop
+    outcome['peak_heap_mb'] = max(peak[0], heap_mb())
+    print(json.dumps(outcome))
+
+
+def run_child(mode: str, data_dir: str, limit_mb: int, budget_mb: int) -> dict:
+    # With the system allocator Arrow raises MemoryError at the cap; jemalloc keeps retrying
+    env = dict(os.environ, ARROW_DEFAULT_MEMORY_POOL="system")
+    try:
+        proc = subprocess.run([sys.executable, os.path.abspath(__file__), '--child', mode, data_dir,
+                               str(limit_mb), str(budget_mb)], capture_output=True, text=True, env=env,
+                              timeout=CHILD_TIMEOUT)
+    except subprocess.TimeoutExpired:
+        return {'error': f"no result after {CHILD_TIMEOUT}s"}
+    lines = proc.stdout.strip().splitlines()
+    if proc.returncode != 0 or not lines:
+        # Allocation failures outside Python (pandas/XGBoost internals) end the process
+        return {'error': f"exit {proc.returncode}: {proc.stderr.strip().splitlines()[-1:]}"}
+    return json.loads(lines[-1])
+
+
+def main(limit_mb: int, n_rows: int, budget_mb: int) -> None:
+    data_dir = tempfile.mkdtemp(prefix="bench_external_")
+    try:
+        store = DatasetStore(os.path.join(data_dir, "data"))
+        start = time.perf_counter()
+        write_dataset(store, n_rows)
+        rows = sum(pq.ParquetFile(path).metadata.num_rows for path in store.part_paths(DATASET_ID))
+        dataset_mb = feature_bytes_per_row(store) * rows / (1024 * 1024)
+        print(f"{rows} rows written in {time.perf_counter() - start:.0f}s; feature frame ~{dataset_mb:.0f} MB, "
+              f"{dataset_mb / limit_mb:.1f}x the {limit_mb} MB memory limit")
+
+        for mode in ('in-memory', 'external'):
+            outcome = run_child(mode, data_dir, limit_mb, budget_mb)
+            if 'error' in outcome:
+                print(f"{mode:>10}: failed ({outcome['error']})")
+                continue
+            detail = outcome['detail'] or {}
+            print(f"{mode:>10}: {outcome['seconds']:.0f}s, peak heap {outcome['peak_heap_mb']:.0f} MB, "
+                  f"holdout RMSE {outcome['rmse']:.1f}"
+                  + (f", {detail['batches']} batches of <= {budget_mb} MB, page cache {detail['page_cache_mb']:.0f} MB"
+                     if detail else ""))
+    finally:
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    if args and args[0] == '--child':
+        child(args[1], args[2], int(args[3]), int(args[4]))
+    else:
+        main(int(args[0]) if args else 2048,
+             int(args[1]) if len(args) > 1 else 34_000_000,
+             int(args[2]) if len(args) > 2 else 128)
@@ -0,0 +1,94 @@
+"""
+Benchmark lag/rolling feature construction: per-group pandas apply
+(the previous MLService.prepare_data path) against GroupedWindowEngine.
+
+Usage: python benchmarks/bench_feature_engine.py [rows ...]
+"""
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.feature_engine import GroupedWindowEngine
+
+
+def make_sales_frame(n_rows: int, seed: int = 42) -> pd.DataFrame:
+    """Synthetic long-format sales with 45 stores x 99 departments"""
+    rng = np.random.default_rng(seed)
+    n_series = min(45 * 99, max(1, n_rows // 20))
+    n_weeks = int(np.ceil(n_rows / n_series))
+    series = np.repeat(np.arange(n_series), n_weeks)[:n_rows]
+    weeks = np.tile(np.arange(n_weeks), n_series)[:n_rows]
+    df = pd.DataFrame({
+        'Store': pd.Categorical(series // 99 + 1),
+        'Dept': pd.Categorical(series % 99 + 1),
+        'Date': pd.Timestamp('2010-02-05') + pd.to_timedelta(weeks * 7, unit='D'),
+        'Weekly_Sales': (rng.gamma(2.0, 10000.0, n_rows)).astype('float32'),
+        'IsHoliday': weeks % 13 == 0,
+    })
+    # Shuffle so the sort inside both paths does real work
+    return df.sample(frac=1.0, random_state=seed).reset_index(drop=True)
+
+
+def legacy_features(df: pd.DataFrame) -> pd.DataFrame:
+    df = df.sort_values(['Store', 'Dept', 'Date']).reset_index(drop=True)
+    df['Sales_lag1'] = df.groupby(['Store', 'Dept'], observed=True)['Weekly_Sales'].shift(1)
+    df['Sales_lag2'] = df.groupby(['Store', 'Dept'], observed=True)['Weekly_Sales'].shift(2)
+    df['Sales_lag4'] = df.groupby(['Store', 'Dept'], observed=True)['Weekly_Sales'].shift(4)
+
+    def calculate_rolling_stats(group):
+        group = group.copy()
+        group['Sales_rolling_mean_4'] = group['Weekly_Sales'].rolling(window=4, min_periods=1).mean()
+        group['Sales_rolling_std_4'] = group['Weekly_Sales'].rolling(window=4, min_periods=1).std()
+        return group
+
+    return df.groupby(['Store', 'Dept'], observed=True).apply(calculate_rolling_stats).reset_index(drop=True)
+
+
+def engine_features(df: pd.DataFrame) -> pd.DataFrame:
+    df = df.sort_values(['Store', 'Dept', 'Date']).reset_index(drop=True)
+    engine = GroupedWindowEngine(
+        df['Weekly_Sales'].to_numpy(),
+        df.groupby(['Store', 'Dept'], observed=True, sort=False).ngroup().to_numpy()
+    )
+    df['Sales_lag1'] = engine.lag(1)
+    df['Sales_lag2'] = engine.lag(2)
+    df['Sales_lag4'] = engine.lag(4)
+    df['Sales_rolling_mean_4'], df['Sales_rolling_std_4'] = engine.rolling_mean_std(4, min_periods=1)
+    return df
+
+
+def timed(fn, df):
+    start = time.perf_counter()
+    result = fn(df)
+    return result, time.perf_counter() - start
+
+
+def main(sizes):
+    columns = ['Sales_lag1', 'Sales_lag2', 'Sales_lag4', 'Sales_rolling_mean_4', 'Sales_rolling_std_4']
+    print(f"{'rows':>10} {'legacy (s)':>12} {'engine (s)':>12} {'speedup':>9}  max rel. diff")
+    for n_rows in sizes:
+        df = make_sales_frame(n_rows)
+        legacy, legacy_time = timed(legacy_features, df)
+        fast, fast_time = timed(engine_features, df)
+
+        max_diff = 0.0
+        for col in columns:
+            a = legacy[col].to_numpy(dtype=np.float64)
+            b = fast[col].to_numpy(dtype=np.float64)
+            assert np.array_equal(np.isnan(a), np.isnan(b)), f"NaN pattern differs in {col}"
+            mask = ~np.isnan(a)
+            denom = np.maximum(np.abs(a[mask]), 1e-9)
+            if mask.any():
+                max_diff = max(max_diff, float(np.max(np.abs(a[mask] - b[mask]) / denom)))
+        assert max_diff < 1e-6, f"features differ by {max_diff}"
+
+        print(f"{n_rows:>10} {legacy_time:>12.3f} {fast_time:>12.3f} {legacy_time / fast_time:>8.1f}x  {max_diff:.2e}")
+
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or [10_000, 100_000, 5_000_000])
@@ -0,0 +1,81 @@
+"""
+Benchmark model artifacts: a joblib pickle of the whole model dict (the
+previous format) against the registry's UBJSON booster with JSON sidecars.
+Reports artifact size, save time and cold load time, then the latency of
+warm registry hits.
+
+Usage: python benchmarks/bench_model_registry.py [rows] [n_estimators]
+"""
+import os
+import sys
+import time
+import shutil
+import tempfile
+
+import joblib
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.ml_service import MLService, row_hashes
+from app.model_registry import ModelRegistry
+from bench_feature_engine import make_sales_frame
+
+REPEATS = 5
+
+
+def directory_size(path):
+    return sum(os.path.getsize(os.path.join(d, name)) for d, _, names in os.walk(path) for name in names)
+
+
+def main(n_rows, n_estimators):
+    root = tempfile.mkdtemp(prefix="bench-registry-")
+    try:
+        service = MLService(registry=ModelRegistry(root))
+        df = make_sales_frame(n_rows)
+        service.train_model(df, {'n_estimators': n_estimators}, model_id=1)
+        model_data = service.load_model(1)
+        X, _, processed, _, _ = service.prepare_data(df, model_data['feature_spec'])
+        print(f"{len(X)} rows, {model_data['model'].get_booster().num_boosted_rounds()} trees")
+
+        legacy = {key: model_data[key] for key in ('model', 'le_store', 'le_dept', 'feature_columns',
+                                                   'feature_spec', 'row_hashes', 'segments')}
+        legacy['row_hashes'] = row_hashes(processed)
+        legacy_path = os.path.join(root, "xgboost_model_1.joblib")
+        start = time.perf_counter()
+        joblib.dump(legacy, legacy_path)
+        legacy_save = time.perf_counter() - start
+        start = time.perf_counter()
+        for _ in range(REPEATS):
+            joblib.load(legacy_path)
+        legacy_load = (time.perf_counter() - start) / REPEATS
+
+        registry = ModelRegistry(root, max_mb=0)
+        start = time.perf_counter()
+        registry.save(2, legacy['model'], legacy['le_store'], legacy['le_dept'], legacy['feature_columns'],
+                      legacy['feature_spec'], legacy['row_hashes'])
+        registry_save = time.perf_counter() - start
+        start = time.perf_counter()
+        for _ in range(REPEATS):
+            registry.get(2)
+        registry_load = (time.perf_counter() - start) / REPEATS
+
+        print(f"{'joblib':>10}: {os.path.getsize(legacy_path) / 1e6:7.2f} MB  save {legacy_save * 1000:7.1f} ms"
+              f"  load {legacy_load * 1000:7.1f} ms")
+        print(f"{'registry':>10}: {directory_size(registry.model_dir(2)) / 1e6:7.2f} MB  "
+              f"save {registry_save * 1000:7.1f} ms  load {registry_load * 1000:7.1f} ms "
+              f"({legacy_load / registry_load:.1f}x)")
+
+        cached = ModelRegistry(root)
+        cached.get(2)
+        start = time.perf_counter()
+        for _ in range(1000):
+            cached.get(2)
+        hit = (time.perf_counter() - start) / 1000
+        print(f"{'hit':>10}: {hit * 1e6:7.1f} us per get, hit rate {cached.stats()['hit_rate']:.3f}")
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    main(int(args[0]) if args else 200_000, int(args[1]) if len(args) > 1 else 300)
@@ -0,0 +1,41 @@
+"""
+Benchmark serial against sharded multi-process feature building in
+MLService.prepare_data and check both give identical frames.
+
+Usage: python benchmarks/bench_parallel_features.py [rows] [workers ...]
+"""
+import os
+import sys
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.ml_service import MLService
+from bench_feature_engine import make_sales_frame
+
+# Heavier than the default spec so there is real work to shard
+SPEC = {'lags': [1, 2, 4, 52], 'rolling': {'windows': [4, 8, 13, 26]}}
+
+
+def main(n_rows, worker_counts):
+    df = make_sales_frame(n_rows)
+    start = time.perf_counter()
+    _, _, serial, _, _ = MLService(feature_workers=1).prepare_data(df, SPEC)
+    serial_time = time.perf_counter() - start
+    print(f"{n_rows} rows, serial: {serial_time:.2f}s")
+
+    for workers in worker_counts:
+        service = MLService(feature_workers=workers)
+        # Each call starts and stops its own worker processes, so their startup is part of the time
+        start = time.perf_counter()
+        _, _, parallel, _, _ = service.prepare_data(df, SPEC)
+        elapsed = time.perf_counter() - start
+        pd.testing.assert_frame_equal(serial, parallel)
+        print(f"{workers:>3} workers: {elapsed:.2f}s ({serial_time / elapsed:.1f}x), identical")
+
+
+if __name__ == "__main__":
+    args = [int(arg) for arg in sys.argv[1:]]
+    main(args[0] if args else 2_000_000, args[1:] or [2, 4, 8])
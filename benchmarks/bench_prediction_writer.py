@@ -0,0 +1,114 @@
+"""
+Benchmark saving predictions: one ORM Prediction per row added to a
+session and committed once (the previous /predictions/generate path)
+against write_predictions of a prediction run, on a fresh SQLite database. Reports time and
+peak memory growth of each, measured in separate child processes.
+
+Usage: python benchmarks/bench_prediction_writer.py [rows] [batch_size]
+"""
+import os
+import sys
+import time
+import tempfile
+import subprocess
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.database import Base
+from app.ml_service import prediction_records
+from app.models import Prediction
+from app.prediction_runs import start_run
+from app.prediction_writer import write_predictions
+
+
+def make_result(n_rows, seed=42):
+    """A generate_predictions_by_category result with random rows over 45 x 99 series"""
+    rng = np.random.default_rng(seed)
+    stores, depts = np.meshgrid(np.arange(1, 46), np.arange(1, 100), indexing='ij')
+    keys = [f"{store}_{dept}" for store, dept in zip(stores.ravel(), depts.ravel())]
+    return {
+        'rows': {
+            'series': rng.integers(0, len(keys), n_rows).astype(np.int32),
+            'date': np.datetime64('2012-01-06') + rng.integers(0, 140, n_rows).astype('timedelta64[W]'),
+            'predicted_sales': rng.gamma(2.0, 8000.0, n_rows),
+            'actual_sales': rng.gamma(2.0, 8000.0, n_rows),
+            'accuracy': rng.uniform(50, 100, n_rows)
+        },
+        'series': {
+            'store': [str(store) for store in stores.ravel()],
+            'dept': [str(dept) for dept in depts.ravel()],
+            'key': keys,
+            'category': ['A-X'] * len(keys)
+        },
+        'abc_xyz_classification': {key: {'abc_class': 'A', 'xyz_class': 'X', 'category_name': 'A-X'}
+                                   for key in keys}
+    }
+
+
+def orm_save(engine, result):
+    db = sessionmaker(bind=engine)()
+    try:
+        for pred in prediction_records(result):
+            classification_data = pred.get('classification_data', {})
+            db.add(Prediction(
+                model_id=1,
+                store_id=pred['store'],
+                dept_id=pred['dept'],
+                predicted_sales=pred['predicted_sales'],
+                actual_sales=pred.get('actual_sales'),
+                abc_class=classification_data.get('abc_class'),
+                xyz_class=classification_data.get('xyz_class'),
+                created_by=1
+            ))
+        db.commit()
+    finally:
+        db.close()
+
+
+def peak_rss_mb():
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1]) / 1024
+    return float('nan')
+
+
+def run(mode, n_rows, batch_size):
+    result = make_result(n_rows)
+    with tempfile.TemporaryDirectory() as directory:
+        engine = create_engine(f"sqlite:///{os.path.join(directory, 'bench.db')}")
+        Base.metadata.create_all(engine)
+        baseline = peak_rss_mb()
+        start = time.perf_counter()
+        if mode == 'orm':
+            orm_save(engine, result)
+        else:
+            write_predictions(start_run(1, None, 1, engine=engine), result, engine=engine, batch_size=batch_size)
+        seconds = time.perf_counter() - start
+        with engine.connect() as conn:
+            count = conn.exec_driver_sql("SELECT COUNT(*) FROM predictions").scalar()
+    print(f"{mode} {seconds} {peak_rss_mb() - baseline} {count}")
+
+
+def main(n_rows, batch_size):
+    print(f"{n_rows} predictions, batches of {batch_size}")
+    seconds = {}
+    for mode in ('orm', 'bulk'):
+        output = subprocess.run([sys.executable, __file__, '--run', mode, str(n_rows), str(batch_size)],
+                                capture_output=True, text=True, check=True).stdout.split()
+        seconds[mode], memory, count = float(output[1]), float(output[2]), int(output[3])
+        print(f"{mode:>5}: {seconds[mode]:7.2f}s  +{memory:6.0f} MB peak  {count} rows"
+              + (f"  ({seconds['orm'] / seconds[mode]:.1f}x)" if mode == 'bulk' else ""))
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    if args and args[0] == '--run':
+        run(args[1], int(args[2]), int(args[3]))
+    else:
+        main(int(args[0]) if args else 400_000, int(args[1]) if len(args) > 1 else 20_000)
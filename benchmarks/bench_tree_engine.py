@@ -0,0 +1,65 @@
+"""
+Benchmark batch inference: XGBRegressor.predict on a feature frame (the
+generic DMatrix path generate_predictions_by_category used) against the
+compiled NumPy TreeEnsemble, across batch sizes, for the default and the
+compact feature spec. Also reports the largest difference between the two.
+
+Usage: python benchmarks/bench_tree_engine.py [rows] [n_estimators] [max_depth]
+"""
+import os
+import sys
+import time
+
+import numpy as np
+import xgboost as xgb
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.ml_service import MLService, compact_options
+from app.tree_engine import TreeEnsemble
+from bench_feature_engine import make_sales_frame
+
+BATCH_SIZES = [1, 100, 1_000, 10_000, 100_000]
+
+
+def timed(fn, batch, min_seconds=0.5):
+    """Mean seconds per call over enough calls to take ``min_seconds``"""
+    calls, start = 0, time.perf_counter()
+    while True:
+        fn(batch)
+        calls += 1
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_seconds:
+            return elapsed / calls
+
+
+def main(n_rows, n_estimators, max_depth):
+    df = make_sales_frame(n_rows)
+    for compact in (False, True):
+        X, y, _, _, _ = MLService().prepare_data(df, {'compact': compact})
+        model = xgb.XGBRegressor(n_estimators=n_estimators, max_depth=max_depth, random_state=42,
+                                 **compact_options({'compact': compact}))
+        model.fit(X, y)
+        start = time.perf_counter()
+        ensemble = TreeEnsemble.from_booster(model.get_booster())
+        compile_seconds = time.perf_counter() - start
+        print(f"{'compact' if compact else 'default'} spec: {len(X)} rows, {ensemble.to_dict()}, "
+              f"compiled in {compile_seconds * 1000:.0f} ms")
+
+        full = X.iloc[:max(BATCH_SIZES)]
+        difference = np.abs(model.predict(full) - ensemble.predict(full)).max()
+        print(f"  max |xgboost - numpy| = {difference:.2e} (predictions up to {np.abs(y).max():.0f})")
+        for size in BATCH_SIZES:
+            if size > len(X):
+                break
+            batch = X.iloc[:size]
+            booster_seconds = timed(model.predict, batch)
+            numpy_seconds = timed(ensemble.predict, batch)
+            print(f"  {size:>7} rows: xgboost {booster_seconds * 1000:9.2f} ms  numpy {numpy_seconds * 1000:9.2f} ms"
+                  f"  ({booster_seconds / numpy_seconds:.2f}x)")
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    main(int(args[0]) if args else 200_000, int(args[1]) if len(args) > 1 else 100,
+         int(args[2]) if len(args) > 2 else 6)
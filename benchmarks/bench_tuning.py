@@ -0,0 +1,111 @@
+"""
+Benchmark hyperparameter search: full-length trials scored at the end (the
+previous optimize_model objective) against early stopping with pruning and
+against successive halving over data fractions. All searches use the same
+sampler seed and report the test RMSE of the final model.
+
+Usage: python benchmarks/bench_tuning.py [csv or synthetic rows] [n_trials] [mode ...]
+where a mode is a pruner name or successive_halving.
+"""
+import os
+import sys
+import time
+
+import numpy as np
+import optuna
+import pandas as pd
+import xgboost as xgb
+from sklearn.metrics import mean_squared_error
+from sklearn.model_selection import train_test_split
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import tuning
+from app.ml_service import MLService
+from app.tuning import (OPTUNA_SH_ETA, OPTUNA_SH_FRACTIONS, TrialObjective, make_pruner, run_successive_halving,
+                        suggest_params, tuned_params)
+from bench_feature_engine import make_sales_frame
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def legacy_search(X_train, y_train, X_test, y_test, n_trials):
+    def objective(trial):
+        params = dict(suggest_params(trial), n_estimators=trial.suggest_int('n_estimators', 50, 300))
+        model = xgb.XGBRegressor(**params)
+        model.fit(X_train, y_train)
+        return np.sqrt(mean_squared_error(y_test, model.predict(X_test)))
+
+    study = optuna.create_study(direction='minimize', sampler=optuna.samplers.TPESampler(seed=42))
+    study.optimize(objective, n_trials=n_trials)
+    return study.best_params
+
+
+def pruned_search(X_train, y_train, n_trials, pruner):
+    X_fit, X_valid, y_fit, y_valid = train_test_split(X_train, y_train, test_size=0.2, random_state=42)
+    study = optuna.create_study(direction='minimize', sampler=optuna.samplers.TPESampler(seed=42),
+                                pruner=make_pruner(pruner))
+    study.optimize(TrialObjective(X_fit, y_fit, X_valid, y_valid), n_trials=n_trials)
+    pruned = len(study.get_trials(states=(optuna.trial.TrialState.PRUNED,)))
+    return tuned_params(study), pruned
+
+
+def halving_search(X_train, y_train, keys, n_trials):
+    X_fit, X_valid, y_fit, y_valid = train_test_split(X_train, y_train, test_size=0.2, random_state=42)
+    keys = keys.loc[X_fit.index.append(X_valid.index)]
+    series_ids = keys.groupby(['Store_encoded', 'Dept_encoded'], sort=False).ngroup().to_numpy()
+    study = run_successive_halving(X_fit, y_fit, X_valid, y_valid, series_ids, keys['Date'].to_numpy(),
+                                   n_trials, OPTUNA_SH_FRACTIONS, OPTUNA_SH_ETA,
+                                   sampler=optuna.samplers.TPESampler(seed=42))
+    return tuned_params(study), len(study.trials)
+
+
+def load_frame(source):
+    if source.isdigit():
+        # Synthetic series with a seasonal, store-dependent level to learn
+        df = make_sales_frame(int(source))
+        season = 1 + np.sin(df['Date'].dt.dayofyear / 58.0)
+        df['Weekly_Sales'] = (0.2 * df['Weekly_Sales'] + 20000 * season * (df['Store'].astype(int) % 7 + 1)).astype('float32')
+        return df
+    df = pd.read_csv(source)
+    df['Date'] = pd.to_datetime(df['Date'])
+    return df
+
+
+def test_rmse(params, X_train, y_train, X_test, y_test):
+    model = xgb.XGBRegressor(**params)
+    model.fit(X_train, y_train)
+    return float(np.sqrt(mean_squared_error(y_test, model.predict(X_test))))
+
+
+def main(source, n_trials, modes):
+    optuna.logging.set_verbosity(optuna.logging.WARNING)
+    X, y, processed, _, _ = MLService().prepare_data(load_frame(source))
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+    print(f"{len(X)} rows, {n_trials} trials, up to {tuning.OPTUNA_MAX_ROUNDS} rounds")
+
+    start = time.perf_counter()
+    params = legacy_search(X_train, y_train, X_test, y_test, n_trials)
+    legacy_time = time.perf_counter() - start
+    print(f"{'full trials':>22}: {legacy_time:7.2f}s  test RMSE {test_rmse(params, X_train, y_train, X_test, y_test):.1f}"
+          f"  n_estimators {params['n_estimators']}")
+
+    for mode in modes:
+        start = time.perf_counter()
+        if mode == 'successive_halving':
+            params, evaluated = halving_search(X_train, y_train, processed, n_trials)
+            label, detail = 'successive halving', f"trials run {evaluated}"
+        else:
+            params, pruned = pruned_search(X_train, y_train, n_trials, mode)
+            label, detail = 'early stop + ' + mode, f"pruned {pruned}"
+        elapsed = time.perf_counter() - start
+        print(f"{label:>22}: {elapsed:7.2f}s ({legacy_time / elapsed:.1f}x)"
+              f"  test RMSE {test_rmse(params, X_train, y_train, X_test, y_test):.1f}"
+              f"  n_estimators {params['n_estimators']}  {detail}")
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    main(args[0] if args else os.path.join(ROOT, 'data', 'dataset_3.csv'),
+         int(args[1]) if len(args) > 1 else 50,
+         args[2:] or ['median', 'hyperband', 'successive_halving'])
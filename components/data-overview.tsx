@@ -27,6 +27,7 @@ interface Dataset {
 
 interface Prediction {
   id: number
+  run_id: number
   created_at: string
   model: {
     name: string
@@ -116,7 +117,7 @@ export function DataOverview() {
   })
 
   // Export prediction mutation
-  const exportPredictionMutation = useMutation((predictionId: number) => predictionAPI.exportPrediction(predictionId), {
+  const exportPredictionMutation = useMutation((runId: number) => predictionAPI.exportPrediction(runId), {
     onSuccess: (blob: Blob, variables: number) => {
       const url = window.URL.createObjectURL(blob as Blob)
       const a = document.createElement("a")
@@ -150,8 +151,8 @@ export function DataOverview() {
     downloadMutation.mutate(datasetId)
   }
 
-  const handleExportPrediction = (predictionId: number) => {
-    exportPredictionMutation.mutate(predictionId)
+  const handleExportPrediction = (runId: number) => {
+    exportPredictionMutation.mutate(runId)
   }
 
   const handleRefresh = () => {
@@ -310,7 +311,7 @@ export function DataOverview() {
               </TableHeader>
               <TableBody>
                 {predictions.map((prediction) => (
-                  <TableRow key={prediction.id}>
+                  <TableRow key={prediction.run_id}>
                     <TableCell className="font-medium">{prediction.model.name}</TableCell>
                     <TableCell>{prediction.count.toLocaleString()}</TableCell>
                     <TableCell>Rp.{prediction.total_actual_sales.toLocaleString()}</TableCell>
@@ -338,7 +339,7 @@ export function DataOverview() {
                       <Button
                         variant="outline"
                         size="sm"
-                        onClick={() => handleExportPrediction(prediction.id)}
+                        onClick={() => handleExportPrediction(prediction.run_id)}
                         disabled={exportPredictionMutation.isLoading}
                       >
                         <Download className="w-4 h-4" />
@@ -10,7 +10,7 @@ import { Slider } from "@/components/ui/slider"
 import { Badge } from "@/components/ui/badge"
 import { Progress } from "@/components/ui/progress"
 import { Tabs, TabsContent, TabsList, TabsTrigger } from "@/components/ui/tabs"
-import { Zap, Settings, Play, BarChart3 } from "lucide-react"
+import { Zap, Settings, Play, BarChart3, X } from "lucide-react"
 import { useQuery, useMutation, useQueryClient } from "react-query"
 import { useToast } from "@/hooks/use-toast"
 import { modelAPI, datasetAPI } from "@/lib/api"
@@ -32,30 +32,27 @@ interface TrainingParameters {
   colsample_bytree: number
 }
 
-interface TrainingResult {
+interface JobSubmission {
   message: string
   model_id: number
-  metrics: {
-    accuracy: number
-    rmse: number
-    mae: number
-    r2_score: number
-  }
+  job_id: number
+  status: string
 }
 
-interface OptimizationResult {
-  message: string
+interface TrainingJob {
+  id: number
   model_id: number
-  best_params: Record<string, any>
-  metrics: {
-    accuracy: number
-    rmse: number
-    mae: number
-    r2_score: number
-  }
-  trials_completed: number
+  kind: "train" | "optimize"
+  status: "queued" | "running" | "completed" | "failed" | "cancelled"
+  progress: number
+  message: string | null
+  error: string | null
+  cancel_requested: boolean
+  duration_seconds: number | null
 }
 
+const ACTIVE_JOB_STATUSES = ["queued", "running"]
+
 export function ModelTraining() {
   const [selectedDataset, setSelectedDataset] = useState<number | null>(null)
   const [parameters, setParameters] = useState<TrainingParameters>({
@@ -66,6 +63,7 @@ export function ModelTraining() {
     colsample_bytree: 1.0,
   })
   const [optimizationTrials, setOptimizationTrials] = useState(50)
+  const [activeJobId, setActiveJobId] = useState<number | null>(null)
 
   const { toast } = useToast()
   const queryClient = useQueryClient()
@@ -76,16 +74,50 @@ export function ModelTraining() {
     refetchOnWindowFocus: false,
   })
 
+  // Poll the submitted job until it finishes
+  const { data: activeJob } = useQuery<TrainingJob>(
+    ["training-job", activeJobId],
+    () => modelAPI.getJob(activeJobId as number),
+    {
+      enabled: activeJobId !== null,
+      refetchInterval: (job) => (job && !ACTIVE_JOB_STATUSES.includes(job.status) ? false : 2000),
+      onSuccess: (job) => {
+        if (ACTIVE_JOB_STATUSES.includes(job.status)) return
+        queryClient.invalidateQueries("models")
+        queryClient.invalidateQueries("current-model-metrics")
+        if (job.status === "completed") {
+          toast({ title: "Berhasil", description: `Model ${job.model_id} selesai dilatih` })
+        } else if (job.status === "failed") {
+          toast({ title: "Error", description: job.error || "Gagal melatih model", variant: "destructive" })
+        } else {
+          toast({ title: "Dibatalkan", description: `Pelatihan model ${job.model_id} dibatalkan` })
+        }
+      },
+    },
+  )
+  const jobActive = !!activeJob && ACTIVE_JOB_STATUSES.includes(activeJob.status)
+
+  const cancelJobMutation = useMutation((jobId: number) => modelAPI.cancelJob(jobId), {
+    onSuccess: () => queryClient.invalidateQueries(["training-job", activeJobId]),
+    onError: (error: any) => {
+      toast({
+        title: "Error",
+        description: error.response?.data?.detail || "Gagal membatalkan pelatihan",
+        variant: "destructive",
+      })
+    },
+  })
+
   // Train model mutation
   const trainModelMutation = useMutation(
     ({ datasetId, parameters }: { datasetId: number; parameters: TrainingParameters }) =>
       modelAPI.train(datasetId, parameters),
     {
-      onSuccess: (data: TrainingResult) => {
+      onSuccess: (data: JobSubmission) => {
+        setActiveJobId(data.job_id)
         queryClient.invalidateQueries("models")
-        queryClient.invalidateQueries("current-model-metrics")
         toast({
-          title: "Berhasil",
+          title: "Dijadwalkan",
           description: data.message,
         })
       },
@@ -103,12 +135,12 @@ export function ModelTraining() {
   const optimizeModelMutation = useMutation(
     ({ datasetId, nTrials }: { datasetId: number; nTrials: number }) => modelAPI.optimize(datasetId, nTrials),
     {
-      onSuccess: (data: OptimizationResult) => {
+      onSuccess: (data: JobSubmission) => {
+        setActiveJobId(data.job_id)
         queryClient.invalidateQueries("models")
-        queryClient.invalidateQueries("current-model-metrics")
         toast({
-          title: "Optimasi Selesai",
-          description: `${data.message}. Akurasi: ${data.metrics.accuracy.toFixed(2)}%`,
+          title: "Dijadwalkan",
+          description: data.message,
         })
       },
       onError: (error: any) => {
@@ -243,6 +275,38 @@ export function ModelTraining() {
         </CardContent>
       </Card>
 
+      {activeJob && (
+        <Card>
+          <CardHeader>
+            <CardTitle className="flex items-center justify-between">
+              <span>{activeJob.kind === "optimize" ? "Optimasi" : "Pelatihan"} Model #{activeJob.model_id}</span>
+              <Badge variant={activeJob.status === "failed" ? "destructive" : "secondary"}>{activeJob.status}</Badge>
+            </CardTitle>
+            <CardDescription>{activeJob.error || activeJob.message}</CardDescription>
+          </CardHeader>
+          <CardContent className="space-y-4">
+            <Progress value={Math.round(activeJob.progress * 100)} className="h-2" />
+            <div className="flex justify-between items-center text-sm text-muted-foreground">
+              <span>
+                {Math.round(activeJob.progress * 100)}%
+                {activeJob.duration_seconds !== null && ` · ${activeJob.duration_seconds.toFixed(0)} detik`}
+              </span>
+              {jobActive && (
+                <Button
+                  variant="outline"
+                  size="sm"
+                  onClick={() => cancelJobMutation.mutate(activeJob.id)}
+                  disabled={activeJob.cancel_requested || cancelJobMutation.isLoading}
+                >
+                  <X className="w-4 h-4 mr-2" />
+                  Batalkan
+                </Button>
+              )}
+            </div>
+          </CardContent>
+        </Card>
+      )}
+
       <Tabs defaultValue="manual" className="space-y-6">
         <TabsList className="grid w-full grid-cols-2">
           <TabsTrigger value="manual">Pelatihan Manual</TabsTrigger>
@@ -333,7 +397,7 @@ export function ModelTraining() {
                 </Button>
                 <Button
                   onClick={handleTrainModel}
-                  disabled={!selectedDataset || trainModelMutation.isLoading}
+                  disabled={!selectedDataset || trainModelMutation.isLoading || jobActive}
                   className="min-w-32"
                 >
                   {trainModelMutation.isLoading ? (
@@ -392,21 +456,12 @@ export function ModelTraining() {
                   </ul>
                 </div>
 
-                {optimizeModelMutation.isLoading && (
-                  <div className="space-y-2">
-                    <div className="flex justify-between text-sm">
-                      <span>Optimasi sedang berjalan...</span>
-                      <span>Mohon tunggu</span>
-                    </div>
-                    <Progress value={undefined} className="h-2" />
-                  </div>
-                )}
               </div>
 
               <div className="flex justify-end pt-4 border-t">
                 <Button
                   onClick={handleOptimizeModel}
-                  disabled={!selectedDataset || optimizeModelMutation.isLoading}
+                  disabled={!selectedDataset || optimizeModelMutation.isLoading || jobActive}
                   className="min-w-32"
                 >
                   {optimizeModelMutation.isLoading ? (
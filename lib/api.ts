@@ -117,10 +117,37 @@ export const datasetAPI = {
 
 // Model API
 export const modelAPI = {
-  train: async (datasetId: number, parameters?: any) => {
+  train: async (
+    datasetId: number,
+    parameters?: any,
+    options?: { externalMemory?: boolean; memoryBudgetMb?: number; segmentBy?: "abc_xyz" | "store" },
+  ) => {
     const response = await api.post("/models/train", {
       dataset_id: datasetId,
       parameters,
+      external_memory: options?.externalMemory ?? false,
+      memory_budget_mb: options?.memoryBudgetMb,
+      segment_by: options?.segmentBy,
+    })
+    return response.data
+  },
+
+  warmStart: async (datasetId: number, parentModelId: number, compareFullRetrain = false, parameters?: any) => {
+    const response = await api.post("/models/train", {
+      dataset_id: datasetId,
+      parent_model_id: parentModelId,
+      compare_full_retrain: compareFullRetrain,
+      parameters,
+    })
+    return response.data
+  },
+
+  backtest: async (datasetId: number, modelIds: number[], nFolds?: number, horizonWeeks?: number) => {
+    const response = await api.post("/models/backtest", {
+      dataset_id: datasetId,
+      model_ids: modelIds,
+      n_folds: nFolds,
+      horizon_weeks: horizonWeeks,
     })
     return response.data
   },
@@ -138,6 +165,27 @@ export const modelAPI = {
     return response.data
   },
 
+  getJobs: async (status?: string) => {
+    const params = status ? { job_status: status } : {}
+    const response = await api.get("/models/jobs", { params })
+    return response.data
+  },
+
+  getJob: async (jobId: number) => {
+    const response = await api.get(`/models/jobs/${jobId}`)
+    return response.data
+  },
+
+  cancelJob: async (jobId: number) => {
+    const response = await api.post(`/models/jobs/${jobId}/cancel`)
+    return response.data
+  },
+
+  retryJob: async (jobId: number) => {
+    const response = await api.post(`/models/jobs/${jobId}/retry`)
+    return response.data
+  },
+
   getCurrent: async () => {
     const response = await api.get("/api/models/current")
     return response.data
@@ -201,14 +249,14 @@ export const predictionAPI = {
     return response.data
   },
 
-  getDetails: async (predictionId: number) => {
-    const response = await api.get(`/api/predictions/${predictionId}/details`)
+  getDetails: async (runId: number) => {
+    const response = await api.get(`/api/predictions/${runId}/details`)
     return response.data
   },
 
-  exportPrediction: async (predictionId: number) => {
+  exportPrediction: async (runId: number) => {
     const response = await api.post(
-      `/api/predictions/${predictionId}/export`,
+      `/api/predictions/${runId}/export`,
       {},
       {
         responseType: "blob",